@@ -2,6 +2,14 @@
 from shared.utils import remove_markdown_elements, update_urls_with_utm, post_data, shorten_url
 from shared.models import ChatRequest
 from shared.rag import RAG
+from shared.rag.embedding_cache import embedding_cache
+from shared.rag.geocoder import geocoding_service
+from shared.rag.airtable_mirror import infographic_mirror, sku_mirror
+from shared.rag.alias_matcher import alias_matcher
+from shared.rag.thai_tokenizer import thai_tokenizer
+from shared.utils.image_cache import image_cache
+from shared.utils.image_description import image_description_service
+from shared.utils.artifact_loader import artifact_loader
 from services.ads_handler.ads_agent import AdsAgent
 from services.jib_ai.jib_ai_bot import JibAI  # Main Sonnet 4 service
 from services.dr_jib.dr_jib_service import DrJib  # Medical RAG service
@@ -49,6 +57,17 @@ class SlackEvent(BaseModel):
 class CoPilotRequest(BaseModel):
     messages: list[dict]
 
+# Catalog filter models
+class CatalogFilterRequest(BaseModel):
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    brands: Optional[list[str]] = None
+    category_tag: Optional[str] = None
+    location: Optional[str] = None
+    radius: Optional[float] = None
+    sort: str = "price_asc"
+    limit: int = 10
+
 # Global instances to avoid recreation on every request
 _rag_instance: Optional[RAG] = None
 _ads_agent_instance: Optional[AdsAgent] = None
@@ -101,7 +120,18 @@ async def health_check():
         "status": "healthy",
         "architecture": "Jib's Brain v1.0",
         "services": ["jib_ai", "dr_jib", "web_agent", "co_pilot", "ads_handler", "summarization"],
-        "components": ["shared_rag", "shared_tools", "shared_utils", "shared_models"]
+        "components": ["shared_rag", "shared_tools", "shared_utils", "shared_models"],
+        "caches": {
+            "embedding": embedding_cache.stats(),
+            "geocode": geocoding_service.stats(),
+            "airtable_infographics": infographic_mirror.stats(),
+            "airtable_sku": sku_mirror.stats(),
+            "images": image_cache.stats(),
+            "image_descriptions": image_description_service.stats()
+        },
+        "query_aliases": alias_matcher.stats(),
+        "query_tokens": thai_tokenizer.stats(),
+        "artifacts": artifact_loader.stats()
     }
 
 # =============================================================================
@@ -386,6 +416,15 @@ async def web_search_handler(search_request: SearchRequest):
         print(f"Web search error: {e}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@router.post("/catalog/filter")
+async def catalog_filter_handler(filter_request: CatalogFilterRequest):
+    """Structured package filter: price range, brands, category, location/radius, sort and limit."""
+    rag = get_rag_instance()
+    try:
+        return await rag.filter_packages_async(**filter_request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/web_agent/health")
 async def web_agent_health_check():
     """Health check endpoint for web agent service."""
@@ -19,6 +19,9 @@ class Global:
         self.doc_json_plus = None
         self.index_list_plus = None
         
+        # Prebuilt retrieval indexes shared by every RAG instance (set in lifespan)
+        self.retrieval_indexes = None
+        
         # Agentic loop configuration
         self.AGENTIC_LOOP_THRESHOLD = 100
 
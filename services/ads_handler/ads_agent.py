@@ -139,9 +139,8 @@ class AdsAgent:
                         tool_arguments = json.loads(tool_call["function"]["arguments"])
                         logger.info(f"Tool arguments: {tool_arguments}")
                         
-                        # Run RAG operation in thread pool to avoid blocking
-                        loop = asyncio.get_event_loop()
-                        result = await loop.run_in_executor(None, self.rag.ads_forward, tool_arguments)
+                        # Async RAG pipeline: geocode, embedding and BM25 overlap off the event loop
+                        result = await self.rag.ads_forward_async(tool_arguments)
                         break
                 
                 if result:
@@ -4,15 +4,14 @@ from .tools import Tools
 from .dummy_tools import KidTools
 # Cart functionality removed - only JibAI should use cart
 from shared.utils.prompt_generator import PromptGenerator
+from shared.utils.image_description import image_description_service
 from anthropic import AsyncAnthropicBedrock
 from dotenv import load_dotenv
 from tenacity import before_sleep_log, retry, stop_after_attempt, wait_random_exponential
 import re
 import os
 import httpx
-import base64
 import logging
-import requests
 from datetime import datetime
 from typing import Dict, List, Any, Tuple, Optional, Union
 import asyncio
@@ -118,14 +117,37 @@ class JibAI:
         Returns:
             Processed list of messages
         """
-        for message in input_list:
-            if message['content'][0]['type'] == 'image_url':
-                url = message['content'][0]['image_url']['url']
-                text_ocr = await self.ocr(url)
-                if text_ocr is not None:
-                    message['content'] = [{'type': 'text', 'text': text_ocr}]
+        image_messages = [message for message in input_list if message['content'][0]['type'] == 'image_url']
+        # All images of the turn are described concurrently (capped by the shared service)
+        texts = await asyncio.gather(*(self.ocr(message['content'][0]['image_url']['url']) for message in image_messages))
+        for message, text_ocr in zip(image_messages, texts):
+            if text_ocr is not None:
+                message['content'] = [{'type': 'text', 'text': text_ocr}]
         return input_list
 
+    async def _describe_image(self, image) -> str:
+        """Ask Claude to describe a cached image"""
+        image_type = image.media_type if image.is_image else 'image/png'
+        #check image type, assuming url won't tell the image type
+        print(image_type)
+        message = await self.tell_claude_to_ocr(
+            model=Config.MODEL['sonnet'],
+            max_tokens=Config.MAX_TOKENS,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        image.content_block(image_type),
+                        {
+                            "type": "text",
+                            "text": "อธิบายรูปนี้แหละสินค้าหรือบริการที่พบ"
+                        }
+                    ],
+                }
+            ],
+        )
+        return message.content[0].text
+
     async def ocr(self, url: str) -> Optional[str]:
         """
         Perform OCR on an image URL using Claude.
@@ -137,36 +159,11 @@ class JibAI:
             OCR extracted text or None if an error occurred
         """
         try:
-            # Get image type and encode to base64 # this one is not robust, need to improve
-            response = requests.get(url)
-            image_type = response.headers.get('content-type', 'image/png')
-            image_data = base64.standard_b64encode(response.content).decode("utf-8")
-            #check image type, assuming url won't tell the image type
-            print(image_type)
-            message = await self.tell_claude_to_ocr(
-                model=Config.MODEL['sonnet'],
-                max_tokens=Config.MAX_TOKENS,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": image_type,
-                                    "data": image_data,
-                                },
-                            },
-                            {
-                                "type": "text",
-                                "text": "อธิบายรูปนี้แหละสินค้าหรือบริการที่พบ"
-                            }
-                        ],
-                    }
-                ],
-            )
-            ocr_text = '<IMAGE_DESCRIPTION>' + message.content[0].text + '</IMAGE_DESCRIPTION>'
+            # Descriptions are cached by image content, so history images are described once
+            description = await image_description_service.describe(url, self._describe_image, namespace=Config.MODEL['sonnet'])
+            if description is None:
+                raise ValueError(f"could not fetch image {url}")
+            ocr_text = '<IMAGE_DESCRIPTION>' + description + '</IMAGE_DESCRIPTION>'
             return ocr_text
         except Exception as e:
             logger.error(f"Error at OCR: {e}")
@@ -214,7 +211,7 @@ class JibAI:
         final_tag = category_tag +" "+quality_tag
         if action_choice == '<GET_PACKAGE_METADATA>':
             logger.info("Jib Agent : Retrieving package url...")
-            package_url_context = self.rag._get_package_url(search_query, preferred_area, radius, category_tag)
+            package_url_context = await self.rag._get_package_url_async(search_query, preferred_area, radius, category_tag)
             agent_scratchpad = {
                 "role":"assistant", 
                 "content":[
@@ -246,7 +243,7 @@ class JibAI:
             return await self.forward(chats, room_id) # Agent Jump
             
         logger.info(f"Search query: {search_query}")
-        context_rag, context_rag_non_filtered, image_context = self.rag.forward(search_query, preferred_area, radius, category_tag)
+        context_rag, context_rag_non_filtered, image_context = await self.rag.forward_async(search_query, preferred_area, radius, category_tag)
         context_misc = self.misc    
         context = '\n'.join(["<DATA>", context_rag, context_misc, "</DATA>"])
         context_non_filtered = '\n'.join(["<DATA>", context_rag_non_filtered, context_misc, "</DATA>"])
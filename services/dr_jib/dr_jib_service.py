@@ -32,7 +32,6 @@ class DrJib:
 
         self._load_prompt_templates()
         self.tools = Tools()
-        self.rag = RAG(global_storage=global_storage)
 
     def _load_prompt_templates(self):
         self.dr_jib_prompt = self._read_prompt_file('shared/rag/prompts/jib_prompt.txt')
@@ -140,7 +139,7 @@ Do not return any other text than the response, just the response.
     async def _handle_retrieval_single(self, tool_call):
         logger.info("Dr.Jib is retrieving information...")
         arguments = json.loads(tool_call['function']['arguments'])
-        context = self.rag._get_package_url(
+        context = await self.rag._get_package_url_async(
             query=arguments['query'], 
             preferred_area=arguments['preferred_area'],
             radius=10,  # Default radius
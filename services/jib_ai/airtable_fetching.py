@@ -3,10 +3,10 @@ import os
 import requests
 import asyncio
 import anthropic
-import base64
-import httpx
 from typing import Dict, List, Any, Optional
 from anthropic import AsyncAnthropicBedrock
+from shared.rag.airtable_mirror import sku_mirror
+from shared.utils.image_cache import image_cache
 
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
 BASE_ID = "app2CSihSxsRF1acK"
@@ -25,6 +25,10 @@ class Config:
     TEMP = 0.0
 
 def fetch_by_url(url):
+    # Served from the in-memory mirror once it has loaded
+    records = sku_mirror.lookup_contains('SKU URL', url)
+    if records is not None:
+        return {'records': records}
     headers = {
         "Authorization": f"Bearer {AIRTABLE_API_KEY}"
     }
@@ -370,44 +374,28 @@ async def _url_to_base64_content(url: str) -> Optional[Dict]:
             # Use original URL (likely medium thumbnail or external URL)
             print(f"🖼️ [ORIGINAL-URL] Using original URL for best quality: {url[:80]}...")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(modified_url)
-            response.raise_for_status()
-            
-            # Get content type
-            content_type = response.headers.get('content-type', 'image/jpeg')
-            if not content_type.startswith('image/'):
-                return None
-            
-            # Check image size before converting to base64
-            file_size_bytes = len(response.content)
-            file_size_mb = file_size_bytes / (1024 * 1024)
-            
-            if file_size_bytes > 5 * 1024 * 1024:  # 5MB limit
-                print(f"❌ [IMAGE-SIZE] Image too large: {file_size_mb:.2f}MB (limit: 5MB) - {url[:80]}...")
-                return None  # Skip oversized images
-            
-            # Convert to base64
-            image_data = base64.b64encode(response.content).decode('utf-8')
-            
-            # 🔍 TOKEN COUNTING: Estimate tokens for this base64 image
-            # Base64 encoding increases size by ~33%, and each token ≈ 4 characters
-            estimated_tokens = len(image_data) // 3  # Conservative estimate: 3 chars per token
-            file_size_kb = len(response.content) / 1024
-            
-            print(f"🖼️ [IMAGE-TOKENS] URL: {url[:80]}...")
-            print(f"📊 [IMAGE-SIZE] File: {file_size_kb:.1f}KB ({file_size_mb:.2f}MB), Base64: {len(image_data):,} chars")
-            print(f"🎯 [TOKEN-ESTIMATE] ~{estimated_tokens:,} tokens for this image")
-            print(f"✅ [SIZE-CHECK] Image size validation passed (original quality preserved)")
-            
-            return {
-                "type": "image",
-                "source": {
-                    "type": "base64", 
-                    "media_type": content_type,
-                    "data": image_data
-                }
-            }
+        # Shared cache: repeated artwork is served without another download;
+        # images over the 5MB limit are abandoned while streaming
+        image = await image_cache.get(modified_url, max_bytes=5 * 1024 * 1024)
+        if image is None or not image.is_image:
+            return None
+        
+        file_size_bytes = image.size
+        file_size_mb = file_size_bytes / (1024 * 1024)
+        
+        image_data = image.data
+        
+        # 🔍 TOKEN COUNTING: Estimate tokens for this base64 image
+        # Base64 encoding increases size by ~33%, and each token ≈ 4 characters
+        estimated_tokens = len(image_data) // 3  # Conservative estimate: 3 chars per token
+        file_size_kb = file_size_bytes / 1024
+        
+        print(f"🖼️ [IMAGE-TOKENS] URL: {url[:80]}...")
+        print(f"📊 [IMAGE-SIZE] File: {file_size_kb:.1f}KB ({file_size_mb:.2f}MB), Base64: {len(image_data):,} chars")
+        print(f"🎯 [TOKEN-ESTIMATE] ~{estimated_tokens:,} tokens for this image")
+        print(f"✅ [SIZE-CHECK] Image size validation passed (original quality preserved)")
+        
+        return image.content_block()
     except Exception as e:
         print(f"❌ [IMAGE-ERROR] Failed to fetch {url}: {e}")
         return None
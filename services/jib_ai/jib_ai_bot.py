@@ -17,6 +17,7 @@ import pytz
 from datetime import datetime
 from typing import Dict, List, Any, Tuple, Optional
 from shared.rag import RAG
+from shared.utils.image_cache import image_cache
 
 from .cart import create_cart_curl, add_package_to_cart, delete_package_curl, list_cart_packages_curl, delete_cart_curl, create_order_curl
 from anthropic import AsyncAnthropicBedrock
@@ -69,6 +70,7 @@ class CentralizedTools:
             self._get_retrieval_tool(),
             self._get_cart_tool(),
             self._get_sql_search_tool(),
+            self._get_filter_packages_tool(),
             self._get_package_images_tool(),
         ]
         
@@ -287,6 +289,57 @@ class CentralizedTools:
             }
         }
     
+    def _get_filter_packages_tool(self) -> Dict:
+        """Structured filter tool backed by precomputed catalogue indexes"""
+        return {
+            "name": "filter_packages",
+            "description": "Filter packages by price range, hospital/clinic brands, category and location + radius, sorted by price or distance. Prefer this over sql_search for concrete constraints like 'under 5,000 baht from Bangkok Hospital near Siam'.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "min_price": {
+                        "type": "number",
+                        "description": "Minimum Cash Price in baht"
+                    },
+                    "max_price": {
+                        "type": "number",
+                        "description": "Maximum Cash Price in baht"
+                    },
+                    "brands": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Hospital/clinic names (any of them)"
+                    },
+                    "category_tag": {
+                        "type": "string",
+                        "description": "Category name from the sql_search category list"
+                    },
+                    "location": {
+                        "type": "string",
+                        "description": "Area, landmark or district to search around"
+                    },
+                    "radius": {
+                        "type": "number",
+                        "description": "Search radius in km around location (default: 10)"
+                    },
+                    "sort": {
+                        "type": "string",
+                        "enum": ["price_asc", "price_desc", "distance"],
+                        "description": "price_asc (cheapest first, default), price_desc or distance (nearest first, needs location)"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Number of packages to return (default: 10, max: 50)"
+                    },
+                    "reasoning": {
+                        "type": "string",
+                        "description": "Which user constraints map to which filters"
+                    }
+                },
+                "required": ["reasoning"]
+            }
+        }
+    
     def _get_handover_cx_tool(self) -> Dict:
         """Customer service handover tool"""
         return {
@@ -441,6 +494,8 @@ class CentralizedTools:
                     result = await self._execute_cart(tool_input, room_id)
             elif tool_name == "sql_search":
                 result = await self._execute_sql_search(tool_input)
+            elif tool_name == "filter_packages":
+                result = await self._execute_filter_packages(tool_input)
             elif tool_name == "get_package_images":
                 result = await self._execute_package_images(tool_input)
             elif tool_name == "handover_to_cx":
@@ -498,7 +553,7 @@ class CentralizedTools:
                 else:
                     logger.info(f"🏷️  [CATEGORY-PROVIDED] Sonnet selected category: '{category_tag}'")
                 
-                result = self.rag._get_package_url(
+                result = await self.rag._get_package_url_async(
                     query=search_keyword,
                     preferred_area=preferred_area,
                     radius=radius,
@@ -591,6 +646,29 @@ class CentralizedTools:
             
         return f"SQL Search Results:\n{result}\nReasoning: {reasoning}"
     
+    async def _execute_filter_packages(self, tool_input: Dict) -> str:
+        """Execute structured catalogue filter"""
+        reasoning = tool_input.get("reasoning", "")
+        criteria = {key: tool_input.get(key) for key in ("min_price", "max_price", "brands", "category_tag", "location", "radius")}
+        logger.info(f"🔎 [FILTER] {criteria}, sort: {tool_input.get('sort', 'price_asc')}")
+        
+        # Check if RAG is available
+        if not self.rag:
+            return f"❌ RAG system not available. Mock filter for {criteria}\nReasoning: {reasoning}"
+        
+        try:
+            result = await self.rag.filter_packages_async(
+                **criteria,
+                sort=tool_input.get("sort", "price_asc"),
+                limit=tool_input.get("limit", 10),
+            )
+            result = self.rag.format_filter_results(result)
+        except Exception as e:
+            result = f"❌ Error in filter: {str(e)}"
+            logger.error(f"🔎 [FILTER-ERROR] {result}")
+        
+        return f"Filter Results:\n{result}\nReasoning: {reasoning}"
+    
     async def _execute_handover_cx(self, tool_input: Dict) -> str:
         """Execute customer service handover"""
         package_name = tool_input["package_name"]
@@ -941,51 +1019,27 @@ class JibAI:
         Returns: (success, base64_data, media_type)
         """
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                # First, do a HEAD request to check content-length
-                try:
-                    head_response = await client.head(url)
-                    content_length = head_response.headers.get('content-length')
-                    if content_length:
-                        size_bytes = int(content_length)
-                        size_mb = size_bytes / (1024 * 1024)
-                        if size_bytes > 5 * 1024 * 1024:  # 5MB limit
-                            logger.warning(f"❌ [IMAGE-SIZE] Image too large: {size_mb:.2f}MB (limit: 5MB)")
-                            return False, "", ""
-                        logger.info(f"✅ [IMAGE-SIZE] Image size check passed: {size_mb:.2f}MB")
-                except Exception as e:
-                    # If HEAD request fails, continue with GET but add streaming validation
-                    logger.info(f"⚠️ [IMAGE-SIZE] HEAD request failed, will validate during download: {e}")
-                
-                # Download the image
-                response = await client.get(url)
-                
-                if response.status_code >= 400:
-                    return False, "", ""
-                
-                # Get content type
-                content_type = response.headers.get('content-type', 'image/jpeg').lower()
-                
-                # Validate content type
-                valid_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
-                if not any(vtype in content_type for vtype in valid_types):
-                    logger.warning(f"❌ [IMAGE-TYPE] Invalid content type: {content_type}")
-                    return False, "", ""
-                
-                # Check actual downloaded size
-                image_data = response.content
-                size_bytes = len(image_data)
-                size_mb = size_bytes / (1024 * 1024)
-                
-                if size_bytes > 5 * 1024 * 1024:  # 5MB limit
-                    logger.warning(f"❌ [IMAGE-SIZE] Downloaded image too large: {size_mb:.2f}MB (limit: 5MB)")
-                    return False, "", ""
-                
-                # Convert to base64
-                base64_data = base64.b64encode(image_data).decode('utf-8')
-                
-                logger.info(f"✅ [URL-TO-BASE64] Converted image: {size_mb:.2f}MB, {len(base64_data)} chars, type: {content_type}")
-                return True, base64_data, content_type
+            # Shared cache: repeated images are neither downloaded nor re-encoded;
+            # the 5MB limit is enforced while streaming
+            image = await image_cache.get(url, max_bytes=5 * 1024 * 1024)
+            if image is None:
+                return False, "", ""
+            
+            # Get content type
+            content_type = image.media_type
+            
+            # Validate content type
+            valid_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
+            if not any(vtype in content_type for vtype in valid_types):
+                logger.warning(f"❌ [IMAGE-TYPE] Invalid content type: {content_type}")
+                return False, "", ""
+            
+            size_mb = image.size / (1024 * 1024)
+            
+            base64_data = image.data
+            
+            logger.info(f"✅ [URL-TO-BASE64] Converted image: {size_mb:.2f}MB, {len(base64_data)} chars, type: {content_type}")
+            return True, base64_data, content_type
                 
         except Exception as e:
             logger.error(f"❌ [URL-TO-BASE64] Failed to convert {url}: {e}")
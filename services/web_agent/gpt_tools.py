@@ -564,4 +564,67 @@ class GPTTools:
                 "additionalProperties": False
             }
         }
-    } 
\ No newline at end of file
+    } 
+    filter_packages = {
+        "type": "function",
+        "function": {
+            "name": "filter_packages",
+            "description": """Filter packages by structured criteria without writing a query.
+            
+            Use this tool when the user gives concrete constraints, e.g.
+            "packages under 5,000 baht from Bangkok Hospital near Siam in the Health Checkup category":
+            - Price range (Cash Price, Thai Baht)
+            - One or more hospital/clinic brands
+            - A category (same category names as sql_search)
+            - A location plus radius in km (matches the nearest branch)
+            
+            Results can be sorted by price or by distance from the location. Use null for criteria the user did not give.
+            """,
+            "strict": True,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "thought": {
+                        "type": "string",
+                        "description": "Why you're filtering and which user constraints map to which criteria"
+                    },
+                    "min_price": {
+                        "type": ["number", "null"],
+                        "description": "Minimum Cash Price in baht, or null"
+                    },
+                    "max_price": {
+                        "type": ["number", "null"],
+                        "description": "Maximum Cash Price in baht, or null"
+                    },
+                    "brands": {
+                        "type": ["array", "null"],
+                        "items": {"type": "string"},
+                        "description": "Hospital/clinic names (any of them), or null"
+                    },
+                    "category_tag": {
+                        "type": ["string", "null"],
+                        "description": "Category name from the sql_search category list, or null"
+                    },
+                    "location": {
+                        "type": ["string", "null"],
+                        "description": "Area, landmark or district to search around, or null"
+                    },
+                    "radius": {
+                        "type": ["number", "null"],
+                        "description": "Search radius in km around location (default 10), or null"
+                    },
+                    "sort": {
+                        "type": "string",
+                        "enum": ["price_asc", "price_desc", "distance"],
+                        "description": "price_asc (cheapest first), price_desc or distance (nearest first, needs location)"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Number of packages to return (max 50)"
+                    }
+                },
+                "required": ["thought", "min_price", "max_price", "brands", "category_tag", "location", "radius", "sort", "limit"],
+                "additionalProperties": False
+            }
+        }
+    }
@@ -3,15 +3,14 @@ from shared.rag import GoogleSearcher
 from .tools import Tools
 from .cart import create_cart_curl, add_package_to_cart, delete_package_curl, list_cart_packages_curl, delete_cart_curl, create_order_curl
 from shared.utils.prompt_generator import PromptGenerator
+from shared.utils.image_description import image_description_service
 from anthropic import AsyncAnthropicBedrock
 from dotenv import load_dotenv
 from tenacity import before_sleep_log, retry, stop_after_attempt, wait_random_exponential
 import re
 import os
 import httpx
-import base64
 import logging
-import requests
 import json
 from datetime import datetime
 from typing import Dict, List, Any, Tuple, Optional, Union
@@ -306,6 +305,7 @@ class JibAI:
         Returns:
             Processed list of messages
         """
+        image_messages = []
         for message in input_list:
             # Handle case where content might be a string instead of a list
             if isinstance(message.get('content'), str):
@@ -316,13 +316,38 @@ class JibAI:
                 len(message['content']) > 0 and 
                 isinstance(message['content'][0], dict) and
                 message['content'][0].get('type') == 'image_url'):
-                
-                url = message['content'][0]['image_url']['url']
-                text_ocr = await self.ocr(url)
-                if text_ocr is not None:
-                    message['content'] = [{'type': 'text', 'text': text_ocr}]
+                image_messages.append(message)
+
+        # All images of the turn are described concurrently (capped by the shared service)
+        texts = await asyncio.gather(*(self.ocr(message['content'][0]['image_url']['url']) for message in image_messages))
+        for message, text_ocr in zip(image_messages, texts):
+            if text_ocr is not None:
+                message['content'] = [{'type': 'text', 'text': text_ocr}]
         return input_list
 
+    async def _describe_image(self, image) -> str:
+        """Ask Claude to describe a cached image"""
+        image_type = image.media_type if image.is_image else 'image/png'
+        #check image type, assuming url won't tell the image type
+        print(image_type)
+        message = await self.tell_claude_to_ocr(
+            model=Config.MODEL['haiku'],
+            max_tokens=Config.MAX_TOKENS,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        image.content_block(image_type),
+                        {
+                            "type": "text",
+                            "text": "อธิบายรูปนี้แหละสินค้าหรือบริการที่พบ"
+                        }
+                    ],
+                }
+            ],
+        )
+        return message.content[0].text
+
     async def ocr(self, url: str) -> Optional[str]:
         """
         Perform OCR on an image URL using Claude.
@@ -334,36 +359,11 @@ class JibAI:
             OCR extracted text or None if an error occurred
         """
         try:
-            # Get image type and encode to base64 # this one is not robust, need to improve
-            response = requests.get(url)
-            image_type = response.headers.get('content-type', 'image/png')
-            image_data = base64.standard_b64encode(response.content).decode("utf-8")
-            #check image type, assuming url won't tell the image type
-            print(image_type)
-            message = await self.tell_claude_to_ocr(
-                model=Config.MODEL['haiku'],
-                max_tokens=Config.MAX_TOKENS,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": image_type,
-                                    "data": image_data,
-                                },
-                            },
-                            {
-                                "type": "text",
-                                "text": "อธิบายรูปนี้แหละสินค้าหรือบริการที่พบ"
-                            }
-                        ],
-                    }
-                ],
-            )
-            ocr_text = '<IMAGE_DESCRIPTION>' + message.content[0].text + '</IMAGE_DESCRIPTION>'
+            # Descriptions are cached by image content, so history images are described once
+            description = await image_description_service.describe(url, self._describe_image, namespace=Config.MODEL['haiku'])
+            if description is None:
+                raise ValueError(f"could not fetch image {url}")
+            ocr_text = '<IMAGE_DESCRIPTION>' + description + '</IMAGE_DESCRIPTION>'
             return ocr_text
         except Exception as e:
             logger.error(f"Error at OCR: {e}")
@@ -443,7 +443,7 @@ class JibAI:
         final_tag = category_tag +" "+quality_tag
         if action_choice == '<GET_PACKAGE_METADATA>' or action_choice == 'GET_PACKAGE_METADATA':
             logger.info("Jib Agent : Retrieving package url...")
-            package_url_context = self.rag._get_package_url(search_query, preferred_area, radius, category_tag)
+            package_url_context = await self.rag._get_package_url_async(search_query, preferred_area, radius, category_tag)
             agent_scratchpad = {
                 "role":"assistant", 
                 "content":[
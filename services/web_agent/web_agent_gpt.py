@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from openai import AsyncAzureOpenAI
 import asyncio
 from shared.rag import RAG
+from shared.rag.catalog_store import get_catalog
 from .gpt_tools import GPTTools
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 from pydantic import BaseModel
@@ -78,12 +79,10 @@ class GPTBot:
                 logger.warning("Package dataframe not found in global storage")
                 return []
             
-            # Look for matching URLs in the URL column
-            matching_rows = package_df[package_df['URL'] == url]
+            # O(1) lookup in the catalog's URL index
+            indices = get_catalog(package_df, self.rag.index_list).rows_for_url(url)
             
-            if len(matching_rows) > 0:
-                # Return the dataframe indices
-                indices = matching_rows.index.tolist()
+            if len(indices) > 0:
                 logger.info(f"Found {len(indices)} matching packages for URL: {url}")
                 return indices
             else:
@@ -97,7 +96,7 @@ class GPTBot:
     def find_branch_locations_by_indices(self, package_indices: List[int]) -> List[BranchLocation]:
         """
         Find all branch locations using package indices.
-        Gets branch names from location column in CSV and coordinates from index_list.npy
+        Gets branch names from location column in CSV and coordinates from the branch table
         """
         if not package_indices:
             return []
@@ -117,26 +116,26 @@ class GPTBot:
                 logger.warning("Package dataframe not found in global storage")
                 return []
             
+            catalog = get_catalog(package_df, index_list)
+            
             # For each package index, get branch names and coordinates
             for package_index in package_indices:
                 # Get branch names from location column
-                package_row = package_df[package_df.index == package_index]
-                if package_row.empty:
+                if not 0 <= package_index < len(catalog):
                     continue
                 
-                location_text = package_row['location'].iloc[0]
+                location_text = catalog.value(package_index, 'location')
                 branch_names = self.extract_branch_names_from_location(location_text)
                 
                 # Get coordinates from index_list for this package
                 coordinates_list = []
-                for entry in index_list:
-                    if entry.get('index') == package_index:
-                        coordinates_list.append({
-                            'coordinates': entry.get('coor', []),
-                            'address': entry.get('address', ''),
-                            'map_url': entry.get('map_url', ''),
-                            'package_url': entry.get('package_url', ''),
-                        })
+                for branch in catalog.branches(package_index).tolist():
+                    coordinates_list.append({
+                        'coordinates': index_list.coor(branch),
+                        'address': index_list.address(branch),
+                        'map_url': index_list.map_url(branch),
+                        'package_url': index_list.package_url(branch),
+                    })
                 
                 # Combine branch names with coordinates (they should be aligned)
                 for i in range(min(len(branch_names), len(coordinates_list))):
@@ -348,6 +347,21 @@ class GPTBot:
             category_tag = args.get("category_tag", "")
             result = self.rag.sql_search(query=query, category_tag=category_tag)
             return result
+        elif tool_name == "filter_packages":
+            try:
+                result = self.rag.filter_packages(
+                    min_price=args.get("min_price"),
+                    max_price=args.get("max_price"),
+                    brands=args.get("brands"),
+                    category_tag=args.get("category_tag"),
+                    location=args.get("location"),
+                    radius=args.get("radius"),
+                    sort=args.get("sort", "price_asc"),
+                    limit=args.get("limit", 10),
+                )
+                return self.rag.format_filter_results(result)
+            except ValueError as e:
+                return f"Error filtering packages: {str(e)}"
         elif tool_name == "explore_data_structure":
             exploration_type = args["exploration_type"]
             result = self.rag.explore_data_structure(exploration_type=exploration_type)
@@ -364,7 +378,7 @@ class GPTBot:
         response = await self.invoke_gpt(
             model=MODEL,
             messages=messages,
-            tools=[self.tools.search_package_database, self.tools.fetch_package_details, self.tools.browse_broad_pages, self.tools.cart, self.tools.sql_search, self.tools.explore_data_structure, self.tools.smart_search_suggestions],
+            tools=[self.tools.search_package_database, self.tools.fetch_package_details, self.tools.browse_broad_pages, self.tools.cart, self.tools.sql_search, self.tools.filter_packages, self.tools.explore_data_structure, self.tools.smart_search_suggestions],
             tool_choice="auto",
             temperature=0.0,
             response_format=OutputFormat,
@@ -402,7 +416,8 @@ class GPTBot:
             thought = args["thought"]
             name = tool_call.function.name
             logger.info(f"Tools Calling. . . \n Thought: {thought} \n Tool: {name}")
-            tool_result = self.tools_calling(name, args)
+            # RAG tools are synchronous; keep them off the event loop
+            tool_result = await asyncio.to_thread(self.tools_calling, name, args)
 
             #append tool message block
             messages.append(response.choices[0].message)
@@ -1,24 +1,29 @@
-from .bm25_searcher import BM25Retriever
-from .semantic_searcher import SemanticRetriever
-from .rank_fusion import compute_rrf, get_top_k
-from .reranker import Reranker
+from .rank_fusion import rrf_scores, masked_top_k
+from .index_registry import get_retrieval_indexes
+from .geo_index import GeoIndex
+from .geocoder import geocoding_service
+from .category_index import load_hl_mapping
+from .context_renderer import get_context_renderer
+from .catalog_store import get_catalog
+from .catalog_db import get_catalog_db
+from .catalog_query import PandasQueryCompiler
+from .catalog_filter import DEFAULT_LIMIT
+from .fuzzy_index import get_fuzzy_index
+from .alias_matcher import alias_matcher
+from .airtable_mirror import infographic_mirror
+from shared.utils.image_cache import image_cache
 from dotenv import load_dotenv
 import os
-import pandas as pd
 import re
-import httpx
-import base64
 import requests
-import urllib.parse
 #geo dist
 import geopy.distance
 import numpy as np
 import asyncio
-from functools import lru_cache
+import threading
 import aiohttp
-from typing import Optional, Tuple
+from typing import Optional
 import logging
-import json
 
 
 
@@ -39,16 +44,37 @@ geocode_api = os.getenv('GEOCODE_API')
 
 
 #hl mapping loading
-# Get the directory of this file and navigate to hl_prompts
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(os.path.dirname(current_dir))
-hl_mapping_path = os.path.join(project_root, "hl_prompts", "hl_mapping.json")
-
-with open(hl_mapping_path, "r") as f:
-    loaded_list = json.load(f)
+loaded_list = load_hl_mapping()
 
 logger = logging.getLogger(__name__)
 
+# Sync entry points run their async pipeline on one long-lived loop, so the
+# per-loop async clients (reranker, geocoder, image cache) are created once and reused
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    if _sync_loop is None:
+        with _sync_loop_lock:
+            if _sync_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="rag-sync", daemon=True).start()
+                _sync_loop = loop
+    return _sync_loop
+
+def _run_sync(coro):
+    """Run an async RAG pipeline from synchronous code"""
+    loop = _background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("RAG sync entry points cannot be called from the RAG sync loop; await the async variant")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
 class RAG:
     def __init__(self, global_storage):
         self.global_storage = global_storage
@@ -57,37 +83,43 @@ class RAG:
         print(f"RAG : {self.knowledge_base.shape}")
         print(f"RAG : {self.knowledge_base.columns[0]}")
         
-        # Initialize core components
-        self.lexical_searcher = BM25Retriever(tokens_file=self.global_storage.doc_json)
-        self.semantic_searcher = SemanticRetriever(self.global_storage.embed_matrix)
+        # Borrow prebuilt indexes from the process-wide registry
+        indexes = get_retrieval_indexes(global_storage)
+        self.lexical_searcher = indexes.lexical
+        self.semantic_searcher = indexes.semantic
         
         self.embed_type = 'name'
         self.hl_map = loaded_list
         
         #for plus
-        self.semantic_searcher_plus = SemanticRetriever(self.global_storage.embed_matrix_plus)
-        self.lexical_searcher_plus = BM25Retriever(tokens_file=self.global_storage.doc_json_plus)
+        self.semantic_searcher_plus = indexes.semantic_plus
+        self.lexical_searcher_plus = indexes.lexical_plus
         #index list for last fetch
         self.index_list = global_storage.index_list
         self.index_list_plus = global_storage.index_list_plus
         
         #for web recommendation
         self.web_recommendation_json = global_storage.web_recommendation_json
-        self.semantic_searcher_hl = SemanticRetriever(global_storage.hl_embed)
-        self.semantic_searcher_brand = SemanticRetriever(global_storage.brand_embed)
-        self.semantic_searcher_cat = SemanticRetriever(global_storage.cat_embed)
-        self.semantic_searcher_tag = SemanticRetriever(global_storage.tag_embed)
-
-        self.lexical_searcher_hl = BM25Retriever(tokens_file=global_storage.hl_docs)
-        self.lexical_searcher_brand = BM25Retriever(tokens_file=global_storage.brand_docs)
-        self.lexical_searcher_cat = BM25Retriever(tokens_file=global_storage.cat_docs)
-        self.lexical_searcher_tag = BM25Retriever(tokens_file=global_storage.tag_docs)
+        self.semantic_searcher_hl = indexes.semantic_hl
+        self.semantic_searcher_brand = indexes.semantic_brand
+        self.semantic_searcher_cat = indexes.semantic_cat
+        self.semantic_searcher_tag = indexes.semantic_tag
+
+        self.lexical_searcher_hl = indexes.lexical_hl
+        self.lexical_searcher_brand = indexes.lexical_brand
+        self.lexical_searcher_cat = indexes.lexical_cat
+        self.lexical_searcher_tag = indexes.lexical_tag
+        self.reranker = indexes.reranker
+        self.geo_index = indexes.geo
+        self.category_index = indexes.categories
+        self.catalog_filter = indexes.filters
         
         # Add connection session for HTTP requests
         self._session: Optional[aiohttp.ClientSession] = None
-        
-        # Cache for geocoding results (LRU cache with max 1000 entries)
-        self._geocode_cache = {}
+
+    def _catalog(self):
+        """Columnar view of knowledge_base with URL and branch indexes (rebuilt on reload)"""
+        return get_catalog(self.knowledge_base, self.index_list)
 
     def _truncate_text(self, text: str, max_length: int = 100) -> str:
         """Helper method to truncate long text for logging purposes"""
@@ -99,45 +131,9 @@ class RAG:
         """
         Normalize common brand abbreviations and variations to full brand names.
         This helps with exact matching in database queries.
+        Aliases live in hl_prompts/query_aliases.json (hot reloaded).
         """
-        if not brand_query:
-            return brand_query
-            
-        # Convert to lowercase for case-insensitive matching
-        brand_lower = brand_query.lower().strip()
-        
-        # Brand mappings - add more as needed
-        brand_mappings = {
-            'baac': 'Bangkok Anti Aging Center',
-            'bangkok anti aging': 'Bangkok Anti Aging Center',
-            'bkk anti aging': 'Bangkok Anti Aging Center',
-            
-            # Add more common abbreviations here
-            'bh': 'Bangkok Hospital',
-            'bangkok hosp': 'Bangkok Hospital',
-            
-            'samitivej': 'โรงพยาบาลสมิติเวช',
-            'bumrungrad': 'โรงพยาบาลบำรุงราด',
-            'siriraj': 'โรงพยาบาลศิริราช',
-            
-            # Kasemrad variations
-            'เกษมราษฎร์': 'โรงพยาบาลเกษมราษฎร์',
-            'kasemrad': 'โรงพยาบาลเกษมราษฎร์',
-            
-            # Add more mappings as you discover common user patterns
-        }
-        
-        # Check for exact matches first
-        if brand_lower in brand_mappings:
-            return brand_mappings[brand_lower]
-            
-        # Check for partial matches (if brand_query contains the key)
-        for abbrev, full_name in brand_mappings.items():
-            if abbrev in brand_lower:
-                return full_name
-                
-        # If no match found, return original
-        return brand_query
+        return alias_matcher.normalize_brand(brand_query)
 
     async def _get_session(self) -> aiohttp.ClientSession:
         """Get or create aiohttp session with connection pooling"""
@@ -160,47 +156,41 @@ class RAG:
         if self._session and not self._session.closed:
             await self._session.close()
 
-    def _image_context_generator(self, image_urls):
+    def _build_image_context(self, image_urls, images):
         image_context = []
         image_context.append({"type":"text", "text":"<image_context>"})
 
-        for index, _url in enumerate(image_urls):
+        for index, (_url, image) in enumerate(zip(image_urls, images)):
+            if image is None:
+                continue
             image_url = _url['image_url']
-            image_data = base64.standard_b64encode(httpx.get(image_url).content).decode("utf-8")
-            image_context.append({"type":"image","source":{"type": "base64","media_type": 'image/png',"data": image_data,}})
+            image_context.append(image.content_block(image.media_type if image.is_image else 'image/png'))
             image_context.append({"type":"text", "text":f"<image_index={index}><image_url>{image_url}</image_url></image_index={index}>"})
 
         image_context.append({"type":"text","text":"</images_context>"})
         image_context_block = [{"role":"user", "content":image_context}]
 
         return image_context_block
+
+    def _image_context_generator(self, image_urls):
+        images = [image_cache.get_sync(_url['image_url']) for _url in image_urls]
+        return self._build_image_context(image_urls, images)
+
+    async def _image_context_generator_async(self, image_urls):
+        """Images come from the shared cache; misses are downloaded concurrently"""
+        images = await image_cache.prefetch([_url['image_url'] for _url in image_urls])
+        return self._build_image_context(image_urls, images)
     
     def _get_infographic_urls(self, category_tag:str):
-        #find hl_url from hl_map
-        hl_url = None
-        for d in self.hl_map:
-            if d['cat_name'].strip() in category_tag.strip() or category_tag.strip() in d['cat_name'].strip():
-                hl_url = d['hl_url']
-                break
+        #find hl_url from the category index
+        hl_url = self.category_index.hl_url(category_tag, fuzzy=True)
         print(f"hl_url : {hl_url}")
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
-
-        params = {
-            "filterByFormula": f'{{hl_url}}="{hl_url}"'
-        }
-
-        url = f'https://api.airtable.com/v0/app2CSihSxsRF1acK/tblNy0vqAW3FApPxU'
 
         try:
-            res = requests.get(url=url, headers=headers, params=params)
-            data = res.json()
-
-            print(f"data : {data}")
-
-
-            records = data.get('records')
+            # In-memory mirror first; live Airtable call only until the mirror has loaded
+            records = infographic_mirror.lookup('hl_url', hl_url)
+            if records is None:
+                records = self._fetch_infographic_records(hl_url)
 
             if len(records) == 0:
                 # No infographics
@@ -221,13 +211,27 @@ class RAG:
         except Exception as e:
             print(f"Something went wrong when trying to fetch infographics : {e}")
             return None
+
+    def _fetch_infographic_records(self, hl_url):
+        headers = {
+            "Authorization": f"Bearer {access_token}"
+        }
+
+        params = {
+            "filterByFormula": f'{{hl_url}}="{hl_url}"'
+        }
+
+        res = requests.get(url=infographic_mirror.url, headers=headers, params=params, timeout=10)
+        data = res.json()
+        print(f"data : {data}")
+        return data.get('records')
         
 
     def _initialize_components(self):
-        if self.lexical_searcher is None:
-            self.lexical_searcher = BM25Retriever(tokens_file=self.global_storage.doc_json)
-        if self.semantic_searcher is None:
-            self.semantic_searcher = SemanticRetriever(self.global_storage.embed_matrix)
+        if self.lexical_searcher is None or self.semantic_searcher is None:
+            indexes = get_retrieval_indexes(self.global_storage)
+            self.lexical_searcher = indexes.lexical
+            self.semantic_searcher = indexes.semantic
         if self.knowledge_base is None:
             self.knowledge_base = self.global_storage.knowledge_base
         
@@ -240,112 +244,124 @@ class RAG:
                 unique_images.append(image)
         return unique_images
 
-    @lru_cache(maxsize=1000)
-    def _get_geocode_cached(self, input_string: str, api_key: str = geocode_api) -> Tuple[Optional[float], Optional[float]]:
-        """Cached version of geocoding to avoid repeated API calls"""
-        if input_string in self._geocode_cache:
-            return self._geocode_cache[input_string]
-            
-        base_url = "https://maps.googleapis.com/maps/api/geocode/json"
-        params = {
-            "address": input_string,
-            "key": api_key
-        }
-
-        url = f"{base_url}?{urllib.parse.urlencode(params)}"
-        response = requests.get(url, timeout=10)  # Add timeout
-        data = response.json()
-
-        if data.get("status") == "OK":
-            results = data.get("results", [])
-            if results:
-                location = results[0]["geometry"]["location"]
-                lat = location["lat"]
-                lng = location["lng"]
-                result = (lat, lng)
-                self._geocode_cache[input_string] = result
-                return result
-            else:
-                print("No location found for that address")
-                result = (None, None)
-                self._geocode_cache[input_string] = result
-                return result
-        else:
-            result = (None, None)
-            self._geocode_cache[input_string] = result
-            return result
-
     def _get_geocode(self, input_string, api_key = geocode_api):
-        """Wrapper for the cached geocoding function"""
-        return self._get_geocode_cached(input_string, api_key)
+        """Blocking lookup through the shared geocoding service"""
+        return geocoding_service.geocode_sync(input_string, api_key)
+
+    async def _get_geocode_async(self, input_string, api_key = geocode_api):
+        return await geocoding_service.geocode(input_string, api_key)
     
     def _get_geo_distance(self, coor1, coor2):
         return float(geopy.distance.geodesic(coor1, coor2).km)
 
 
     
-    def _get_geo_mask(self, area:str, indexes_list, dist_threshold):
-        m = len(indexes_list)
-        ones_mask = np.array([1 for _ in range(m)])
-        
-        # Return all ones if area is unknown or empty
-        if not area or area == "<UNKNOWN>":
-            return ones_mask
-    
-        lat, lng = self._get_geocode(area)
+    def _geo_index_for(self, indexes_list) -> GeoIndex:
+        if indexes_list is self.index_list and self.geo_index is not None:
+            return self.geo_index
+        return GeoIndex(indexes_list)
+
+    def _geo_mask_for_location(self, lat, lng, indexes_list, dist_threshold):
+        """
+        Returns (mask, distances). distances is None when no location filter applies,
+        otherwise km from the geocoded area for every entry (for nearest-first ranking).
+        """
+        ones_mask = np.ones(len(indexes_list), dtype=np.int64)
         print(lat, lng)
         if lat and lng:
-            mask = []
-            for i in range(m):
-                try:
-                    _coor = indexes_list[i]['coor']
-                    coor1 = (float(_coor[0]), float(_coor[1]))
-                    coor2 = (float(lat), float(lng))
-                    dist = float(self._get_geo_distance(coor1, coor2))
-                    if dist <= dist_threshold:
-                        mask.append(1)
-                    else:
-                        mask.append(0)
-                except:
-                    # If there's any error processing coordinates, include the item
-                    mask.append(1)
-            
+            mask_array, distances = self._geo_index_for(indexes_list).radius_query(float(lat), float(lng), float(dist_threshold))
             # If mask is all zeros, return ones_mask instead
-            mask_array = np.array(mask)
-            return mask_array if mask_array.sum() > 0 else ones_mask
+            return (mask_array if mask_array.sum() > 0 else ones_mask), distances
         
-        return ones_mask
+        return ones_mask, None
+
+    def _get_geo_mask_and_distances(self, area:str, indexes_list, dist_threshold):
+        # Return all ones if area is unknown or empty
+        if not area or area == "<UNKNOWN>":
+            return np.ones(len(indexes_list), dtype=np.int64), None
+        lat, lng = self._get_geocode(area)
+        return self._geo_mask_for_location(lat, lng, indexes_list, dist_threshold)
+
+    async def _get_geo_mask_and_distances_async(self, area:str, indexes_list, dist_threshold):
+        if not area or area == "<UNKNOWN>":
+            return np.ones(len(indexes_list), dtype=np.int64), None
+        lat, lng = await self._get_geocode_async(area)
+        return self._geo_mask_for_location(lat, lng, indexes_list, dist_threshold)
+
+    def _get_geo_mask(self, area:str, indexes_list, dist_threshold):
+        mask, _ = self._get_geo_mask_and_distances(area, indexes_list, dist_threshold)
+        return mask
+
+    async def _get_geo_mask_async(self, area:str, indexes_list, dist_threshold):
+        mask, _ = await self._get_geo_mask_and_distances_async(area, indexes_list, dist_threshold)
+        return mask
 
 
 
 
 
     def _get_hl_mask(self, category_tag:str):
-        package_urls = []
-        # Search through hl_map for matching category
-        for d in self.hl_map:
-            #print(d['cat_name'], category_tag)
-            if d['cat_name'] == category_tag:
-                package_urls = d['packages']
-                break  # Exit loop once found
-        
-        m = len(self.index_list)
-        # If we found matching packages, create mask based on them
-        if len(package_urls) > 0:
-            mask = []
-            for i in range(m):
-                if self.index_list[i]['package_url'] in package_urls:
-                    mask.append(1)
-                else:
-                    mask.append(0)
-            return np.array(mask)
-        else:
-            # Return all ones if no matching category or packages found
-            return np.array([1 for _ in range(m)])
+        """Precomputed index_list row mask for the category (all ones when unknown)"""
+        return self.category_index.row_mask(category_tag)
+
+
+    def _fused_scores(self, query: str) -> np.ndarray:
+        """Lexical + semantic RRF score per index_list entry, fused once per query"""
+        lexical_ranks = self.lexical_searcher.rank_array(query)
+        semantic_ranks = self.semantic_searcher.rank_array(query)
+        print("Rank fusion : Complete!")
+        return rrf_scores([lexical_ranks, semantic_ranks])
+
+    async def _fused_scores_async(self, query: str) -> np.ndarray:
+        """Same as _fused_scores, with BM25 and the embedding call running concurrently"""
+        lexical_ranks, semantic_ranks = await asyncio.gather(
+            asyncio.to_thread(self.lexical_searcher.rank_array, query),
+            asyncio.to_thread(self.semantic_searcher.rank_array, query),
+        )
+        print("Rank fusion : Complete!")
+        return rrf_scores([lexical_ranks, semantic_ranks])
+
+    async def _masked_retrieval_async(self, query: str, area: str, radius: int, category_tag: str):
+        """
+        Geocoding/geo mask overlaps with BM25 and the query embedding.
+        Returns (combined_mask, combined_mask_len, fused_scores)
+        """
+        geo_mask, fused_scores = await asyncio.gather(
+            self._get_geo_mask_async(area, self.index_list, radius),
+            self._fused_scores_async(query),
+        )
+        print(f"geo_mask: {int(geo_mask.sum())} items")
+        hl_mask = self._get_hl_mask(category_tag)
+        print(f"hl_mask: {int(hl_mask.sum())} items")
 
+        # Apply both masks and then calculate the combined length
+        combined_mask = geo_mask * hl_mask
+        combined_mask_len = int(combined_mask.sum())
+        print(f"combined_mask: {combined_mask_len} items")
+        if combined_mask_len == 0:
+            print("****filters too much, apply only hl_mask****")
+            combined_mask = hl_mask
+            combined_mask_len = int(combined_mask.sum())
+        return combined_mask, combined_mask_len, fused_scores
+
+    async def _rerank_pair_async(self, query: str, top_k_indexes, top_n: int, top_k_indexes_non_filtered, top_n_non_filtered: int):
+        """Dual-view rerank: one Cohere call over the union of the filtered and non-filtered candidates"""
+        filtered, non_filtered = await self.reranker.rerank_views(
+            query, [(top_k_indexes, top_n), (top_k_indexes_non_filtered, top_n_non_filtered)]
+        )
+        return filtered, non_filtered
+
+    async def _infographic_context_async(self, category_tag: str):
+        img_url_resp = await asyncio.to_thread(self._get_infographic_urls, category_tag)
+        #truncate with top 5 
+        if img_url_resp:
+            return await self._image_context_generator_async(img_url_resp[:5])
+        return [{"role":"user", "content":"<IMAGE_CONTEXT>No infographics</IMAGE_CONTEXT>"}]
 
-    
     def forward(self,query: str, preferred_area: str, radius: int, category_tag:str) -> str:
+        return _run_sync(self.forward_async(query, preferred_area, radius, category_tag))
+
+    async def forward_async(self,query: str, preferred_area: str, radius: int, category_tag:str):
         DEFAULT_RADIUS_THRESHOLD = 15 # in Km
         K = 150
         N = 10
@@ -354,29 +370,14 @@ class RAG:
         except:
             radius = DEFAULT_RADIUS_THRESHOLD
         self._initialize_components()
-        geo_mask = self._get_geo_mask(preferred_area, self.index_list, radius)
-        print(geo_mask)
-        print(sum(geo_mask))
-        hl_mask = self._get_hl_mask(category_tag)
-        print(hl_mask)
-        print(sum(hl_mask))
-        
-        # Apply both masks and then calculate the combined length
-        combined_mask = geo_mask * hl_mask
-        combined_mask_len = sum(combined_mask)
-        print(combined_mask)
-        print(combined_mask_len)
-        if combined_mask_len == 0:
-            print("****filters too much, apply only hl_mask****")
-            combined_mask = hl_mask
-            combined_mask_len = sum(combined_mask)
 
-        lexical_dict = self.lexical_searcher.forward(query)
-        semantic_dict = self.semantic_searcher.forward(query)
-        dict_rrf_score = compute_rrf(lexical_dict, semantic_dict, mask=combined_mask)
-        one_mask = np.array([1 for _ in range(len(self.index_list))])
-        dict_rrf_score_non_filtered = compute_rrf(lexical_dict, semantic_dict, mask=one_mask)
-        
+        # Infographics (Airtable + image downloads) do not depend on retrieval
+        image_context_task = asyncio.create_task(self._infographic_context_async(category_tag))
+        try:
+            combined_mask, combined_mask_len, fused_scores = await self._masked_retrieval_async(query, preferred_area, radius, category_tag)
+        except BaseException:
+            image_context_task.cancel()
+            raise
 
         #lower bound based on combined mask
         if combined_mask_len < K:
@@ -384,17 +385,12 @@ class RAG:
             if combined_mask_len < N:
                 N = int(combined_mask_len)
 
-        dict_top_k = get_top_k(dict_rrf_score, k=K)
-        dict_top_k_non_filtered = get_top_k(dict_rrf_score_non_filtered, k=20)
-        top_k_indexes = [int(idx) for idx in dict_top_k.keys()]
-        top_k_indexes_non_filtered = [int(idx) for idx in dict_top_k_non_filtered.keys()]
-        reranker = Reranker(top_k_indexes, self.knowledge_base,self.index_list) 
-        reranker_non_filtered = Reranker(top_k_indexes_non_filtered, self.knowledge_base,self.index_list)
+        top_k_indexes = masked_top_k(fused_scores, combined_mask, K)[0].tolist()
+        top_k_indexes_non_filtered = masked_top_k(fused_scores, None, 20)[0].tolist()
         print(N, K)
-        #print its type too
-        print(type(N), type(K))
-        rerank_top_k = reranker.forward(query, top_n=N)
-        rerank_top_k_non_filtered = reranker_non_filtered.forward(query, top_n=10)
+        rerank_top_k, rerank_top_k_non_filtered = await self._rerank_pair_async(
+            query, top_k_indexes, N, top_k_indexes_non_filtered, 10
+        )
         
         #top_p_index = list(set([self.index_list[ind]['index'] for ind in rerank_top_k]))
             
@@ -402,86 +398,25 @@ class RAG:
         
         print(f'RAG retrieval results W/FILTER, type:{self.embed_type}:')
         for index in rerank_top_k:
-            true_index = self.index_list[index]['index']
-            truncated_text = self._truncate_text(self.index_list[index]['text'])
+            true_index = int(self.index_list.package_index[index])
+            truncated_text = self._truncate_text(self.index_list.text(index))
             print(f"Local/Global Index : {index} : {true_index} \n {truncated_text}")
         print('$'*20)
 
         print(f'RAG retrieval results NO-FILTERED, type:{self.embed_type}:')
         for index in rerank_top_k_non_filtered:
-            true_index = self.index_list[index]['index']
-            truncated_text = self._truncate_text(self.index_list[index]['text'])
+            true_index = int(self.index_list.package_index[index])
+            truncated_text = self._truncate_text(self.index_list.text(index))
             print(f"Local/Global Index : {index} : {true_index} \n {truncated_text}")
         print('$'*20)
 
         
-        context = ''
-        for index in rerank_top_k:
-            clinic_sample = self.index_list[index]
-            #clinic_sample has index, text, address, coor, map_url
-            true_index = clinic_sample['index']
-            sample = self.knowledge_base.iloc[true_index]
-            context+=f"""
-            <RETRIEVED_PACKAGE_{true_index}>
-            <package_name>{clinic_sample['text']}</package_name>
-            <package_url>{sample.URL}</package_url>
-            <package_original_price>{sample['Original Price']}</package_original_price>
-            <package_hdmall_price>{sample['HDmall Price']}</package_hdmall_price>
-            <package_cash_discount>{sample['Cash Discount']}</package_cash_discount>
-            <package_cash_price>{sample['Cash Price']}</package_cash_price>
-            <package_reserve/deposit_price>{sample['Deposit Price']}</package_reserve/deposit_price>
-            <package_price_details>{sample['Price Details']}</package_price_details>
-            <package_booking_detail>{sample['Payment Booking Info']}</package_booking_detail>
-            <full_or_starting_price?>{sample['Full or Starting Price']}</full_or_starting_price?>
-            <installment_price_per_month>{sample['Installment Price']}</installment_price_per_month>
-            <installment_months>{sample['Installment Month']}</installment_months>
-            <hospital_or_shop_name>{sample['Shop Name']} {sample['Brand']}</hospital_or_shop_name>
-            <selling_points>{sample['Preview 1-10']}{sample['Selling Point']}</selling_points>
-            <min_or_max_age>{sample['Min/Max Age']}</min_or_max_age>
-            <location_information> Address : {clinic_sample['address']} \n Google Map : {clinic_sample['map_url']}</location_information>
-            <package_information>{sample['Package Details']}{sample['Important Info']}{sample['General Info']}{sample['FAQ']}</package_information>
-            </RETRIEVED_PACKAGE_{index}>
-            """
-    
+        contexts = get_context_renderer(self.knowledge_base, self.index_list)
+        context = ''.join(contexts.full(index) for index in rerank_top_k)
         #non filtered
-        context_non_filtered = ''
-        for index in rerank_top_k_non_filtered:
-            clinic_sample = self.index_list[index]
-            true_index = clinic_sample['index']
-            sample = self.knowledge_base.iloc[true_index]
-            context_non_filtered+=f"""
-            <RETRIEVED_PACKAGE_{true_index}>
-            <package_name>{clinic_sample['text']}</package_name>
-            <package_url>{sample.URL}</package_url>
-            <package_original_price>{sample['Original Price']}</package_original_price>
-            <package_hdmall_price>{sample['HDmall Price']}</package_hdmall_price>
-            <package_cash_discount>{sample['Cash Discount']}</package_cash_discount>
-            <package_cash_price>{sample['Cash Price']}</package_cash_price>
-            <package_reserve/deposit_price>{sample['Deposit Price']}</package_reserve/deposit_price>
-            <package_price_details>{sample['Price Details']}</package_price_details>
-            <package_booking_detail>{sample['Payment Booking Info']}</package_booking_detail>
-            <full_or_starting_price?>{sample['Full or Starting Price']}</full_or_starting_price?>
-            <installment_price_per_month>{sample['Installment Price']}</installment_price_per_month>
-            <installment_months>{sample['Installment Month']}</installment_months>
-            <hospital_or_shop_name>{sample['Shop Name']} {sample['Brand']}</hospital_or_shop_name>
-            <selling_points>{sample['Preview 1-10']}{sample['Selling Point']}</selling_points>
-            <min_or_max_age>{sample['Min/Max Age']}</min_or_max_age>
-            <location_information> Address : {clinic_sample['address']} \n Google Map : {clinic_sample['map_url']}</location_information>
-            <package_information>{sample['Package Details']}{sample['Important Info']}{sample['General Info']}{sample['FAQ']}</package_information>
-            </RETRIEVED_PACKAGE_{true_index}>
-            """
-
-        
+        context_non_filtered = ''.join(contexts.full(index) for index in rerank_top_k_non_filtered)
 
-        img_url_resp = self._get_infographic_urls(category_tag)
-        #truncate with top 5 
-        if img_url_resp:
-            if len(img_url_resp) > 5:
-                image_context = self._image_context_generator(img_url_resp[:5])
-            else:
-                image_context = self._image_context_generator(img_url_resp)
-        else:
-            image_context = [{"role":"user", "content":"<IMAGE_CONTEXT>No infographics</IMAGE_CONTEXT>"}]
+        image_context = await image_context_task
             
         
         
@@ -500,19 +435,17 @@ class RAG:
         out = self._image_context_generator(package_urls)
         return out
     def _get_package_url(self,query: str, preferred_area: str, radius: int, category_tag:str):
+        return _run_sync(self._get_package_url_async(query, preferred_area, radius, category_tag))
+
+    async def _get_package_url_async(self,query: str, preferred_area: str, radius: int, category_tag:str):
         self._initialize_components()
         
         # Extract and normalize brand if present in query
         normalized_query = query
-        # Simple brand extraction - look for common brand patterns
-        for brand_abbrev in ['baac', 'bh', 'bangkok anti aging', 'samitivej', 'bumrungrad', 'siriraj', 'เกษมราษฎร์', 'kasemrad']:
-            if brand_abbrev.lower() in query.lower():
-                original_brand = brand_abbrev
-                normalized_brand = self.normalize_brand_name(brand_abbrev)
-                if normalized_brand != original_brand:
-                    normalized_query = normalized_query.replace(original_brand, normalized_brand)
-                    print(f"Search query brand normalization: '{original_brand}' → '{normalized_brand}'")
-                break
+        brand_hit = alias_matcher.first_brand(query)
+        if brand_hit is not None and brand_hit.target != brand_hit.term:
+            normalized_query = re.sub(re.escape(brand_hit.term), lambda _: brand_hit.target, query, flags=re.IGNORECASE)
+            print(f"Search query brand normalization: '{brand_hit.term}' → '{brand_hit.target}'")
         DEFAULT_RADIUS_THRESHOLD = 10
         area = preferred_area
         K = 15
@@ -521,25 +454,7 @@ class RAG:
             radius = int(radius)
         except:
             radius = DEFAULT_RADIUS_THRESHOLD
-        self._initialize_components()
-        geo_mask = self._get_geo_mask(area, self.index_list, radius)
-        print(f"geo_mask: {sum(geo_mask)} items")
-        hl_mask = self._get_hl_mask(category_tag)
-        print(f"hl_mask: {sum(hl_mask)} items")
-        # Apply both masks and then calculate the combined length
-        combined_mask = geo_mask * hl_mask
-        combined_mask_len = sum(combined_mask)
-        print(f"combined_mask: {combined_mask_len} items")
-        if combined_mask_len == 0:
-            print("****filters too much, apply only hl_mask****")
-            combined_mask = hl_mask
-            combined_mask_len = sum(combined_mask)
-
-        lexical_dict = self.lexical_searcher.forward(normalized_query)
-        semantic_dict = self.semantic_searcher.forward(normalized_query)
-        dict_rrf_score = compute_rrf(lexical_dict, semantic_dict, mask=combined_mask)
-        one_mask = np.array([1 for _ in range(len(self.index_list))])
-        dict_rrf_score_non_filtered = compute_rrf(lexical_dict, semantic_dict, mask=one_mask)
+        combined_mask, combined_mask_len, fused_scores = await self._masked_retrieval_async(normalized_query, area, radius, category_tag)
 
         #lower bound based on combined mask
         if combined_mask_len < K:
@@ -547,67 +462,30 @@ class RAG:
             if combined_mask_len < N:
                 N = int(combined_mask_len)
 
-        dict_top_k = get_top_k(dict_rrf_score, k=K)
-        dict_top_k_non_filtered = get_top_k(dict_rrf_score_non_filtered, k=150)
-        top_k_indexes = [int(idx) for idx in dict_top_k.keys()]
-        top_k_indexes_non_filtered = [int(idx) for idx in dict_top_k_non_filtered.keys()]
-        reranker = Reranker(top_k_indexes, self.knowledge_base,self.index_list) 
-        reranker_non_filtered = Reranker(top_k_indexes_non_filtered, self.knowledge_base,self.index_list)
+        top_k_indexes = masked_top_k(fused_scores, combined_mask, K)[0].tolist()
+        top_k_indexes_non_filtered = masked_top_k(fused_scores, None, 150)[0].tolist()
         print(N, K)
-        #print its type too
-        print(type(N), type(K))
-        rerank_top_k = reranker.forward(normalized_query, top_n=N)
-        rerank_top_k_non_filtered = reranker_non_filtered.forward(normalized_query, top_n=2)
+        rerank_top_k, rerank_top_k_non_filtered = await self._rerank_pair_async(
+            normalized_query, top_k_indexes, N, top_k_indexes_non_filtered, 2
+        )
 
         print(f'RAG retrieval results W/FILTER, type:{self.embed_type}:')
         for index in rerank_top_k:
-            true_index = self.index_list[index]['index']
-            truncated_text = self._truncate_text(self.index_list[index]['text'])
+            true_index = int(self.index_list.package_index[index])
+            truncated_text = self._truncate_text(self.index_list.text(index))
             print(f"Local/Global Index : {index} : {true_index} \n {truncated_text}")
         print('$'*20)
 
         print(f'RAG retrieval results NO-FILTERED, type:{self.embed_type}:')
         for index in rerank_top_k_non_filtered:
-            true_index = self.index_list[index]['index']
-            truncated_text = self._truncate_text(self.index_list[index]['text'])
+            true_index = int(self.index_list.package_index[index])
+            truncated_text = self._truncate_text(self.index_list.text(index))
             print(f"Local/Global Index : {index} : {true_index} \n {truncated_text}")
         print('$'*20)
 
-        context = ''
-        context_non_filtered = ''
-        for index in rerank_top_k:
-            clinic_sample = self.index_list[index]
-            true_index = clinic_sample['index']
-            sample = self.knowledge_base.iloc[true_index]
-            context+=f"""
-            <RETRIEVED_PACKAGE_{true_index} type=highlights>
-            <package_name>{clinic_sample['text']}</package_name>
-            <package_url>{sample.URL}</package_url>
-            <package_original_price>{sample['Original Price']}</package_original_price>
-            <package_hdmall_price>{sample['HDmall Price']}</package_hdmall_price>
-            <package_cash_discount>{sample['Cash Discount']}</package_cash_discount>
-            <package_cash_price>{sample['Cash Price']}</package_cash_price>
-            <package_reserve/deposit_price>{sample['Deposit Price']}</package_reserve/deposit_price>
-            <full_or_starting_price?>{sample['Full or Starting Price']}</full_or_starting_price?>
-            </RETRIEVED_PACKAGE_{true_index}>
-            """
-
-        for index in rerank_top_k_non_filtered:
-            clinic_sample = self.index_list[index]
-            true_index = clinic_sample['index']
-            sample = self.knowledge_base.iloc[true_index]
-            context_non_filtered+=f"""
-            <RETRIEVED_PACKAGE_{true_index} type=normal>
-            <package_name>{clinic_sample['text']}</package_name>
-            <package_url>{sample.URL}</package_url>
-            <package_original_price>{sample['Original Price']}</package_original_price>
-            <package_hdmall_price>{sample['HDmall Price']}</package_hdmall_price>
-            <package_cash_discount>{sample['Cash Discount']}</package_cash_discount>
-            <package_cash_price>{sample['Cash Price']}</package_cash_price>
-            <package_reserve/deposit_price>{sample['Deposit Price']}</package_reserve/deposit_price>
-            <full_or_starting_price?>{sample['Full or Starting Price']}</full_or_starting_price?>
-            </RETRIEVED_PACKAGE_{true_index}>
-            """
+        contexts = get_context_renderer(self.knowledge_base, self.index_list)
+        context = ''.join(contexts.metadata(index, 'highlights') for index in rerank_top_k)
+        context_non_filtered = ''.join(contexts.metadata(index, 'normal') for index in rerank_top_k_non_filtered)
         text_context = context+context_non_filtered
 
         #TODO : fix this
@@ -632,54 +510,23 @@ class RAG:
     
     def get_package_info_from_url(self, package_url: str):
         self._initialize_components()
-        out = self.knowledge_base[self.knowledge_base['URL'] == package_url]
-        if out.empty:
+        context = get_context_renderer(self.knowledge_base, self.index_list).package_info_by_url(package_url)
+        if context is None:
             return "no package found, please check your package_url again"
-        
-        # Get the first (and should be only) matching row
-        row = out.iloc[0]
-        
-        context = f"""
-        <PACKAGE_INFO>
-        <package_name>{row['Name']}</package_name>
-        <package_url>{row['URL']}</package_url>
-        <package_information>{row['Package Details']}{row['Important Info']}{row['General Info']}{row['FAQ']}</package_information>
-        <package_original_price>{row['Original Price']}</package_original_price>
-        <package_hdmall_price>{row['HDmall Price']}</package_hdmall_price>
-        <package_cash_discount>{row['Cash Discount']}</package_cash_discount>
-        <package_cash_price>{row['Cash Price']}</package_cash_price>
-        <package_reserve/deposit_price>{row['Deposit Price']}</package_reserve/deposit_price>
-        <package_price_details>{row['Price Details']}</package_price_details>
-        <package_booking_detail>{row['Payment Booking Info']}</package_booking_detail>
-        <full_or_starting_price?>{row['Full or Starting Price']}</full_or_starting_price?>
-        <installment_price_per_month>{row['Installment Price']}</installment_price_per_month>
-        <installment_months>{row['Installment Month']}</installment_months>
-        <hospital_or_shop_name>{row['Shop Name']} {row['Brand']}</hospital_or_shop_name>
-        <selling_points>{row['Preview 1-10']}{row['Selling Point']}</selling_points>
-        <min_or_max_age>{row['Min/Max Age']}</min_or_max_age>
-        <location_information> Address : {row['location']}</location_information>
-        </PACKAGE_INFO>
-        """
         return context
 
 
 
 
     def search_for_web(self,query: str):
-        #make one mask 
-        one_mask = np.array([1 for _ in range(len(self.index_list))])
-
-
-        lexical_dict = self.lexical_searcher.forward(query)
-        semantic_dict = self.semantic_searcher.forward(query)
-        dict_rrf_score = compute_rrf(lexical_dict, semantic_dict, mask=one_mask)
-        #get keys of dict_rrf_score
-        idx_list = list(dict_rrf_score.keys())
-        true_index_list = list(set([self.index_list[index]['index'] for index in idx_list[:100]]))
+        fused_scores = self._fused_scores(query)
+        idx_list = masked_top_k(fused_scores, None, 100)[0].tolist()
+        true_index_list = list(set(self.index_list.package_indices(idx_list).tolist()))
         print(f"idx_list BEFORE: {len(true_index_list)} items")
+        catalog = self._catalog()
         brand_rank_list = []
         for index in true_index_list:
-            brand_rank = self.knowledge_base.iloc[index]['Brand Ranking (Position)']
+            brand_rank = catalog.value(index, 'Brand Ranking (Position)')
             brand_rank_list.append((brand_rank, index))
         brand_rank_list = sorted(brand_rank_list, key=lambda x: x[0])
         print(f"brand_rank_list: {len(brand_rank_list)} items sorted by rank")
@@ -691,8 +538,7 @@ class RAG:
         highlight_name_list = []
         brands = []
         for true_index in true_index_list:
-            sample = self.knowledge_base.iloc[true_index]
-            sample = self.knowledge_base.iloc[true_index]
+            sample = catalog.row(true_index)
             ###
             type = 'package'
             package_name = sample['Name']
@@ -710,10 +556,8 @@ class RAG:
                 'brand_url':brand_url,
                 'brand_rank':int(brand_rank)
             })
-            for d in self.hl_map:
-                if category == d['cat_name']:
-                    highlight_name_list.append(d['cat_name'])
-                    break
+            if category in self.category_index.hl_urls:
+                highlight_name_list.append(category)
             package_list.append({
                 'type':type,
                 'package_name':package_name,
@@ -728,13 +572,10 @@ class RAG:
         highlight_name_list = list(set(highlight_name_list))
         highlight_list = []
         for hl_name in highlight_name_list:
-            for d in self.hl_map:
-                if hl_name == d['cat_name']:
-                    highlight_list.append({
-                        'hl_name':hl_name,
-                        'hl_url':d['hl_url']
-                    })
-                    break
+            highlight_list.append({
+                'hl_name':hl_name,
+                'hl_url':self.category_index.hl_urls[hl_name]
+            })
         result = {
             'search_query':query,
             'search_result':{
@@ -763,6 +604,9 @@ class RAG:
 
 
     def ads_forward(self,input_block: dict) -> str:
+        return _run_sync(self.ads_forward_async(input_block))
+
+    async def ads_forward_async(self,input_block: dict):
 
         search_query = input_block['search_query']
         location = input_block['location']
@@ -772,25 +616,7 @@ class RAG:
         N = 10
 
         self._initialize_components()
-        geo_mask = self._get_geo_mask(location, self.index_list, radius)
-        print(f"geo_mask: {sum(geo_mask)} items")
-        hl_mask = self._get_hl_mask(category_tag)
-        print(f"hl_mask: {sum(hl_mask)} items")
-        
-        # Apply both masks and then calculate the combined length
-        combined_mask = geo_mask * hl_mask
-        combined_mask_len = sum(combined_mask)
-        print(f"combined_mask: {combined_mask_len} items")
-        if combined_mask_len == 0:
-            print("****filters too much, apply only hl_mask****")
-            combined_mask = hl_mask
-            combined_mask_len = sum(combined_mask)
-
-        lexical_dict = self.lexical_searcher.forward(search_query)
-        semantic_dict = self.semantic_searcher.forward(search_query)
-        dict_rrf_score = compute_rrf(lexical_dict, semantic_dict, mask=combined_mask)
-        one_mask = np.array([1 for _ in range(len(self.index_list))])
-        dict_rrf_score_non_filtered = compute_rrf(lexical_dict, semantic_dict, mask=one_mask)
+        combined_mask, combined_mask_len, fused_scores = await self._masked_retrieval_async(search_query, location, radius, category_tag)
         
         #lower bound based on combined mask
         if combined_mask_len < K:
@@ -798,21 +624,16 @@ class RAG:
             if combined_mask_len < N:
                 N = int(combined_mask_len)
 
-        dict_top_k = get_top_k(dict_rrf_score, k=K)
-        dict_top_k_non_filtered = get_top_k(dict_rrf_score_non_filtered, k=150)
-        top_k_indexes = [int(idx) for idx in dict_top_k.keys()]
-        top_k_indexes_non_filtered = [int(idx) for idx in dict_top_k_non_filtered.keys()]
-        reranker = Reranker(top_k_indexes, self.knowledge_base,self.index_list) 
-        reranker_non_filtered = Reranker(top_k_indexes_non_filtered, self.knowledge_base,self.index_list)
+        top_k_indexes = masked_top_k(fused_scores, combined_mask, K)[0].tolist()
+        top_k_indexes_non_filtered = masked_top_k(fused_scores, None, 150)[0].tolist()
         print(N, K)
-        #print its type too
-        print(type(N), type(K))
-        rerank_top_k = reranker.forward(search_query, top_n=N)
-        rerank_top_k_non_filtered = reranker_non_filtered.forward(search_query, top_n=10)
+        rerank_top_k, rerank_top_k_non_filtered = await self._rerank_pair_async(
+            search_query, top_k_indexes, N, top_k_indexes_non_filtered, 10
+        )
         
         # Convert local indices to true indices first
-        filtered_true_indices = [self.index_list[idx]['index'] for idx in rerank_top_k]
-        non_filtered_true_indices = [self.index_list[idx]['index'] for idx in rerank_top_k_non_filtered]
+        filtered_true_indices = self.index_list.package_indices(rerank_top_k).tolist()
+        non_filtered_true_indices = self.index_list.package_indices(rerank_top_k_non_filtered).tolist()
         
         # Take top 3 from filtered results
         top_3_filtered = filtered_true_indices[:3]
@@ -828,16 +649,17 @@ class RAG:
         
 
         
+        catalog = self._catalog()
         print(f'RAG retrieval results for ADS (top 5):')
         for index in final_true_indices:
-            package_name = self.knowledge_base.iloc[index]['Name']
+            package_name = catalog.value(index, 'Name')
             truncated_name = self._truncate_text(package_name)
             print(f"Global Index : {index} \n {truncated_name}")
         print('$'*20)
 
         contextual_ads_block = []
         for index in final_true_indices:
-            sample = self.knowledge_base.iloc[index]
+            sample = catalog.row(index)
             name = sample['Name']
             image = sample['Package Picture']
             url = sample['URL']
@@ -871,33 +693,25 @@ class RAG:
             semantic_engine = self.semantic_searcher_hl
             lexical_engine = self.lexical_searcher_hl
             knowledge = self.web_recommendation_json['highlights_data']
-            one_mask = np.array([1 for _ in range(len(knowledge))])
         elif type == 'brand':
             semantic_engine = self.semantic_searcher_brand
             lexical_engine = self.lexical_searcher_brand
             knowledge = self.web_recommendation_json['brand_data']
-            one_mask = np.array([1 for _ in range(len(knowledge))])
         elif type == 'cat':
             semantic_engine = self.semantic_searcher_cat
             lexical_engine = self.lexical_searcher_cat
             knowledge = self.web_recommendation_json['category_data']
-            one_mask = np.array([1 for _ in range(len(knowledge))])
         elif type == 'tag':
             semantic_engine = self.semantic_searcher_tag
             lexical_engine = self.lexical_searcher_tag
             knowledge = self.web_recommendation_json['tags_data']
-            one_mask = np.array([1 for _ in range(len(knowledge))])
 
         
         #text with cohere embeddings
 
-        semantic_dict = semantic_engine.forward_cohere(normalized_query)
-        lexical_dict = lexical_engine.forward(normalized_query)
-        dict_rrf_score = compute_rrf(lexical_dict, semantic_dict, mask=one_mask)
-        #get keys of dict_rrf_score
-        top_k_indexes = [int(idx) for idx in dict_rrf_score.keys()]
-        top_k_indexes = sorted(top_k_indexes, key=lambda x: dict_rrf_score[x], reverse=True)
-        top_k_indexes = top_k_indexes[:10]
+        lexical_ranks = lexical_engine.rank_array(normalized_query)
+        semantic_ranks = semantic_engine.rank_array_cohere(normalized_query)
+        top_k_indexes = masked_top_k(rrf_scores([lexical_ranks, semantic_ranks]), None, 10)[0].tolist()
         print(top_k_indexes)
         context = ""
         print(f"len(knowledge) : {len(knowledge)}")
@@ -911,246 +725,158 @@ class RAG:
         """
         Classify user query into a category tag using simple keyword matching.
         This is a lightweight classification for SQL masking.
+        Keywords live in hl_prompts/query_aliases.json (hot reloaded).
         """
-        query_lower = query.lower()
-        
-        # Define keyword mapping for common categories
-        category_mappings = {
-            "ฉีดวัคซีน HPV (HPV Vaccine)": ["hpv", "วัคซีน hpv", "cervical cancer", "มะเร็งปากมดลูก"],
-            "โปรแกรมตรวจสุขภาพ (Health Checkup)": ["ตรวจสุขภาพ", "health checkup", "checkup", "ตรวจร่างกาย"],
-            "ตรวจตับ (Liver Function Test)": ["ตรวจตับ", "liver", "ไขมันพอกตับ", "fibroscan"],
-            "ตรวจภูมิแพ้และภาวะแพ้ (Allergy Test)": ["ภูมิแพ้", "allergy", "แพ้", "allergen"],
-            "ตรวจการนอน (Sleep Test)": ["การนอน", "sleep", "นอนกรน", "sleep apnea"],
-            "ตรวจระดับฮอร์โมน (Hormone Test)": ["ฮอร์โมน", "hormone", "testosterone", "estrogen"],
-            "ฟอกสีฟัน (Teeth Whitening)": ["ฟอกสีฟัน", "teeth whitening", "ฟอกฟัน", "cool light"],
-            "อุดฟัน (Dental Filling)": ["อุดฟัน", "dental filling", "อุด", "ฟันผุ"],
-            "ถอนหรือผ่าฟันคุด": ["ฟันคุด", "wisdom tooth", "ถอนฟัน", "ผ่าฟัน"],
-            "กำจัดขนรักแร้ (Armpit Hair Removal)": ["กำจัดขน", "hair removal", "รักแร้", "armpit", "laser hair"],
-            "ทำ Pico Laser": ["pico", "laser", "picosecond", "ปิโก"],
-            "ทำอัลเทอร์รา (Ulthera)": ["ulthera", "อัลเทอร์รา", "ultherapy", "ยกกระชับ"],
-            "ทำ Morpheus 8": ["morpheus", "มอร์เฟียส", "morpheus 8", "rf microneedling"],
-            "รักษาหลุมสิว ลดรอยสิว": ["หลุมสิว", "รอยสิว", "acne scar", "สิว", "subcision"],
-            "รักษาแผลเป็นคีลอยด์ (keloid treatment)": ["คีลอยด์", "keloid", "แผลเป็น", "scar"],
-            "ตรวจโรคติดต่อทางเพศสัมพันธ์ (STD)": ["std", "โรคติดต่อทางเพศ", "sexually transmitted", "ติดต่อทางเพศ"],
-            "ตรวจมะเร็งสำหรับผู้หญิง": ["มะเร็งเต้านม", "breast cancer", "มะเร็งปากมดลูก", "thinprep", "mammogram"],
-            "ลดเหงื่อ ลดกลิ่นตัว": ["เหงื่อ", "กลิ่นตัว", "botox armpit", "reduce sweat"],
-            "ตรวจก่อนแต่งงาน (Pre-Marriage Checkup)": ["ก่อนแต่งงาน", "pre marriage", "ก่อนมีลูก", "pre pregnancy"],
-            "ฉีดวัคซีนไข้หวัดใหญ่ (Influenza Vaccine)": ["ไข้หวัดใหญ่", "influenza", "flu vaccine", "วัคซีนไข้หวัด"],
-        }
-        
-        # Check for keyword matches
-        for category, keywords in category_mappings.items():
-            for keyword in keywords:
-                if keyword in query_lower:
-                    return category
-        
-        # Check for price-based queries - could be any category
-        if any(price_word in query_lower for price_word in ["ราคา", "price", "บาท", "baht", "cost"]):
-            # For price queries, try to extract the main topic
-            for category, keywords in category_mappings.items():
-                for keyword in keywords:
-                    if keyword in query_lower:
-                        return category
-        
-        return "<UNKNOWN>"
+        return alias_matcher.classify_category(query) or "<UNKNOWN>"
+
+    def _filter_arguments(self, brands, location, radius):
+        """Normalized brands and effective radius for filter_packages"""
+        if isinstance(brands, str):
+            brands = [brands]
+        brands = [self.normalize_brand_name(b) for b in (brands or []) if b and b.strip()]
+        if location and location != "<UNKNOWN>" and not radius:
+            radius = 10  # same default as the retrieval tool
+        return brands, radius
+
+    def _run_catalog_filter(self, origin, location, min_price, max_price, brands, category_tag, radius, sort, limit):
+        if location and location != "<UNKNOWN>" and origin is None:
+            raise ValueError(f"Could not find location: {location}")
+        if self.catalog_filter is None:
+            raise ValueError("Catalog filter is not available")
+        result = self.catalog_filter.query(
+            min_price=min_price, max_price=max_price, brands=brands,
+            category_tag=category_tag if category_tag and category_tag != "<UNKNOWN>" else None,
+            origin=origin, radius_km=radius if origin is not None else None,
+            sort=sort, limit=limit,
+        )
+        print(f"🔎 Catalog filter {result['filters']} sort={sort}: {result['total']} packages in {result['elapsed_ms']}ms")
+        return result
 
-    def _get_sql_category_mask(self, category_tag: str):
+    def filter_packages(self, min_price: float = None, max_price: float = None, brands=None,
+                        category_tag: str = None, location: str = None, radius: float = None,
+                        sort: str = 'price_asc', limit: int = DEFAULT_LIMIT) -> dict:
+        """
+        Structured catalogue filter (price range, brands, category, location + radius).
+        Returns {'total', 'filters', 'sort', 'elapsed_ms', 'packages': [...]}; raises ValueError on bad input.
         """
-        Create a filtered DataFrame based on category tag for SQL operations.
-        Returns filtered knowledge_base DataFrame.
+        brands, radius = self._filter_arguments(brands, location, radius)
+        origin = None
+        if location and location != "<UNKNOWN>":
+            lat, lng = self._get_geocode(location)
+            origin = (float(lat), float(lng)) if lat and lng else None
+        return self._run_catalog_filter(origin, location, min_price, max_price, brands, category_tag, radius, sort, limit)
+
+    async def filter_packages_async(self, min_price: float = None, max_price: float = None, brands=None,
+                                    category_tag: str = None, location: str = None, radius: float = None,
+                                    sort: str = 'price_asc', limit: int = DEFAULT_LIMIT) -> dict:
+        brands, radius = self._filter_arguments(brands, location, radius)
+        origin = None
+        if location and location != "<UNKNOWN>":
+            lat, lng = await self._get_geocode_async(location)
+            origin = (float(lat), float(lng)) if lat and lng else None
+        return self._run_catalog_filter(origin, location, min_price, max_price, brands, category_tag, radius, sort, limit)
+
+    @staticmethod
+    def format_filter_results(result: dict) -> str:
+        """Token-lean text rendering of filter_packages output for tool results"""
+        result_str = f"Filter Results ({result['total']} packages matched, showing {len(result['packages'])}):\n"
+        result_str += "="*60 + "\n"
+        for idx, package in enumerate(result['packages'], 1):
+            result_str += f"\n📦 PACKAGE {idx}:\n"
+            result_str += f"   Name: {package['name']}\n"
+            result_str += f"   URL: {package['url']}\n"
+            result_str += f"   Brand: {package['brand']}\n"
+            result_str += f"   Category: {package['category']}\n"
+            result_str += f"   Location: {package['location']}\n"
+            result_str += f"   💰 Cash Price: {package['cash_price']} ฿\n"
+            if package.get('distance_km') is not None:
+                result_str += f"   📍 Nearest branch: {package.get('branch_address')} ({package['distance_km']} km)\n"
+            result_str += "   " + "-"*50 + "\n"
+        result_str += "="*60
+        return result_str
+
+    def _get_sql_category_rows(self, category_tag: str):
+        """
+        knowledge_base rows for the category tag, or None to search the whole catalogue.
         """
         if category_tag == "<UNKNOWN>" or not hasattr(self, 'hl_map'):
-            return self.knowledge_base
-        
-        # Find package URLs for this category
-        package_urls = []
-        for d in self.hl_map:
-            if d['cat_name'] == category_tag:
-                package_urls = d['packages']
-                break
-        
-        if not package_urls:
-            return self.knowledge_base
-        
-        # Filter knowledge_base to only include rows with URLs from this category
-        filtered_kb = self.knowledge_base[self.knowledge_base['URL'].isin(package_urls)]
-        
-        print(f"🎯 Category Filter: {category_tag} ({len(self.knowledge_base)} → {len(filtered_kb)} rows)")
-        
-        return filtered_kb if len(filtered_kb) > 0 else self.knowledge_base
-
-    # Column mapping for robust SQL queries
-    COLUMN_MAPPINGS = {
-        'package_name': ['package_name', 'Package Name', 'Name'],
-        'hdmall_price': ['hdmall_price', 'HDmall Price', 'HDmall_Price', 'price', 'Cash Price'],
-        'brand': ['brand', 'Brand'],
-        'category': ['category', 'Category'],
-        'location': ['location', 'Location']
-    }
-
-    def normalize_column_name(self, df, target_column):
-        """Normalize column names to standard format"""
-        for standard_name, variants in self.COLUMN_MAPPINGS.items():
-            if target_column.lower() in [v.lower() for v in variants]:
-                for variant in variants:
-                    if variant in df.columns:
-                        return variant
-        return None
-
-    def validate_and_fix_query(self, query_str, df):
-        """Validate and fix column names in SQL queries"""
-        import re
+            return None
         
-        # Find all column references in query
-        column_pattern = r"kb\['([^']+)'\]"
-        columns_in_query = re.findall(column_pattern, query_str)
+        # Precomputed knowledge_base row mask for this category
+        kb_mask = self.category_index.kb_mask(category_tag)
+        if kb_mask is None or len(kb_mask) != len(self.knowledge_base):
+            return None
         
-        # Replace with actual column names
-        for col in columns_in_query:
-            actual_col = self.normalize_column_name(df, col)
-            if actual_col and actual_col != col:
-                query_str = query_str.replace(f"kb['{col}']", f"kb['{actual_col}']")
-                logger.info(f"🔄 [SQL-FIX] Mapped column '{col}' → '{actual_col}'")
+        rows = np.flatnonzero(kb_mask)
+        print(f"🎯 Category Filter: {category_tag} ({len(self.knowledge_base)} → {len(rows)} rows)")
         
-        return query_str
+        return rows if len(rows) > 0 else None
 
     def sql_search(self, query: str, category_tag: str = "") -> str:
         """
-        Execute SQL-like query on the knowledge base with category masking.
-        Handles both pandas query syntax and raw SQL, converting as needed.
+        Execute an LLM-written query against the SQLite catalogue with category masking.
+        Accepts raw SELECT statements or the pandas expressions the tool prompts ask for,
+        which are compiled to parameterized SQL (never eval'd).
         Returns a string representation of only essential metadata columns to save tokens.
         
         Args:
-            query: The pandas query string to execute
+            query: The pandas expression or SELECT statement to execute
             category_tag: The category to filter by (provided by LLM)
         """
         try:
             # Initialize knowledge_base if not already done
             if self.knowledge_base is None:
                 self.knowledge_base = self.global_storage.knowledge_base
+            catalog_db = get_catalog_db(self.knowledge_base)
 
             # Use the LLM-provided category tag directly
             # If empty, use <UNKNOWN> to indicate no category filtering
             if not category_tag.strip():
                 category_tag = "<UNKNOWN>"
             
-            # Apply category mask to filter dataset
-            filtered_kb = self._get_sql_category_mask(category_tag)
-
-            # Validate and fix column names in query
-            fixed_query = self.validate_and_fix_query(query, filtered_kb)
-            
-            # Apply brand normalization to the query
-            # Look for brand-related patterns in the query and normalize them
-            normalized_query = self._normalize_query_brands(fixed_query)
+            # Restrict kb to the category's rows
+            scope_rows = self._get_sql_category_rows(category_tag)
 
-            # Replace all knowledge_base references with kb for consistency
-            normalized_query = normalized_query.replace("knowledge_base", "kb")
-            
-            # Create local context for eval with filtered dataset
-            local_context = {
-                "kb": filtered_kb,  # Use filtered dataset instead of full knowledge_base
-                "pd": pd,
-                "np": np
-            }
-            
-            # Check if it's a SQL-style query
-            if "SELECT" in normalized_query.upper() and "FROM" in normalized_query.upper():
-                # For SQL queries, we'll convert to pandas operations
-                if "WHERE" in normalized_query.upper():
-                    # Extract the WHERE clause and convert to pandas filter
-                    where_part = normalized_query.split("WHERE")[1].split("ORDER BY")[0] if "ORDER BY" in normalized_query.upper() else normalized_query.split("WHERE")[1]
-                    where_part = where_part.strip()
-                    
-                    # Simple replacements for SQL to pandas
-                    where_part = where_part.replace("LIKE", ".str.contains")
-                    where_part = where_part.replace("'%", "'")
-                    where_part = where_part.replace("%'", "'")
-                    where_part = where_part.replace(" AND ", " & ")
-                    where_part = where_part.replace(" OR ", " | ")
-                    
-                    # Build the pandas query
-                    pandas_query = f"kb[{where_part}]"
-                    
-                    # Handle ORDER BY
-                    if "ORDER BY" in normalized_query.upper():
-                        order_part = normalized_query.split("ORDER BY")[1].strip()
-                        sort_col = order_part.split()[0].strip('"').strip("'")
-                        ascending = "ASC" in order_part.upper()
-                        pandas_query += f".sort_values('{sort_col}', ascending={ascending})"
-                    
-                    # Add head limit
-                    pandas_query += ".head(15)"
-                    
-                    result = eval(pandas_query, {"__builtins__": {}}, local_context)
-                else:
-                    # Simple SELECT without WHERE
-                    result = filtered_kb.head(15)
+            if re.match(r'(?is)^\s*(select|with)\b', query):
+                # Raw SQL: kb / packages / knowledge_base name the (category-filtered) catalogue
+                normalized_query = self._normalize_query_brands(query)
+                params = []
             else:
-                # Direct pandas query or expression
-                try:
-                    # Try as pandas expression first
-                    if any(op in normalized_query for op in ['[', '&', '|', '.str.', '.head(', '.sort_values(']):
-                        # This looks like a pandas expression
-                        result = eval(normalized_query, {"__builtins__": {}}, local_context)
-                    else:
-                        # Try as pandas query method
-                        result = filtered_kb.query(normalized_query).head(15)
-                except:
-                    # Fallback to eval
-                    result = eval(normalized_query, {"__builtins__": {}}, local_context)
+                # Pandas expression: column names and brands are normalized while compiling
+                compiler = PandasQueryCompiler(catalog_db, normalize_brand=self.normalize_brand_name)
+                normalized_query, params = compiler.compile(query)
+
+            result = catalog_db.query(normalized_query, params, rows=scope_rows)
             
-            # Define essential metadata columns to save tokens (similar to _get_package_url)
-            essential_columns = [
-                'Name', 'URL', 'Brand', 'Category', 'location',
-                'Original Price', 'HDmall Price', 'Cash Discount', 'Cash Price', 
-                'Deposit Price', 'Full or Starting Price'
-            ]
+            # Convert rows to structured string representation (only essential metadata to save tokens)
+            result_str = f"SQL Search Results ({len(result)} packages found):\n"
+            result_str += "="*60 + "\n"
             
-            # Filter to only essential columns that exist in the result
-            if hasattr(result, 'columns'):
-                available_columns = [col for col in essential_columns if col in result.columns]
-                if available_columns:
-                    # Select only essential columns
-                    result_filtered = result[available_columns]
-                else:
-                    # If no essential columns found, take first 6 columns to limit tokens
-                    result_filtered = result.iloc[:, :6] if len(result.columns) > 6 else result
-            else:
-                result_filtered = result
-            
-            # Convert DataFrame to structured string representation (more readable than to_string())
-            if hasattr(result_filtered, 'iterrows'):
-                result_str = f"SQL Search Results ({len(result_filtered)} packages found):\n"
-                result_str += "="*60 + "\n"
+            for idx, row in enumerate(result, 1):
+                result_str += f"\n📦 PACKAGE {idx}:\n"
+                result_str += f"   Name: {row.get('Name', 'N/A')}\n"
+                result_str += f"   URL: {row.get('URL', 'N/A')}\n"
+                result_str += f"   Brand: {row.get('Brand', 'N/A')}\n"
+                result_str += f"   Category: {row.get('Category', 'N/A')}\n"
+                result_str += f"   Location: {row.get('location', 'N/A')}\n"
                 
-                for idx, (_, row) in enumerate(result_filtered.iterrows(), 1):
-                    result_str += f"\n📦 PACKAGE {idx}:\n"
-                    result_str += f"   Name: {row.get('Name', 'N/A')}\n"
-                    result_str += f"   URL: {row.get('URL', 'N/A')}\n"
-                    result_str += f"   Brand: {row.get('Brand', 'N/A')}\n"
-                    result_str += f"   Category: {row.get('Category', 'N/A')}\n"
-                    result_str += f"   Location: {row.get('location', 'N/A')}\n"
-                    
-                    # Price information
-                    if 'Cash Price' in row:
-                        result_str += f"   💰 Cash Price: {row.get('Cash Price', 'N/A')} ฿\n"
-                    if 'HDmall Price' in row:
-                        result_str += f"   💳 HDmall Price: {row.get('HDmall Price', 'N/A')} ฿\n"
-                    if 'Original Price' in row:
-                        result_str += f"   🏷️ Original Price: {row.get('Original Price', 'N/A')} ฿\n"
-                    
-                    result_str += "   " + "-"*50 + "\n"
+                # Price information
+                if 'Cash Price' in row:
+                    result_str += f"   💰 Cash Price: {row.get('Cash Price', 'N/A')} ฿\n"
+                if 'HDmall Price' in row:
+                    result_str += f"   💳 HDmall Price: {row.get('HDmall Price', 'N/A')} ฿\n"
+                if 'Original Price' in row:
+                    result_str += f"   🏷️ Original Price: {row.get('Original Price', 'N/A')} ฿\n"
                 
-                result_str += f"\n📊 Total Results: {len(result_filtered)} packages\n"
-                result_str += "="*60
-            else:
-                result_str = str(result_filtered)
+                result_str += "   " + "-"*50 + "\n"
+            
+            result_str += f"\n📊 Total Results: {len(result)} packages\n"
+            result_str += "="*60
             
             # Print the results for debugging (without verbose context)
             print(f"🔍 SQL Search Query: {normalized_query}")
             print(f"🎯 LLM-provided Category: {category_tag}")
-            print(f"📊 Results: {len(result) if hasattr(result, '__len__') else 'N/A'} rows found")
+            print(f"📊 Results: {len(result)} rows found")
             print(f"💾 Token Optimization: Showing only essential metadata columns")
             if normalized_query != query:
                 print(f"📝 Original Query: {query}")
@@ -1166,17 +892,17 @@ class RAG:
 
     def _normalize_query_brands(self, query: str) -> str:
         """
-        Normalize brand names within SQL queries.
+        Normalize brand names within raw SQL queries.
         Looks for brand references and replaces abbreviations with full names.
+        (Pandas expressions are normalized by PandasQueryCompiler instead.)
         """
         import re
         
         # Pattern to find brand references in queries
-        # Matches things like Brand.str.contains('baac') or Brand == 'BAAC'
+        # Matches things like Brand = 'BAAC', "Brand" == 'baac' or Brand LIKE '%baac%'
         brand_patterns = [
-            r"Brand\.str\.contains\(['\"]([^'\"]+)['\"]",  # Brand.str.contains('baac')
-            r"Brand\s*==\s*['\"]([^'\"]+)['\"]",          # Brand == 'baac'
-            r"Brand\s*=\s*['\"]([^'\"]+)['\"]",           # Brand = 'baac'
+            r"Brand\"?\s*==?\s*'([^']+)'",               # Brand = 'baac'
+            r"Brand\"?\s+LIKE\s+'%?([^'%]+)%?'",         # Brand LIKE '%baac%'
         ]
         
         normalized_query = query
@@ -1278,14 +1004,14 @@ class RAG:
     def smart_search_suggestions(self, failed_query_type: str, original_search_term: str) -> str:
         """
         Provide intelligent search suggestions when queries fail.
-        Uses fuzzy matching to find similar alternatives.
+        Uses the prebuilt trigram index (with value counts) to find similar alternatives.
         """
         try:
             # Initialize knowledge_base if not already done
             if self.knowledge_base is None:
                 self.knowledge_base = self.global_storage.knowledge_base
             
-            import difflib
+            fuzzy = get_fuzzy_index(self.knowledge_base)
             
             # First try to normalize the search term
             normalized_term = original_search_term
@@ -1294,13 +1020,11 @@ class RAG:
                 if normalized_term != original_search_term:
                     print(f"Smart suggestions brand normalization: '{original_search_term}' → '{normalized_term}'")
                     # Check if the normalized term exists in the database
-                    exact_matches = self.knowledge_base[
-                        self.knowledge_base['Brand'].str.contains(normalized_term, case=False, na=False)
-                    ]
-                    if len(exact_matches) > 0:
+                    exact_matches = fuzzy['Brand'].contains_count(normalized_term)
+                    if exact_matches > 0:
                         result = f"Found exact match after normalization:\n"
                         result += f"'{original_search_term}' → '{normalized_term}'\n"
-                        result += f"Found {len(exact_matches)} packages from '{normalized_term}'\n"
+                        result += f"Found {exact_matches} packages from '{normalized_term}'\n"
                         print(f"Smart Search Suggestions ({failed_query_type}) - EXACT MATCH FOUND:")
                         print(result)
                         print("="*50)
@@ -1308,75 +1032,60 @@ class RAG:
             
             if failed_query_type == "brand":
                 # Find similar brand names
-                unique_brands = self.knowledge_base['Brand'].dropna().unique()
-                similar_brands = difflib.get_close_matches(
-                    normalized_term, unique_brands, n=5, cutoff=0.3
-                )
+                similar_brands = fuzzy['Brand'].close_matches(normalized_term, n=5, cutoff=0.3)
                 
                 result = f"'{original_search_term}' not found. Similar brands:\n"
                 if similar_brands:
                     for i, brand in enumerate(similar_brands, 1):
-                        count = len(self.knowledge_base[self.knowledge_base['Brand'] == brand])
+                        count = fuzzy['Brand'].count(brand)
                         result += f"{i}. {brand} ({count} packages)\n"
                 else:
                     result += "No similar brands found. Here are the most popular brands:\n"
-                    brand_counts = self.knowledge_base['Brand'].value_counts().head(10)
-                    for i, (brand, count) in enumerate(brand_counts.items(), 1):
+                    for i, (brand, count) in enumerate(fuzzy['Brand'].most_common(10), 1):
                         result += f"{i}. {brand} ({count} packages)\n"
                     
             elif failed_query_type == "category":
                 # Find similar categories
-                unique_categories = self.knowledge_base['Category'].dropna().unique()
-                similar_categories = difflib.get_close_matches(
-                    original_search_term, unique_categories, n=5, cutoff=0.3
-                )
+                similar_categories = fuzzy['Category'].close_matches(original_search_term, n=5, cutoff=0.3)
                 
                 result = f"'{original_search_term}' not found. Similar categories:\n"
                 if similar_categories:
                     for i, category in enumerate(similar_categories, 1):
-                        count = len(self.knowledge_base[self.knowledge_base['Category'] == category])
+                        count = fuzzy['Category'].count(category)
                         result += f"{i}. {category} ({count} packages)\n"
                 else:
                     result += "No similar categories found. Here are the most popular categories:\n"
-                    category_counts = self.knowledge_base['Category'].value_counts().head(10)
-                    for i, (category, count) in enumerate(category_counts.items(), 1):
+                    for i, (category, count) in enumerate(fuzzy['Category'].most_common(10), 1):
                         result += f"{i}. {category} ({count} packages)\n"
                         
             elif failed_query_type == "package_name":
                 # Find similar package names
-                package_names = self.knowledge_base['Name'].dropna().unique()
-                similar_packages = difflib.get_close_matches(
-                    original_search_term, package_names, n=5, cutoff=0.3
-                )
+                similar_packages = fuzzy['Name'].close_matches(original_search_term, n=5, cutoff=0.3)
                 
                 result = f"'{original_search_term}' not found. Similar packages:\n"
                 if similar_packages:
                     for i, package in enumerate(similar_packages, 1):
                         # Get the brand and price for context
-                        pkg_info = self.knowledge_base[self.knowledge_base['Name'] == package].iloc[0]
+                        pkg_info = self._catalog().row(fuzzy.first_row[package])
                         result += f"{i}. {package}\n   Brand: {pkg_info['Brand']}, Price: {pkg_info['Cash Price']:,.0f}฿\n"
                 else:
                     result += "No similar package names found."
                     
             elif failed_query_type == "location":
                 # Find similar locations
-                unique_locations = self.knowledge_base['location'].dropna().unique()
-                similar_locations = difflib.get_close_matches(
-                    original_search_term, unique_locations, n=5, cutoff=0.3
-                )
+                similar_locations = fuzzy['location'].close_matches(original_search_term, n=5, cutoff=0.3)
                 
                 result = f"'{original_search_term}' not found. Similar locations:\n"
                 if similar_locations:
                     for i, location in enumerate(similar_locations, 1):
-                        count = len(self.knowledge_base[self.knowledge_base['location'].str.contains(location, case=False, na=False)])
+                        count = fuzzy['location'].contains_count(location)
                         result += f"{i}. {location} ({count} packages)\n"
                 else:
                     result += "No similar locations found. Here are areas with most packages:\n"
                     # Extract common location terms
-                    all_locations = ' '.join(self.knowledge_base['location'].dropna().astype(str))
                     common_areas = ['กรุงเทพ', 'บางกอก', 'Bangkok', 'สยาม', 'ชิดลม', 'ปทุมวัน', 'ราชเทวี']
                     for area in common_areas:
-                        count = self.knowledge_base['location'].str.contains(area, case=False, na=False).sum()
+                        count = fuzzy['location'].contains_count(area)
                         if count > 0:
                             result += f"- {area}: {count} packages\n"
                             
@@ -2,7 +2,21 @@
 from .RAG import RAG
 from .bm25_searcher import BM25Retriever
 from .semantic_searcher import SemanticRetriever
-from .reranker import Reranker
-from .rank_fusion import compute_rrf, get_top_k
+from .reranker import RerankerService
+from .rank_fusion import compute_rrf, get_top_k, rrf_scores, rrf_top_k, masked_top_k, ranks_from_dict
+from .index_registry import RetrievalIndexes, build_retrieval_indexes, get_retrieval_indexes
+from .geo_index import GeoIndex
+from .geocoder import GeocodingService, geocoding_service
+from .category_index import CategoryIndex
+from .catalog_store import CatalogStore, PackageRow, get_catalog
+from .catalog_db import CatalogDatabase, CatalogQueryError, get_catalog_db
+from .catalog_query import PandasQueryCompiler
+from .catalog_filter import CatalogFilter
+from .fuzzy_index import TrigramIndex, FuzzyCatalogIndex, get_fuzzy_index
+from .alias_matcher import AhoCorasick, AliasMatcher, alias_matcher
+from .thai_tokenizer import ThaiTokenizer, thai_tokenizer
+from .string_table import StringTable
+from .branch_table import BranchTable, as_branch_table
+from .snapshot import TokenCorpus, write_snapshot, verify_snapshot
 from .claude_tools import *
 from .google_searcher import *
@@ -0,0 +1,281 @@
+"""
+In-memory mirrors of the Airtable artwork tables.
+
+Chat requests used to query Airtable's REST API directly (5 req/s limit,
+300-800 ms per call). A mirror pages through the whole table in a background
+thread, indexes records by one or more fields and swaps the new snapshot in
+atomically, so lookups are dict reads and the previous snapshot keeps serving
+while a refresh is in flight. Until the first load completes lookups return
+None and callers fall back to the live API.
+
+Airtable's rate limit is per base, so every mirror of a base shares one
+_BaseRateLimiter: requests are spaced across mirrors, a 429 pauses the whole
+base for Retry-After (or the 30 s lockout) and the page is retried, and a
+lock file serializes refreshes of a base across worker processes.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: refreshes are only serialized within the process
+    fcntl = None
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
+AIRTABLE_BASE_ID = "app2CSihSxsRF1acK"
+INFOGRAPHIC_TABLE_ID = "tblNy0vqAW3FApPxU"   # highlight artworks, keyed by hl_url
+SKU_TABLE_ID = "tblfqJRo9JmbRh9NU"           # package artworks, keyed by SKU URL
+AIRTABLE_MIRROR_REFRESH = float(os.getenv('AIRTABLE_MIRROR_REFRESH', '900'))
+AIRTABLE_REQUESTS_PER_SECOND = float(os.getenv('AIRTABLE_REQUESTS_PER_SECOND', '4'))  # per base, limit is 5
+AIRTABLE_LOCKOUT_SECONDS = 30.0  # Airtable blocks the base this long after a 429
+AIRTABLE_MAX_RETRIES = int(os.getenv('AIRTABLE_MAX_RETRIES', '4'))
+AIRTABLE_START_JITTER = float(os.getenv('AIRTABLE_START_JITTER', '5'))
+AIRTABLE_LOCK_DIR = os.getenv('AIRTABLE_LOCK_DIR', '/tmp/hdmall_cache')
+
+
+class _BaseRateLimiter:
+    """Request pacing shared by every mirror of one Airtable base"""
+
+    def __init__(self, base_id: str, requests_per_second: float = AIRTABLE_REQUESTS_PER_SECOND):
+        self.base_id = base_id
+        self.interval = 1.0 / requests_per_second
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+        self.throttled = 0
+
+    def wait(self):
+        """Block until this process may send the base another request"""
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_at)
+            self._next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+    def pause(self, seconds: float):
+        """Hold every request to the base for seconds (after a 429)"""
+        with self._lock:
+            self._next_at = max(self._next_at, time.monotonic() + seconds)
+            self.throttled += 1
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the base's cross-process refresh lock"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(AIRTABLE_LOCK_DIR, exist_ok=True)
+        with open(os.path.join(AIRTABLE_LOCK_DIR, f"airtable-{self.base_id}.lock"), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_limiters: Dict[str, _BaseRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def base_rate_limiter(base_id: str) -> _BaseRateLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(base_id)
+        if limiter is None:
+            limiter = _limiters[base_id] = _BaseRateLimiter(base_id)
+        return limiter
+
+
+def _retry_after(response, attempt: int) -> float:
+    try:
+        return max(float(response.headers.get('retry-after')), 1.0)
+    except (TypeError, ValueError):
+        return AIRTABLE_LOCKOUT_SECONDS * (2 ** attempt)
+
+
+class _Snapshot:
+    __slots__ = ('records', 'index', 'loaded_at')
+
+    def __init__(self, records: List[dict], index: Dict[str, Dict[str, List[dict]]], loaded_at: float):
+        self.records = records
+        self.index = index
+        self.loaded_at = loaded_at
+
+
+class AirtableMirror:
+    def __init__(self,
+                 table_id: str,
+                 key_fields: Iterable[str],
+                 base_id: str = AIRTABLE_BASE_ID,
+                 api_key: Optional[str] = AIRTABLE_API_KEY,
+                 refresh_interval: float = AIRTABLE_MIRROR_REFRESH,
+                 timeout: float = 30.0):
+        self.table_id = table_id
+        self.base_id = base_id
+        self.key_fields = list(key_fields)
+        self.api_key = api_key
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.limiter = base_rate_limiter(base_id)
+        self._snapshot: Optional[_Snapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def url(self) -> str:
+        return f"https://api.airtable.com/v0/{self.base_id}/{self.table_id}"
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def _get_page(self, client: httpx.Client, headers, params) -> dict:
+        """One page; a 429 pauses the whole base and the same page is retried"""
+        for attempt in range(AIRTABLE_MAX_RETRIES + 1):
+            self.limiter.wait()
+            response = client.get(self.url, headers=headers, params=params)
+            if response.status_code != 429 or attempt == AIRTABLE_MAX_RETRIES:
+                response.raise_for_status()
+                return response.json()
+            delay = _retry_after(response, attempt)
+            logger.warning(f"⚠️ [AIRTABLE-MIRROR] {self.table_id} rate limited, pausing base {self.base_id} for {delay:.0f}s")
+            self.limiter.pause(delay)
+
+    def _fetch_all(self) -> List[dict]:
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        records, offset = [], None
+        with self.limiter.exclusive(), httpx.Client(timeout=self.timeout) as client:
+            while True:
+                params = {"pageSize": 100}
+                if offset:
+                    params["offset"] = offset
+                data = self._get_page(client, headers, params)
+                records.extend(data.get('records', []))
+                offset = data.get('offset')
+                if not offset:
+                    return records
+
+    def _build_index(self, records: List[dict]) -> Dict[str, Dict[str, List[dict]]]:
+        index = {field: {} for field in self.key_fields}
+        for record in records:
+            fields = record.get('fields', {})
+            for field in self.key_fields:
+                value = fields.get(field)
+                values = value if isinstance(value, list) else [value]
+                for v in values:
+                    if isinstance(v, str) and v:
+                        index[field].setdefault(v.strip(), []).append(record)
+        return index
+
+    def refresh(self) -> bool:
+        """Reload the whole table; on failure the previous snapshot keeps serving"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False  # a refresh is already in flight
+        try:
+            start = time.time()
+            records = self._fetch_all()
+            self._snapshot = _Snapshot(records, self._build_index(records), time.time())
+            self.refreshes += 1
+            self.last_error = None
+            logger.info(f"🗂️ [AIRTABLE-MIRROR] {self.table_id}: {len(records)} records in {time.time() - start:.2f}s")
+            return True
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.warning(f"⚠️ [AIRTABLE-MIRROR] {self.table_id} refresh failed, serving stale data: {self.last_error}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def _run(self):
+        # Spread mirrors and workers that start together
+        if self._stop.wait(random.uniform(0, AIRTABLE_START_JITTER)):
+            return
+        while not self._stop.is_set():
+            self.refresh()
+            # retry sooner while we have nothing to serve
+            interval = self.refresh_interval if self.ready else min(60.0, self.refresh_interval)
+            self._stop.wait(interval * random.uniform(0.9, 1.1))
+
+    def start(self):
+        """Start the background refresh thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if not self.api_key:
+            logger.warning(f"⚠️ [AIRTABLE-MIRROR] AIRTABLE_API_KEY not set, {self.table_id} mirror disabled")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"airtable-mirror-{self.table_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def lookup(self, field: str, value) -> Optional[List[dict]]:
+        """Records whose field equals value; None when the mirror has not loaded yet"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if not isinstance(value, str):
+            return []
+        return list(snapshot.index.get(field, {}).get(value.strip(), ()))
+
+    def lookup_contains(self, field: str, value: str) -> Optional[List[dict]]:
+        """Records whose field contains value (Airtable FIND semantics); exact matches first"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if not value:
+            return []
+        exact = snapshot.index.get(field, {}).get(value.strip())
+        if exact:
+            return list(exact)
+        matches = []
+        for record in snapshot.records:
+            field_value = record.get('fields', {}).get(field)
+            if isinstance(field_value, list):
+                field_value = ', '.join(str(v) for v in field_value)
+            if isinstance(field_value, str) and value in field_value:
+                matches.append(record)
+        return matches
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'ready': snapshot is not None,
+            'records': len(snapshot.records) if snapshot else 0,
+            'age_seconds': round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'throttled': self.limiter.throttled,
+        }
+
+
+# Process-wide mirrors
+infographic_mirror = AirtableMirror(INFOGRAPHIC_TABLE_ID, key_fields=['hl_url'])
+sku_mirror = AirtableMirror(SKU_TABLE_ID, key_fields=['SKU URL'])
+
+
+def start_airtable_mirrors():
+    infographic_mirror.start()
+    sku_mirror.start()
+
+
+def stop_airtable_mirrors():
+    infographic_mirror.stop()
+    sku_mirror.stop()
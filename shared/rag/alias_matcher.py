@@ -0,0 +1,212 @@
+"""
+Brand alias and category keyword matching in one pass over the query.
+
+Brand abbreviations and category keywords live in hl_prompts/query_aliases.json
+instead of dicts rebuilt inside RAG methods. At load time every alias and
+keyword is compiled into a single Aho-Corasick automaton, so one scan of the
+lower-cased query returns all brand and category hits no matter how long
+the lists grow. The file is re-read when its mtime changes (checked at most
+every QUERY_ALIASES_RELOAD_INTERVAL seconds), so aliases can be edited
+without a deploy; a broken file keeps the previous dictionary.
+
+Priorities follow file order, matching the old "first key in the dict wins"
+loops.
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+QUERY_ALIASES_PATH = os.getenv('QUERY_ALIASES_PATH', os.path.join(project_root, "hl_prompts", "query_aliases.json"))
+QUERY_ALIASES_RELOAD_INTERVAL = float(os.getenv('QUERY_ALIASES_RELOAD_INTERVAL', '30'))
+
+BRAND = 'brand'
+CATEGORY = 'category'
+
+
+class Hit:
+    __slots__ = ('kind', 'priority', 'term', 'target', 'start', 'end')
+
+    def __init__(self, kind, priority, term, target, start, end):
+        self.kind = kind          # BRAND or CATEGORY
+        self.priority = priority  # position in the data file (lower wins)
+        self.term = term          # alias / keyword that matched
+        self.target = target      # canonical brand / category name
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Hit({self.kind}, {self.term!r} -> {self.target!r} @{self.start})"
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher; patterns map to payloads"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, object]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, object]]] = [[]]  # (pattern length, payload)
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(pattern), payload))
+
+        # Breadth-first failure links; outputs inherit their failure state's outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, object]]:
+        """(start, end, payload) for every pattern occurrence in text"""
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in out[state]:
+                yield end - length, end, payload
+
+
+class QueryDictionary:
+    """Compiled snapshot of the alias file"""
+
+    def __init__(self, data: dict):
+        self.brand_aliases: Dict[str, str] = {}
+        self.category_keywords: Dict[str, List[str]] = {}
+        patterns = []
+
+        for group in data.get('brands', []):
+            for alias in group.get('aliases', []):
+                alias = alias.lower().strip()
+                if alias and alias not in self.brand_aliases:
+                    self.brand_aliases[alias] = group['canonical']
+                    patterns.append((alias, (BRAND, len(self.brand_aliases) - 1, alias, group['canonical'])))
+
+        priority = 0
+        for group in data.get('categories', []):
+            keywords = [k.lower() for k in group.get('keywords', []) if k]
+            self.category_keywords[group['category']] = keywords
+            for keyword in keywords:
+                patterns.append((keyword, (CATEGORY, priority, keyword, group['category'])))
+            priority += 1
+
+        self.automaton = AhoCorasick(patterns)
+
+    def scan(self, query: str) -> List[Hit]:
+        """All brand and category hits in the lower-cased query, in text order"""
+        if not query:
+            return []
+        return [Hit(kind, priority, term, target, start, end)
+                for start, end, (kind, priority, term, target) in self.automaton.iter(query.lower())]
+
+
+class AliasMatcher:
+    def __init__(self, path: str = QUERY_ALIASES_PATH, reload_interval: float = QUERY_ALIASES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._dictionary = QueryDictionary({})
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self.reload()
+
+    def reload(self) -> bool:
+        """Re-read and recompile the alias file; the previous dictionary stays on failure"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+                with open(self.path, "r", encoding="utf-8") as f:
+                    dictionary = QueryDictionary(json.load(f))
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning(f"⚠️ [ALIASES] Could not load {self.path}, keeping previous aliases: {self.last_error}")
+                return False
+            self._dictionary = dictionary
+            self._mtime = mtime
+            self.reloads += 1
+            self.last_error = None
+            logger.info(f"🔤 [ALIASES] Loaded {len(dictionary.brand_aliases)} brand aliases, "
+                        f"{len(dictionary.category_keywords)} categories ({len(dictionary.automaton)} states)")
+            return True
+
+    @property
+    def dictionary(self) -> QueryDictionary:
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self._checked_at = time.monotonic()
+            try:
+                changed = os.path.getmtime(self.path) != self._mtime
+            except OSError:
+                changed = False
+            if changed:
+                self.reload()
+        return self._dictionary
+
+    def scan(self, query: str) -> List[Hit]:
+        return self.dictionary.scan(query)
+
+    def first_brand(self, query: str) -> Optional[Hit]:
+        """Highest-priority brand alias contained in query"""
+        brands = [hit for hit in self.scan(query) if hit.kind == BRAND]
+        return min(brands, key=lambda hit: hit.priority) if brands else None
+
+    def normalize_brand(self, brand_query: str) -> str:
+        """Full brand name for an abbreviation / variation; the input when nothing matches"""
+        if not brand_query:
+            return brand_query
+        dictionary = self.dictionary
+        exact = dictionary.brand_aliases.get(brand_query.lower().strip())
+        if exact is not None:
+            return exact
+        hits = [hit for hit in dictionary.scan(brand_query.strip()) if hit.kind == BRAND]
+        return min(hits, key=lambda hit: hit.priority).target if hits else brand_query
+
+    def classify_category(self, query: str) -> Optional[str]:
+        """Category of the highest-priority keyword contained in query"""
+        categories = [hit for hit in self.scan(query) if hit.kind == CATEGORY]
+        return min(categories, key=lambda hit: hit.priority).target if categories else None
+
+    def stats(self):
+        dictionary = self._dictionary
+        return {
+            'brand_aliases': len(dictionary.brand_aliases),
+            'categories': len(dictionary.category_keywords),
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
+
+
+# Process-wide matcher
+alias_matcher = AliasMatcher()
@@ -0,0 +1,200 @@
+"""
+Vectorized Okapi BM25 over a precomputed sparse term-document matrix.
+
+The matrix is stored CSR-style with one row per vocabulary term:
+    indptr[t]:indptr[t+1]  -> slice of postings for term t
+    indices[...]           -> document positions containing t
+    weights[...]           -> precomputed BM25 contribution of t to that document
+so scoring a query is a handful of array gathers plus one bincount,
+instead of a Python loop over every document.
+"""
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+def competition_ranks(scores: np.ndarray) -> np.ndarray:
+    """
+    Rank scores descending, ties share the rank of their first position
+    (1, 2, 2, 4, ...). Ties keep document order, matching the old dict sort.
+    """
+    n = len(scores)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(-scores, kind='stable')
+    sorted_scores = scores[order]
+    positions = np.arange(n)
+    is_new_score = np.empty(n, dtype=bool)
+    is_new_score[0] = True
+    is_new_score[1:] = sorted_scores[1:] != sorted_scores[:-1]
+    group_start = np.maximum.accumulate(np.where(is_new_score, positions, 0))
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = group_start + 1
+    return ranks
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, via argpartition"""
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind='stable')
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind='stable')]
+
+
+def token_id_postings(indptr: np.ndarray, ids: np.ndarray, num_terms: int, epsilon: float = 0.25) -> Dict[str, np.ndarray]:
+    """
+    BM25 statistics of a token-id corpus (tokens of document d are
+    ids[indptr[d]:indptr[d + 1]]): term-major postings (indptr, indices,
+    term_freqs), document lengths and Okapi IDF, as plain arrays.
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    num_docs = len(indptr) - 1
+    stride = max(num_docs, 1)
+    docs = np.repeat(np.arange(num_docs, dtype=np.int64), np.diff(indptr))
+
+    # One key per (term, document) pair; np.unique sorts them term-major, docs ascending
+    pairs, tfs = np.unique(np.asarray(ids, dtype=np.int64) * stride + docs, return_counts=True)
+    doc_freq = np.bincount(pairs // stride, minlength=num_terms)
+    term_indptr = np.zeros(num_terms + 1, dtype=np.int64)
+    np.cumsum(doc_freq, out=term_indptr[1:])
+    return {
+        'idf': SparseBM25.okapi_idf(doc_freq, num_docs, epsilon),
+        'doc_len': np.diff(indptr).astype(np.float64),
+        'indptr': term_indptr,
+        'indices': (pairs % stride).astype(np.int32),
+        'term_freqs': tfs.astype(np.int32),
+    }
+
+
+class SparseBM25:
+    """
+    BM25Okapi-compatible scorer (same IDF flooring as rank_bm25) backed by
+    contiguous arrays. Build with `from_tokens` or pass prebuilt arrays.
+    """
+
+    def __init__(self,
+                 vocab: Dict[str, int],
+                 idf: np.ndarray,
+                 doc_len: np.ndarray,
+                 indptr: np.ndarray,
+                 indices: np.ndarray,
+                 term_freqs: np.ndarray,
+                 k1: float = 1.5,
+                 b: float = 0.75,
+                 weights: Optional[np.ndarray] = None):
+        self.vocab = vocab
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.doc_len = np.asarray(doc_len, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(self.doc_len)
+        self.avgdl = float(self.doc_len.mean()) if self.num_docs else 0.0
+
+        if weights is not None:
+            # Prebuilt for these k1 / b (e.g. a memory-mapped snapshot)
+            self.weights = np.asarray(weights, dtype=np.float64)
+        else:
+            self.weights = self.posting_weights(self.idf, self.doc_len, self.indptr, self.indices, term_freqs, k1, b)
+
+    @staticmethod
+    def posting_weights(idf, doc_len, indptr, indices, term_freqs, k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+        """Fold tf saturation, length normalisation and IDF into one weight per posting"""
+        doc_len = np.asarray(doc_len, dtype=np.float64)
+        avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+        tf = np.asarray(term_freqs, dtype=np.float64)
+        norm = k1 * (1 - b + b * doc_len[indices] / (avgdl or 1.0))
+        term_of_posting = np.repeat(np.arange(len(idf)), np.diff(indptr))
+        return np.asarray(idf, dtype=np.float64)[term_of_posting] * tf * (k1 + 1) / (tf + norm)
+
+    @classmethod
+    def from_tokens(cls,
+                    tokenized_docs: Sequence[Sequence[str]],
+                    k1: float = 1.5,
+                    b: float = 0.75,
+                    epsilon: float = 0.25) -> "SparseBM25":
+        vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(len(tokenized_docs), dtype=np.float64)
+
+        for doc_id, tokens in enumerate(tokenized_docs):
+            doc_len[doc_id] = len(tokens)
+            for token, tf in Counter(tokens).items():
+                rows.append(vocab.setdefault(token, len(vocab)))
+                cols.append(doc_id)
+                tfs.append(tf)
+
+        rows_arr = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows_arr, kind='stable')
+        doc_freq = np.bincount(rows_arr, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(doc_freq, out=indptr[1:])
+
+        idf = cls.okapi_idf(doc_freq, len(tokenized_docs), epsilon)
+        return cls(vocab, idf, doc_len, indptr,
+                   np.asarray(cols, dtype=np.int32)[order],
+                   np.asarray(tfs, dtype=np.float64)[order],
+                   k1=k1, b=b)
+
+    @classmethod
+    def from_token_ids(cls,
+                       indptr: np.ndarray,
+                       ids: np.ndarray,
+                       vocab: Sequence[str],
+                       k1: float = 1.5,
+                       b: float = 0.75,
+                       epsilon: float = 0.25) -> "SparseBM25":
+        """
+        Build from a token-id corpus (tokens of document d are
+        vocab[ids[indptr[d]:indptr[d + 1]]]) without per-document Counters.
+        """
+        stats = token_id_postings(indptr, ids, len(vocab), epsilon)
+        return cls({token: i for i, token in enumerate(vocab)}, stats['idf'], stats['doc_len'],
+                   stats['indptr'], stats['indices'], stats['term_freqs'], k1=k1, b=b)
+
+    @classmethod
+    def from_prebuilt(cls,
+                      vocab: Sequence[str],
+                      stats: Dict,
+                      k1: float = 1.5,
+                      b: float = 0.75) -> "SparseBM25":
+        """
+        Load statistics emitted offline (token_id_postings plus optional
+        weights built for stats['k1'] / stats['b']); weights are recomputed
+        from term_freqs only when k1 / b differ.
+        """
+        weights = stats.get('weights') if (stats.get('k1'), stats.get('b')) == (k1, b) else None
+        return cls({token: i for i, token in enumerate(vocab)}, stats['idf'], stats['doc_len'],
+                   stats['indptr'], stats['indices'], stats['term_freqs'], k1=k1, b=b, weights=weights)
+
+    @staticmethod
+    def okapi_idf(doc_freq: np.ndarray, num_docs: int, epsilon: float = 0.25) -> np.ndarray:
+        """rank_bm25 BM25Okapi IDF: negative values are floored at epsilon * mean idf"""
+        doc_freq = np.asarray(doc_freq, dtype=np.float64)
+        idf = np.log(num_docs - doc_freq + 0.5) - np.log(doc_freq + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+        return idf
+
+    def get_scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """BM25 score of every document (positionally aligned with the corpus)"""
+        term_ids = [self.vocab[t] for t in query_tokens if t in self.vocab]
+        if not term_ids:
+            return np.zeros(self.num_docs, dtype=np.float64)
+        slices = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        postings = np.concatenate(slices)
+        return np.bincount(self.indices[postings],
+                           weights=self.weights[postings],
+                           minlength=self.num_docs)
+
+    def get_top_k(self, query_tokens: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc positions, scores) of the k best documents, best first"""
+        scores = self.get_scores(query_tokens)
+        top = top_k_indices(scores, k)
+        return top, scores[top]
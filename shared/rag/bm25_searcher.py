@@ -3,12 +3,15 @@ This .py file is about keyword search branch
 in our hybrid RAG architecture
 we use BM25 algorithm for this part
 """
-from pythainlp.tokenize import word_tokenize
-from rank_bm25 import BM25Okapi
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
+import numpy as np
 import json
 
+from .bm25_engine import SparseBM25, competition_ranks, top_k_indices
+from .thai_tokenizer import thai_tokenizer
+from .snapshot import TokenCorpus
+
 class BM25Retriever:
     def __init__(self,
                  tokens_file,
@@ -16,26 +19,57 @@ class BM25Retriever:
                  b: float = 0.75):
         """
         Initialize BM25 with pre-tokenized documents
+        (doc_tokens JSON dict or a snapshot TokenCorpus)
         """
         # Load tokenized documents
         data = tokens_file
-        self.tokenized_docs = data["tokens"]
-        self.original_indices = data["indices"]
+        if isinstance(data, TokenCorpus):
+            self.original_indices = np.asarray(data.indices, dtype=np.int64)
+            if data.bm25 is not None:
+                # Statistics emitted offline: no document is tokenized or counted here
+                self.bm25 = SparseBM25.from_prebuilt(data.vocab.to_list(), data.bm25, k1=k1, b=b)
+            else:
+                self.bm25 = SparseBM25.from_token_ids(data.indptr, data.ids, data.vocab.to_list(), k1=k1, b=b)
+        else:
+            self.original_indices = np.asarray(data["indices"], dtype=np.int64)
+            # Sparse BM25 engine over the corpus (scores are positional)
+            self.bm25 = SparseBM25.from_tokens(data["tokens"], k1=k1, b=b)
         self.total_docs = len(self.original_indices)
 
-        # Initialize BM25
-        self.bm25 = BM25Okapi(self.tokenized_docs, k1=k1, b=b)
-
         # Create a set of all document indices for quick reference
-        self.all_indices = set(self.original_indices)
+        self.all_indices = set(self.original_indices.tolist())
+        self._identity_order = bool(np.array_equal(self.original_indices, np.arange(self.total_docs)))
 
         #print(f"Initialized BM25 with {self.total_docs} documents")
 
     def _tokenize_query(self, query: str) -> List[str]:
-        """Tokenize search query"""
-        query = ' '.join(query.split())
-        tokens = word_tokenize(query, engine="newmm")
-        return [token for token in tokens if token.strip()]
+        """Tokenize search query (memoized across every lexical index)"""
+        return list(thai_tokenizer.tokenize(query))
+
+    def score_array(self, query: str) -> np.ndarray:
+        """
+        BM25 scores as an array indexed by original document index
+        (documents with no matching terms score 0.0)
+        """
+        query_tokens = self._tokenize_query(query)
+        if not query_tokens:
+            return np.zeros(self.total_docs, dtype=np.float64)
+        bm25_scores = self.bm25.get_scores(query_tokens)
+        if self._identity_order:
+            return bm25_scores
+        scores = np.zeros(self.total_docs, dtype=np.float64)
+        scores[self.original_indices] = bm25_scores
+        return scores
+
+    def rank_array(self, query: str) -> np.ndarray:
+        """1-based ranks indexed by original document index (same score = same rank)"""
+        return competition_ranks(self.score_array(query))
+
+    def top_k(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(original document indices, scores) of the k best documents, best first"""
+        scores = self.score_array(query)
+        top = top_k_indices(scores, k)
+        return top, scores[top]
 
     def forward(self, query: str) -> Dict[int, int]:
         """
@@ -47,39 +81,9 @@ class BM25Retriever:
         Returns:
             Dictionary of {doc_idx: rank} for ALL documents
         """
-        query_tokens = self._tokenize_query(query)
-
-        # Initialize scores for all documents
-        scores = {idx: 0.0 for idx in range(self.total_docs)}
-
-        if query_tokens:
-            # Get BM25 scores
-            bm25_scores = self.bm25.get_scores(query_tokens)
-
-            # Map scores to original indices
-            for idx, score in enumerate(bm25_scores):
-                orig_idx = self.original_indices[idx]
-                scores[orig_idx] = score
-
-        # Sort by score to get ranks
-        sorted_items = sorted(
-            scores.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-
-        # Assign ranks (same score = same rank)
-        rank_dict = {}
-        current_rank = 1
-        previous_score = None
-
-        for idx, (doc_idx, score) in enumerate(sorted_items):
-            if score != previous_score:
-                current_rank = idx + 1
-            rank_dict[doc_idx] = current_rank
-            previous_score = score
+        ranks = self.rank_array(query)
         print('Lexical search : Complete!')
-        return rank_dict
+        return dict(enumerate(ranks.tolist()))
 
     def search(self, query: str, k: int = None) -> Dict[int, float]:
         """
@@ -92,20 +96,4 @@ class BM25Retriever:
         Returns:
             Dictionary of {doc_idx: score} for ALL documents
         """
-        query_tokens = self._tokenize_query(query)
-
-        # Initialize scores for all possible indices
-        scores = {idx: 0.0 for idx in range(self.total_docs)}
-
-        if query_tokens:
-            # Get BM25 scores
-            bm25_scores = self.bm25.get_scores(query_tokens)
-
-            # Map scores to original indices
-            for idx, score in enumerate(bm25_scores):
-                orig_idx = self.original_indices[idx]
-                scores[orig_idx] = score
-
-        return scores
-
-        
\ No newline at end of file
+        return dict(enumerate(self.score_array(query).tolist()))
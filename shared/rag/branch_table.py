@@ -0,0 +1,177 @@
+"""
+Typed branch table replacing the pickled index_list.
+
+index_list*.npy are object arrays of dicts ({'index', 'coor', 'package_url',
+'text', 'address', 'map_url'}) loaded with allow_pickle=True, and every hot
+path looked fields up one dict at a time. BranchTable keeps them as parallel
+arrays:
+
+    package_index  int32 knowledge_base row of every branch
+    coords         float64 (n, 2) lat/lng, NaN when the branch has no coordinates
+    url_ids        int32 ids into urls (package URLs interned once)
+    text / address / map_url   StringTable columns (UTF-8 buffer + offsets)
+
+so owner lookups, category masks and coordinate gathers are array operations.
+The table memory-maps straight from a snapshot without any pickle.
+table[i] still returns the legacy dict for code that wants a whole record.
+"""
+from typing import Dict, Iterable, List, Optional
+import json
+import math
+
+import numpy as np
+
+from .string_table import StringTable
+
+TEXT_FIELDS = ('text', 'address', 'map_url')
+_TYPED_FIELDS = ('index', 'coor', 'package_url') + TEXT_FIELDS
+
+
+def _coor(entry):
+    try:
+        coor = entry['coor']
+        return float(coor[0]), float(coor[1])
+    except Exception:
+        return math.nan, math.nan
+
+
+def as_branch_table(index_list) -> Optional["BranchTable"]:
+    """BranchTable for an index_list that may still be a legacy sequence of dicts"""
+    if index_list is None or isinstance(index_list, BranchTable):
+        return index_list
+    return BranchTable.from_records(index_list)
+
+
+class BranchTable:
+    def __init__(self,
+                 package_index: np.ndarray,
+                 coords: np.ndarray,
+                 url_ids: np.ndarray,
+                 urls: List[Optional[str]],
+                 columns: Dict[str, StringTable],
+                 extra: Optional[Dict[str, StringTable]] = None):
+        """
+        Args:
+            package_index / coords / url_ids: per-branch arrays (see module docstring)
+            urls: interned package URLs (url_ids index into it)
+            columns: StringTable per TEXT_FIELDS entry
+            extra: any other record fields, JSON-encoded per branch (None when absent)
+        """
+        self.package_index = package_index
+        self.coords = coords
+        self.url_ids = url_ids
+        self.urls = urls
+        self.columns = columns
+        self.extra = extra or {}
+        self.size = len(package_index)
+        self._url_id = {url: i for i, url in enumerate(urls) if url is not None}
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "BranchTable":
+        """Convert a legacy index_list (sequence of branch dicts)"""
+        records = list(records)
+        url_id: Dict[Optional[str], int] = {}
+        url_ids = np.fromiter((url_id.setdefault(entry.get('package_url'), len(url_id)) for entry in records),
+                              dtype=np.int32, count=len(records))
+        columns = {field: StringTable.from_values(entry.get(field) for entry in records) for field in TEXT_FIELDS}
+        extra = {}
+        for key in dict.fromkeys(key for entry in records for key in entry):
+            if key not in _TYPED_FIELDS:
+                extra[key] = StringTable.from_values(
+                    json.dumps(entry[key], ensure_ascii=False) if key in entry else None for entry in records
+                )
+        return cls(
+            package_index=np.fromiter((entry['index'] for entry in records), dtype=np.int32, count=len(records)),
+            coords=np.array([_coor(entry) for entry in records], dtype=np.float64).reshape(-1, 2),
+            url_ids=url_ids,
+            urls=list(url_id),
+            columns=columns,
+            extra=extra,
+        )
+
+    def __len__(self):
+        return self.size
+
+    # ---- columns ----
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self.coords[:, 0]
+
+    @property
+    def lng(self) -> np.ndarray:
+        return self.coords[:, 1]
+
+    def package_indices(self, branches) -> np.ndarray:
+        """knowledge_base rows of the given branches (vectorized gather)"""
+        return self.package_index[np.asarray(branches, dtype=np.int64)]
+
+    def package_url(self, branch: int) -> Optional[str]:
+        return self.urls[self.url_ids[branch]]
+
+    def text(self, branch: int) -> Optional[str]:
+        return self.columns['text'][branch]
+
+    def address(self, branch: int) -> Optional[str]:
+        return self.columns['address'][branch]
+
+    def map_url(self, branch: int) -> Optional[str]:
+        return self.columns['map_url'][branch]
+
+    def coor(self, branch: int) -> List[float]:
+        """[lat, lng], or [] when the branch has no coordinates"""
+        lat, lng = self.coords[branch]
+        return [] if math.isnan(lat) or math.isnan(lng) else [float(lat), float(lng)]
+
+    def url_mask(self, urls: Iterable[str]) -> np.ndarray:
+        """Bool mask of branches whose package URL is in urls"""
+        ids = [self._url_id[url] for url in urls if url in self._url_id]
+        if not ids:
+            return np.zeros(self.size, dtype=bool)
+        return np.isin(self.url_ids, np.asarray(ids, dtype=np.int32))
+
+    # ---- legacy records ----
+
+    def __getitem__(self, branch: int) -> dict:
+        branch = int(branch)
+        entry = {
+            'index': int(self.package_index[branch]),
+            'coor': self.coor(branch) or None,
+            'package_url': self.package_url(branch),
+        }
+        for field in TEXT_FIELDS:
+            entry[field] = self.columns[field][branch]
+        for key, values in self.extra.items():
+            value = values[branch]
+            if value is not None:
+                entry[key] = json.loads(value)
+        return entry
+
+    def __iter__(self):
+        return (self[i] for i in range(self.size))
+
+    # ---- snapshot ----
+
+    def save(self, writer, prefix: str) -> Dict:
+        """Write through a snapshot writer; returns the layout spec"""
+        return {
+            'size': self.size,
+            'package_index': writer.array(f"{prefix}/package_index.npy", self.package_index),
+            'coords': writer.array(f"{prefix}/coords.npy", self.coords),
+            'url_ids': writer.array(f"{prefix}/url_ids.npy", self.url_ids),
+            'urls': StringTable.from_values(self.urls).save(writer, f"{prefix}/urls"),
+            'columns': {field: table.save(writer, f"{prefix}/{field}") for field, table in self.columns.items()},
+            'extra': {key: table.save(writer, f"{prefix}/extra_{key}") for key, table in self.extra.items()},
+        }
+
+    @classmethod
+    def load(cls, reader, spec: Dict) -> "BranchTable":
+        """Memory-map a table written by save"""
+        return cls(
+            package_index=reader.array(spec['package_index']),
+            coords=reader.array(spec['coords']),
+            url_ids=reader.array(spec['url_ids']),
+            urls=StringTable.load(reader, spec['urls']).to_list(),
+            columns={field: StringTable.load(reader, table) for field, table in spec['columns'].items()},
+            extra={key: StringTable.load(reader, table) for key, table in spec['extra'].items()},
+        )
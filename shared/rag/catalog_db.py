@@ -0,0 +1,322 @@
+"""
+In-process SQLite copy of the package catalogue for sql_search.
+
+sql_search used to rewrite LLM-written queries into pandas code and eval() them
+against the whole DataFrame. The catalogue is now loaded once into an
+in-memory SQLite database with typed price columns, indexes on Brand,
+Category and Cash Price and an FTS5 (trigram) table over name, details and
+location. Queries run read-only (query_only pragma + authorizer), through the
+connection's prepared-statement cache, under a row limit and a time budget.
+
+Queries see the catalogue only through temp views (kb / packages /
+knowledge_base, and kb_fts for the FTS index) that apply the category scope;
+the authorizer rejects direct reads of the underlying tables, so a raw
+`FROM catalog` cannot step outside the scope.
+
+Row ids are knowledge_base row positions, so results can be joined back to
+CatalogStore / the context renderer.
+"""
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CATALOG_DB_ROW_LIMIT = int(os.getenv('CATALOG_DB_ROW_LIMIT', '15'))
+CATALOG_DB_QUERY_TIMEOUT = float(os.getenv('CATALOG_DB_QUERY_TIMEOUT', '2.0'))
+CATALOG_DB_STATEMENT_CACHE = int(os.getenv('CATALOG_DB_STATEMENT_CACHE', '256'))
+
+TABLE = 'catalog'
+FTS_TABLE = 'catalog_fts'
+FTS_VIEW = 'kb_fts'
+SCOPE_VIEWS = ['kb', 'packages', 'knowledge_base']
+# FTS5 shadow tables it reads itself while answering MATCH; never exposed by a view
+_FTS_INTERNAL_TABLES = {f'{FTS_TABLE}_idx', f'{FTS_TABLE}_config'}
+
+# Text columns that hold prices in the CSV; stored as REAL when every value parses
+PRICE_COLUMNS = ['Original Price', 'HDmall Price', 'Cash Discount', 'Cash Price', 'Deposit Price', 'Installment Price']
+INDEXED_COLUMNS = {'Brand': 'COLLATE NOCASE', 'Category': '', 'Cash Price': ''}
+# FTS5 column -> knowledge_base column
+FTS_COLUMNS = {'name': 'Name', 'details': 'Package Details', 'location': 'location'}
+
+# Names the LLM tends to use for columns -> actual knowledge_base column candidates
+COLUMN_ALIASES = {
+    'package_name': ['Name'],
+    'package name': ['Name'],
+    'name': ['Name'],
+    'hdmall_price': ['HDmall Price', 'Cash Price'],
+    'price': ['Cash Price', 'HDmall Price'],
+    'brand': ['Brand'],
+    'hospital': ['Brand'],
+    'category': ['Category'],
+    'location': ['location'],
+}
+
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+_ALLOWED_PRAGMAS = {'data_version'}  # read internally by FTS5
+
+
+class CatalogQueryError(Exception):
+    pass
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _fold(name: str) -> str:
+    return re.sub(r'[\s_]+', ' ', str(name)).strip().lower()
+
+
+@lru_cache(maxsize=512)
+def _compile_regex(pattern: str, case: bool):
+    return re.compile(pattern, 0 if case else re.IGNORECASE)
+
+
+def _pd_contains(value, pattern, case, regex):
+    """Series.str.contains semantics; missing / non-text values never match"""
+    if not isinstance(value, str) or pattern is None:
+        return 0
+    if regex:
+        try:
+            return 1 if _compile_regex(pattern, bool(case)).search(value) else 0
+        except re.error:
+            regex = False
+    if case:
+        return 1 if pattern in value else 0
+    return 1 if pattern.lower() in value.lower() else 0
+
+
+def _pd_startswith(value, prefix):
+    return 1 if isinstance(value, str) and isinstance(prefix, str) and value.startswith(prefix) else 0
+
+
+def _pd_endswith(value, suffix):
+    return 1 if isinstance(value, str) and isinstance(suffix, str) and value.endswith(suffix) else 0
+
+
+def _column_affinity(series: pd.Series, name: str):
+    """(sqlite type, converted values) for one knowledge_base column"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return 'INTEGER', series
+    if pd.api.types.is_float_dtype(series):
+        return 'REAL', series
+    if name in PRICE_COLUMNS:
+        numeric = pd.to_numeric(series.astype(str).str.replace(',', '', regex=False).str.strip(), errors='coerce')
+        if numeric.notna().sum() == series.notna().sum():
+            return 'REAL', numeric
+    return 'TEXT', series
+
+
+def _to_sql_value(value):
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, 'item'):
+        return value.item()
+    return value if isinstance(value, (int, float, str, bytes)) else str(value)
+
+
+class CatalogDatabase:
+    def __init__(self, knowledge_base,
+                 row_limit: int = CATALOG_DB_ROW_LIMIT,
+                 timeout: float = CATALOG_DB_QUERY_TIMEOUT):
+        start = time.time()
+        self.knowledge_base = knowledge_base
+        self.row_limit = row_limit
+        self.timeout = timeout
+        self.size = len(knowledge_base)
+        self.columns: List[str] = [str(col) for col in knowledge_base.columns]
+        self._folded = {_fold(col): col for col in self.columns}
+        self._lock = threading.Lock()
+        self._deadline = 0.0
+        self._scope = None  # rows visible through kb for the running query, None = all
+        self._view_tables = set()  # tables the statement being prepared reads through a view
+
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False,
+                                     cached_statements=CATALOG_DB_STATEMENT_CACHE)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.create_function('pd_contains', 4, _pd_contains, deterministic=True)
+        self._conn.create_function('pd_startswith', 2, _pd_startswith, deterministic=True)
+        self._conn.create_function('pd_endswith', 2, _pd_endswith, deterministic=True)
+        self._conn.create_function('in_scope', 1, self._in_scope)
+        # deterministic so SQLite evaluates it once per statement instead of per row
+        self._conn.create_function('scope_all', 0, self._scope_all, deterministic=True)
+
+        self.column_types: Dict[str, str] = {}
+        self.fts_enabled = False
+        self._load(knowledge_base)
+
+        # From here on the connection only ever reads
+        self._conn.execute('PRAGMA query_only = ON')
+        self._conn.set_authorizer(self._authorize)
+        self._conn.set_progress_handler(self._check_deadline, 1000)
+        logger.info(f"🗄️ [CATALOG-DB] Loaded {self.size} packages into SQLite in {time.time() - start:.2f}s (fts={self.fts_enabled})")
+
+    # ---- build ----
+
+    def _load(self, knowledge_base):
+        typed = {}
+        for col in knowledge_base.columns:
+            sql_type, values = _column_affinity(knowledge_base[col], str(col))
+            self.column_types[str(col)] = sql_type
+            typed[str(col)] = values.tolist()
+
+        column_defs = ', '.join(f"{quote_identifier(col)} {self.column_types[col]}" for col in self.columns)
+        self._conn.execute(f"CREATE TABLE {TABLE} (row_id INTEGER PRIMARY KEY, {column_defs})")
+        placeholders = ', '.join('?' for _ in range(len(self.columns) + 1))
+        rows = (
+            [row] + [_to_sql_value(typed[col][row]) for col in self.columns]
+            for row in range(self.size)
+        )
+        self._conn.executemany(f"INSERT INTO {TABLE} VALUES ({placeholders})", rows)
+
+        for col, collation in INDEXED_COLUMNS.items():
+            if col in self.column_types:
+                index_name = 'idx_' + re.sub(r'\W+', '_', col.lower())
+                self._conn.execute(f"CREATE INDEX {index_name} ON {TABLE}({quote_identifier(col)} {collation})".replace(' )', ')'))
+
+        fts_columns = {fts: col for fts, col in FTS_COLUMNS.items() if col in self.column_types}
+        if fts_columns:
+            try:
+                self._conn.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(fts_columns)}, content='', tokenize='trigram')"
+                )
+                self._conn.execute(
+                    f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(fts_columns)}) "
+                    f"SELECT row_id, {', '.join(quote_identifier(col) for col in fts_columns.values())} FROM {TABLE}"
+                )
+                self.fts_columns = fts_columns
+                self.fts_enabled = True
+            except sqlite3.OperationalError as e:
+                # SQLite builds without FTS5/trigram still get plain scans
+                logger.warning(f"⚠️ [CATALOG-DB] FTS5 unavailable, text filters will scan: {e}")
+        if not self.fts_enabled:
+            self.fts_columns = {}
+
+        for view in SCOPE_VIEWS:
+            self._conn.execute(f"CREATE TEMP VIEW {view} AS SELECT * FROM {TABLE} WHERE scope_all() OR in_scope(row_id)")
+        if self.fts_enabled:
+            self._conn.execute(
+                f"CREATE TEMP VIEW {FTS_VIEW} AS SELECT rowid AS row_id, {FTS_TABLE} AS fts FROM {FTS_TABLE} "
+                f"WHERE scope_all() OR in_scope(rowid)"
+            )
+
+        self._conn.execute('ANALYZE')
+        self._conn.commit()
+
+    # ---- sandbox ----
+
+    def _authorize(self, action, arg1, arg2, db_name, view):
+        if action == sqlite3.SQLITE_READ:
+            # the scoped views themselves, the tables behind them, and FTS5 internals
+            if db_name == 'temp' or arg1 in _FTS_INTERNAL_TABLES:
+                return sqlite3.SQLITE_OK
+            if view is not None:
+                self._view_tables.add(arg1)
+                return sqlite3.SQLITE_OK
+            # column-less reads (COUNT(*), SELECT 1) carry no view name; allow them
+            # for CTEs and for tables this statement already reads through a view
+            if arg2 == '' and (arg1 not in (TABLE, FTS_TABLE) or arg1 in self._view_tables):
+                return sqlite3.SQLITE_OK
+            return sqlite3.SQLITE_DENY
+        if action in _ALLOWED_ACTIONS:
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_PRAGMA and arg1 in _ALLOWED_PRAGMAS and arg2 is None:
+            return sqlite3.SQLITE_OK
+        return sqlite3.SQLITE_DENY
+
+    def _in_scope(self, row_id):
+        return 1 if self._scope is None or row_id in self._scope else 0
+
+    def _scope_all(self):
+        return 1 if self._scope is None else 0
+
+    def _check_deadline(self):
+        return 1 if time.monotonic() > self._deadline else 0
+
+    # ---- columns ----
+
+    def resolve_column(self, name: str) -> Optional[str]:
+        """Actual column for a name the LLM wrote (exact, case/space-insensitive or known alias)"""
+        if name in self.column_types:
+            return name
+        folded = _fold(name)
+        if folded in self._folded:
+            return self._folded[folded]
+        for candidate in COLUMN_ALIASES.get(folded, ()):
+            if candidate in self.column_types:
+                return candidate
+        return None
+
+    def fts_column(self, column: str) -> Optional[str]:
+        for fts, col in self.fts_columns.items():
+            if col == column:
+                return fts
+        return None
+
+    # ---- query ----
+
+    def query(self, sql: str, params: Sequence = (), rows: Optional[Iterable[int]] = None,
+              limit: Optional[int] = None) -> List[Dict]:
+        """
+        Run a single read-only SELECT. Inside it, kb / packages / knowledge_base
+        name the catalogue restricted to rows (all rows when None); the
+        catalog tables themselves cannot be read.
+        """
+        sql = sql.strip().rstrip(';').strip()
+        if not re.match(r'(?is)^(select|with)\b', sql):
+            raise CatalogQueryError("Only SELECT queries are allowed")
+        limit = self.row_limit if limit is None else max(0, min(int(limit), self.row_limit))
+
+        statement = f"SELECT * FROM ({sql}) LIMIT ?"
+        with self._lock:
+            self._scope = frozenset(int(r) for r in rows) if rows is not None else None
+            self._view_tables = set()
+            self._deadline = time.monotonic() + self.timeout
+            try:
+                cursor = self._conn.execute(statement, [*params, limit])
+                return [dict(row) for row in cursor.fetchall()]
+            except sqlite3.OperationalError as e:
+                if 'interrupted' in str(e):
+                    raise CatalogQueryError(f"Query exceeded {self.timeout:.1f}s") from e
+                raise CatalogQueryError(str(e)) from e
+            except sqlite3.DatabaseError as e:
+                raise CatalogQueryError(str(e)) from e
+
+    def stats(self):
+        return {
+            'rows': self.size,
+            'columns': len(self.columns),
+            'fts': self.fts_enabled,
+            'row_limit': self.row_limit,
+        }
+
+
+_current: Optional[CatalogDatabase] = None
+_lock = threading.Lock()
+
+
+def get_catalog_db(knowledge_base) -> CatalogDatabase:
+    """Shared database for the current knowledge base; rebuilt when the DataFrame object changes"""
+    global _current
+    db = _current
+    if db is not None and db.knowledge_base is knowledge_base:
+        return db
+    with _lock:
+        db = _current
+        if db is None or db.knowledge_base is not knowledge_base:
+            db = CatalogDatabase(knowledge_base)
+            _current = db
+    return db
@@ -0,0 +1,223 @@
+"""
+Structured package filter over precomputed catalogue indexes.
+
+Questions like "under 5,000฿ from Bangkok Hospital near Siam in Health
+Checkup" are answered without LLM-written queries: a price range is two
+binary searches over the price-sorted row order, brands come from an
+inverted index, categories from the CategoryIndex knowledge_base masks and
+location from the GeoIndex over branches (nearest branch per package).
+Everything is a numpy mask over knowledge_base rows.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import time
+
+import numpy as np
+
+from .catalog_store import CatalogStore
+from .category_index import CategoryIndex
+from .geo_index import GeoIndex
+
+PRICE_COLUMN = 'Cash Price'
+SORT_ORDERS = ('price_asc', 'price_desc', 'distance')
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def _as_float(values) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    for row, value in enumerate(values):
+        try:
+            out[row] = float(str(value).replace(',', '')) if isinstance(value, str) else float(value)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def _normalize_brand(brand) -> str:
+    return ' '.join(brand.split()).casefold() if isinstance(brand, str) else ''
+
+
+class CatalogFilter:
+    def __init__(self, catalog: CatalogStore, categories: Optional[CategoryIndex] = None, geo: Optional[GeoIndex] = None):
+        self.catalog = catalog
+        self.categories = categories
+        self.geo = geo
+        self.size = len(catalog)
+
+        # Price: row order sorted by price (NaN last) plus the sorted values for searchsorted
+        column = catalog.columns.get(PRICE_COLUMN)
+        self.prices = _as_float(column) if column is not None else np.full(self.size, np.nan)
+        self.price_order = np.argsort(self.prices, kind='stable')
+        self.priced = int(np.isfinite(self.prices).sum())
+        self.sorted_prices = self.prices[self.price_order[:self.priced]]
+
+        # Brand inverted index: normalized brand -> rows
+        brand_rows: Dict[str, List[int]] = {}
+        for row, brand in enumerate(catalog.columns.get('Brand', ())):
+            key = _normalize_brand(brand)
+            if key:
+                brand_rows.setdefault(key, []).append(row)
+        self.brand_rows: Dict[str, np.ndarray] = {k: np.asarray(v, dtype=np.int64) for k, v in brand_rows.items()}
+
+        # Branch -> owning knowledge_base row, for reducing branch distances to packages
+        if geo is not None and catalog.index_list is not None:
+            self.branch_owner = np.asarray(catalog.index_list.package_index, dtype=np.int64)
+        else:
+            self.branch_owner = None
+
+    # ---- masks ----
+
+    def price_mask(self, min_price: Optional[float] = None, max_price: Optional[float] = None) -> np.ndarray:
+        lo = 0 if min_price is None else int(np.searchsorted(self.sorted_prices, min_price, side='left'))
+        hi = self.priced if max_price is None else int(np.searchsorted(self.sorted_prices, max_price, side='right'))
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.price_order[lo:max(lo, hi)]] = True
+        return mask
+
+    def brand_rows_for(self, brand: str) -> np.ndarray:
+        """Rows of an exact (normalized) brand, else of every brand containing the term"""
+        key = _normalize_brand(brand)
+        if not key:
+            return np.zeros(0, dtype=np.int64)
+        rows = self.brand_rows.get(key)
+        if rows is not None:
+            return rows
+        matches = [rows for name, rows in self.brand_rows.items() if key in name]
+        return np.concatenate(matches) if matches else np.zeros(0, dtype=np.int64)
+
+    def brand_mask(self, brands: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for brand in brands:
+            mask[self.brand_rows_for(brand)] = True
+        return mask
+
+    def category_mask(self, category_tag: str) -> Optional[np.ndarray]:
+        """knowledge_base mask of the (fuzzily resolved) category; None when it is unknown"""
+        if self.categories is None:
+            return None
+        cat_name = self.categories.resolve_fuzzy(category_tag)
+        return self.categories.kb_masks.get(cat_name) if cat_name else None
+
+    def distances(self, lat: float, lng: float, radius_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per knowledge_base row: distance (km) of its nearest branch within radius_km
+        (any distance when None; inf when no branch qualifies) and the index_list
+        position of that branch (-1 when none). Branches without coordinates never match.
+        """
+        row_distance = np.full(self.size, np.inf)
+        nearest_branch = np.full(self.size, -1, dtype=np.int64)
+        if self.geo is None or self.branch_owner is None:
+            return row_distance, nearest_branch
+        if radius_km:
+            _, branch_distance = self.geo.radius_query(lat, lng, radius_km)
+            within = np.flatnonzero(branch_distance <= radius_km)
+        else:
+            branch_distance = self.geo.distances_from(lat, lng)
+            within = np.flatnonzero(np.isfinite(branch_distance))
+        if len(within):
+            # nearest first, so the first branch seen per owner is its closest
+            within = within[np.argsort(branch_distance[within], kind='stable')]
+            owners = self.branch_owner[within]
+            owners, first = np.unique(owners, return_index=True)
+            valid = owners < self.size
+            owners, first = owners[valid], first[valid]
+            row_distance[owners] = branch_distance[within[first]]
+            nearest_branch[owners] = within[first]
+        return row_distance, nearest_branch
+
+    # ---- query ----
+
+    def query(self,
+              min_price: Optional[float] = None,
+              max_price: Optional[float] = None,
+              brands: Optional[Sequence[str]] = None,
+              category_tag: Optional[str] = None,
+              origin: Optional[Tuple[float, float]] = None,
+              radius_km: Optional[float] = None,
+              sort: str = 'price_asc',
+              limit: int = DEFAULT_LIMIT) -> Dict:
+        """
+        Filter knowledge_base rows; every given criterion must hold.
+
+        Args:
+            min_price / max_price: inclusive Cash Price bounds
+            brands: brand names (any of them)
+            category_tag: highlight category name (fuzzy)
+            origin: geocoded (lat, lng) of the requested location
+            radius_km: keep packages with a branch within this distance of origin
+            sort: price_asc, price_desc or distance (needs origin)
+            limit: number of packages returned (capped at MAX_LIMIT)
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_ORDERS)}")
+        if sort == 'distance' and origin is None:
+            raise ValueError("sort='distance' needs a location")
+        start = time.perf_counter()
+        limit = max(0, min(int(limit), MAX_LIMIT))
+        mask = np.ones(self.size, dtype=bool)
+        applied = []
+
+        if min_price is not None or max_price is not None:
+            mask &= self.price_mask(min_price, max_price)
+            applied.append('price')
+        if brands:
+            mask &= self.brand_mask(brands)
+            applied.append('brand')
+        if category_tag:
+            category = self.category_mask(category_tag)
+            if category is None:
+                raise ValueError(f"Unknown category: {category_tag}")
+            mask &= category
+            applied.append('category')
+
+        row_distance = nearest_branch = None
+        if origin is not None:
+            row_distance, nearest_branch = self.distances(origin[0], origin[1], radius_km)
+            if radius_km:
+                mask &= np.isfinite(row_distance)
+                applied.append('radius')
+
+        if sort == 'distance':
+            candidates = np.flatnonzero(mask)
+            rows = candidates[np.argsort(row_distance[candidates], kind='stable')]
+        else:
+            # price_order is already sorted; NaN prices stay last in both directions
+            ordered = self.price_order[mask[self.price_order]]
+            if sort == 'price_desc':
+                priced = np.isfinite(self.prices[ordered])
+                ordered = np.concatenate((ordered[priced][::-1], ordered[~priced]))
+            rows = ordered
+
+        total = len(rows)
+        results = [self._result(int(row), row_distance, nearest_branch) for row in rows[:limit]]
+        return {
+            'total': total,
+            'filters': applied,
+            'sort': sort,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+            'packages': results,
+        }
+
+    def _result(self, row: int, row_distance, nearest_branch) -> Dict:
+        s = self.catalog.row(row)
+        price = self.prices[row]
+        result = {
+            'row': row,
+            'name': s.get('Name'),
+            'url': s.get('URL'),
+            'brand': s.get('Brand'),
+            'category': s.get('Category'),
+            'location': s.get('location'),
+            'cash_price': None if math.isnan(price) else float(price),
+        }
+        if row_distance is not None:
+            distance = row_distance[row]
+            result['distance_km'] = round(float(distance), 2) if np.isfinite(distance) else None
+            branch = int(nearest_branch[row])
+            if branch >= 0:
+                branches = self.catalog.index_list
+                result['branch_address'] = branches.address(branch)
+                result['map_url'] = branches.map_url(branch)
+        # NaN text cells from the CSV become None so the result is JSON-safe
+        return {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in result.items()}
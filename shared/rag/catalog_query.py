@@ -0,0 +1,336 @@
+"""
+Compile the pandas expressions LLM tools write for sql_search into
+parameterized SQL over the CatalogDatabase.
+
+The sql_search tool prompts ask for pandas syntax such as
+    kb[(kb['Cash Price'] < 5000) & kb['Brand'].str.contains('bnh', case=False)].sort_values('Cash Price').head(10)
+Instead of eval()-ing that against the DataFrame, the expression is parsed
+with ast and only a whitelisted subset is translated: boolean filters
+(comparisons, &, |, ~, .str.contains / startswith / endswith, .between,
+.isin, .isna / .notna), column selection, .query(), .sort_values(),
+.nsmallest() / .nlargest(), .drop_duplicates() and .head(). Literal values
+become bound parameters; anything else raises CatalogQueryError.
+"""
+from typing import Callable, List, Optional, Tuple
+import ast
+import re
+
+from .catalog_db import CatalogDatabase, CatalogQueryError, quote_identifier
+
+FRAME_NAMES = {'kb', 'knowledge_base', 'df'}
+_REGEX_META = re.compile(r'[.^$*+?{}\[\]\\|()]')
+_COMPARE_OPS = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '=', ast.NotEq: '!='}
+_FLIPPED = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '=': '=', '!=': '!='}
+
+
+class _Frame:
+    """Accumulated SELECT over kb"""
+
+    def __init__(self):
+        self.where: List[str] = []
+        self.params: List = []
+        self.order: List[str] = []
+        self.columns: Optional[List[str]] = None
+        self.limit: Optional[int] = None
+        self.distinct_on: Optional[List[str]] = None
+
+    def to_sql(self) -> Tuple[str, List]:
+        where = ' AND '.join(f"({w})" for w in self.where) or '1'
+        params = list(self.params)
+        if self.distinct_on:
+            group = ', '.join(quote_identifier(c) for c in self.distinct_on)
+            where = f"{where} AND row_id IN (SELECT MIN(row_id) FROM kb WHERE {where} GROUP BY {group})"
+            params = params + params
+        projection = ', '.join(quote_identifier(c) for c in self.columns) if self.columns else '*'
+        order = ', '.join(self.order + ['row_id'])
+        sql = f"SELECT {projection} FROM kb WHERE {where} ORDER BY {order}"
+        if self.limit is not None:
+            sql += " LIMIT ?"
+            params.append(self.limit)
+        return sql, params
+
+
+class PandasQueryCompiler:
+    def __init__(self, db: CatalogDatabase, normalize_brand: Optional[Callable[[str], str]] = None):
+        self.db = db
+        self.normalize_brand = normalize_brand
+        self._backticks = {}
+
+    def compile(self, expression: str) -> Tuple[str, List]:
+        """SQL over kb plus its parameters for a pandas expression"""
+        expression = expression.strip().rstrip(';').strip()
+        try:
+            node = ast.parse(expression, mode='eval').body
+        except SyntaxError:
+            # `quoted column` names only appear in DataFrame.query style conditions
+            node = self._parse_query_string(expression)
+        frame = self._frame(node) if self._is_frame(node) else _Frame()
+        if not self._is_frame(node):
+            # bare condition such as "`Cash Price` < 5000" (DataFrame.query style)
+            self._filter(frame, node, query_mode=True)
+        return frame.to_sql()
+
+    # ---- frames ----
+
+    def _is_frame(self, node) -> bool:
+        if isinstance(node, ast.Name):
+            return node.id in FRAME_NAMES
+        if isinstance(node, ast.Subscript):
+            return self._is_frame(node.value)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return self._is_frame(node.func.value)
+        return False
+
+    def _frame(self, node) -> _Frame:
+        if isinstance(node, ast.Name):
+            if node.id not in FRAME_NAMES:
+                raise CatalogQueryError(f"Unknown name '{node.id}'")
+            return _Frame()
+
+        if isinstance(node, ast.Subscript):
+            frame = self._frame(node.value)
+            key = node.slice
+            if isinstance(key, ast.List):
+                frame.columns = [self._column(self._literal(elt)) for elt in key.elts]
+            elif isinstance(key, ast.Constant) and isinstance(key.value, str):
+                frame.columns = [self._column(key.value)]
+            elif isinstance(key, ast.Slice):
+                frame.limit = self._head_limit(frame, key)
+            else:
+                self._require_rows(frame, 'filter')
+                self._filter(frame, key)
+            return frame
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            method = node.func.attr
+            frame = self._frame(node.func.value)
+            args, kwargs = node.args, {kw.arg: kw.value for kw in node.keywords}
+            if method == 'head':
+                n = self._literal(args[0]) if args else self._literal(kwargs['n']) if 'n' in kwargs else 5
+                frame.limit = int(n) if frame.limit is None else min(frame.limit, int(n))
+            elif method == 'sort_values':
+                by = self._literal(args[0] if args else kwargs['by'])
+                ascending = self._literal(kwargs['ascending']) if 'ascending' in kwargs else True
+                by = by if isinstance(by, list) else [by]
+                ascending = ascending if isinstance(ascending, list) else [ascending] * len(by)
+                # a later sort_values takes precedence over an earlier one
+                frame.order = [
+                    f"{quote_identifier(self._column(col))} IS NULL, {quote_identifier(self._column(col))} {'ASC' if asc else 'DESC'}"
+                    for col, asc in zip(by, ascending)
+                ] + frame.order
+            elif method in ('nsmallest', 'nlargest'):
+                n = self._literal(args[0] if args else kwargs['n'])
+                columns = self._literal(args[1] if len(args) > 1 else kwargs['columns'])
+                columns = columns if isinstance(columns, list) else [columns]
+                direction = 'ASC' if method == 'nsmallest' else 'DESC'
+                self._require_rows(frame, method)
+                frame.where.append(' AND '.join(f"{quote_identifier(self._column(c))} IS NOT NULL" for c in columns))
+                frame.order = [f"{quote_identifier(self._column(c))} {direction}" for c in columns] + frame.order
+                frame.limit = int(n)
+            elif method == 'query':
+                self._require_rows(frame, method)
+                text = self._literal(args[0])
+                self._filter(frame, self._parse_query_string(text), query_mode=True)
+            elif method == 'drop_duplicates':
+                subset = self._literal(args[0]) if args else self._literal(kwargs['subset']) if 'subset' in kwargs else None
+                subset = subset if isinstance(subset, list) else [subset] if subset else self.db.columns
+                self._require_rows(frame, method)
+                frame.distinct_on = [self._column(c) for c in subset]
+            elif method in ('copy', 'reset_index', 'dropna'):
+                if method == 'dropna' and 'subset' in kwargs:
+                    subset = self._literal(kwargs['subset'])
+                    for col in (subset if isinstance(subset, list) else [subset]):
+                        frame.where.append(f"{quote_identifier(self._column(col))} IS NOT NULL")
+            else:
+                raise CatalogQueryError(f"Unsupported DataFrame method '.{method}()'")
+            return frame
+
+        raise CatalogQueryError(f"Unsupported expression: {ast.unparse(node)}")
+
+    @staticmethod
+    def _require_rows(frame: _Frame, method: str):
+        if frame.limit is not None:
+            raise CatalogQueryError(f"'.{method}()' after '.head()' is not supported; filter before limiting")
+
+    def _head_limit(self, frame: _Frame, key: ast.Slice) -> int:
+        if key.lower is not None or key.step is not None or key.upper is None:
+            raise CatalogQueryError("Only kb[:n] slices are supported")
+        n = int(self._literal(key.upper))
+        return n if frame.limit is None else min(frame.limit, n)
+
+    # ---- conditions ----
+
+    def _filter(self, frame: _Frame, node, query_mode: bool = False):
+        sql, params = self._condition(node, query_mode)
+        frame.where.append(sql)
+        frame.params.extend(params)
+
+    def _condition(self, node, query_mode: bool) -> Tuple[str, List]:
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+            left, lp = self._condition(node.left, query_mode)
+            right, rp = self._condition(node.right, query_mode)
+            joiner = 'AND' if isinstance(node.op, ast.BitAnd) else 'OR'
+            return f"({left} {joiner} {right})", lp + rp
+        if isinstance(node, ast.BoolOp):
+            parts = [self._condition(value, query_mode) for value in node.values]
+            joiner = ' AND ' if isinstance(node.op, ast.And) else ' OR '
+            return '(' + joiner.join(sql for sql, _ in parts) + ')', [p for _, params in parts for p in params]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.Not)):
+            inner, params = self._condition(node.operand, query_mode)
+            return f"(NOT {inner})", params
+        if isinstance(node, ast.Compare):
+            return self._compare(node, query_mode)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return self._method_condition(node, query_mode)
+        raise CatalogQueryError(f"Unsupported condition: {ast.unparse(node)}")
+
+    def _compare(self, node: ast.Compare, query_mode: bool) -> Tuple[str, List]:
+        clauses, params = [], []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                column = self._column_ref(left, query_mode)
+                values = self._literal(right)
+                values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+                values = [self._normalize_value(column, v) for v in values]
+                sql = f"COALESCE({quote_identifier(column)} IN ({', '.join('?' for _ in values) or 'NULL'}), 0)"
+                clauses.append(f"NOT {sql}" if isinstance(op, ast.NotIn) else sql)
+                params.extend(values)
+            elif type(op) in _COMPARE_OPS:
+                symbol = _COMPARE_OPS[type(op)]
+                left_column = self._try_column_ref(left, query_mode)
+                if left_column is not None:
+                    column, value = left_column, self._literal(right)
+                else:
+                    column = self._column_ref(right, query_mode)
+                    value, symbol = self._literal(left), _FLIPPED[symbol]
+                value = self._normalize_value(column, value)
+                if symbol == '!=':
+                    # pandas treats NaN != x as True
+                    clauses.append(f"({quote_identifier(column)} IS NULL OR {quote_identifier(column)} != ?)")
+                else:
+                    clauses.append(f"COALESCE({quote_identifier(column)} {symbol} ?, 0)")
+                params.append(value)
+            else:
+                raise CatalogQueryError(f"Unsupported comparison: {ast.unparse(node)}")
+            left = right
+        return '(' + ' AND '.join(clauses) + ')', params
+
+    def _method_condition(self, node: ast.Call, query_mode: bool) -> Tuple[str, List]:
+        method = node.func.attr
+        target = node.func.value
+        args, kwargs = node.args, {kw.arg: kw.value for kw in node.keywords}
+
+        # kb['col'].str.<method>(...)
+        if isinstance(target, ast.Attribute) and target.attr == 'str':
+            source, folded = target.value, False
+            # kb['col'].str.lower().str.contains(...) is a case-insensitive contains
+            if (isinstance(source, ast.Call) and isinstance(source.func, ast.Attribute)
+                    and source.func.attr in ('lower', 'upper') and isinstance(source.func.value, ast.Attribute)
+                    and source.func.value.attr == 'str'):
+                source, folded = source.func.value.value, True
+            column = self._column_ref(source, query_mode)
+            col = quote_identifier(column)
+            pattern = self._literal(args[0] if args else kwargs['pat'])
+            if not isinstance(pattern, str):
+                raise CatalogQueryError(f".str.{method}() needs a text pattern")
+            pattern = self._normalize_value(column, pattern)
+            if method == 'contains':
+                case = bool(self._literal(kwargs['case'])) if 'case' in kwargs else not folded
+                regex = bool(self._literal(kwargs['regex'])) if 'regex' in kwargs else True
+                return self._contains(column, col, pattern, case, regex)
+            if folded:
+                raise CatalogQueryError(f"Use .str.contains(..., case=False) instead of .str.lower().str.{method}()")
+            if method == 'startswith':
+                return f"pd_startswith({col}, ?)", [pattern]
+            if method == 'endswith':
+                return f"pd_endswith({col}, ?)", [pattern]
+            raise CatalogQueryError(f"Unsupported string method '.str.{method}()'")
+
+        column = self._column_ref(target, query_mode)
+        col = quote_identifier(column)
+        if method == 'between':
+            low, high = (self._literal(a) for a in args[:2])
+            inclusive = self._literal(kwargs['inclusive']) if 'inclusive' in kwargs else 'both'
+            lower = '>=' if inclusive in ('both', 'left', True) else '>'
+            upper = '<=' if inclusive in ('both', 'right', True) else '<'
+            return f"COALESCE({col} {lower} ? AND {col} {upper} ?, 0)", [low, high]
+        if method == 'isin':
+            values = self._literal(args[0])
+            values = [self._normalize_value(column, v) for v in (values if isinstance(values, (list, tuple, set)) else [values])]
+            return f"COALESCE({col} IN ({', '.join('?' for _ in values) or 'NULL'}), 0)", values
+        if method in ('isna', 'isnull'):
+            return f"{col} IS NULL", []
+        if method in ('notna', 'notnull'):
+            return f"{col} IS NOT NULL", []
+        raise CatalogQueryError(f"Unsupported column method '.{method}()'")
+
+    def _contains(self, column: str, col: str, pattern: str, case: bool, regex: bool) -> Tuple[str, List]:
+        sql, params = f"pd_contains({col}, ?, ?, ?)", [pattern, int(case), int(regex)]
+        fts = self.db.fts_column(column)
+        literal = not regex or not _REGEX_META.search(pattern)
+        if fts and literal and len(pattern) >= 3:
+            # Trigram index narrows the candidates; pd_contains keeps exact pandas semantics
+            phrase = '"' + pattern.replace('"', '""') + '"'
+            sql = f"(row_id IN (SELECT row_id FROM kb_fts WHERE fts MATCH ?) AND {sql})"
+            params = [f"{fts} : {phrase}"] + params
+        return sql, params
+
+    # ---- operands ----
+
+    def _try_column_ref(self, node, query_mode: bool) -> Optional[str]:
+        try:
+            return self._column_ref(node, query_mode)
+        except CatalogQueryError:
+            return None
+
+    def _column_ref(self, node, query_mode: bool) -> str:
+        # kb['col'] / kb["col"]
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id in FRAME_NAMES:
+            key = node.slice
+            if isinstance(key, ast.Constant) and isinstance(key.value, str):
+                return self._column(key.value)
+        # kb.col
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in FRAME_NAMES:
+            return self._column(node.attr)
+        # bare names inside DataFrame.query strings
+        if query_mode and isinstance(node, ast.Name):
+            return self._column(self._backticks.get(node.id, node.id))
+        raise CatalogQueryError(f"Expected a column, got: {ast.unparse(node)}")
+
+    def _column(self, name) -> str:
+        column = self.db.resolve_column(str(name))
+        if column is None:
+            raise CatalogQueryError(f"Unknown column '{name}'. Available columns: {', '.join(self.db.columns)}")
+        return column
+
+    def _literal(self, node):
+        try:
+            return ast.literal_eval(node)
+        except (ValueError, SyntaxError) as e:
+            raise CatalogQueryError(f"Expected a literal value, got: {ast.unparse(node)}") from e
+
+    def _normalize_value(self, column: str, value):
+        if column == 'Brand' and isinstance(value, str) and self.normalize_brand is not None:
+            normalized = self.normalize_brand(value)
+            if normalized != value:
+                print(f"🏥 Brand normalization: '{value}' → '{normalized}'")
+            return normalized
+        return value
+
+    def _parse_query_string(self, text: str):
+        """Parse a DataFrame.query() string, mapping `quoted column` names to placeholders"""
+        names = {}
+
+        def _placeholder(match):
+            name = f"__col{len(names)}"
+            names[name] = match.group(1)
+            return name
+
+        source = re.sub(r'`([^`]+)`', _placeholder, text)
+        try:
+            node = ast.parse(source, mode='eval').body
+        except SyntaxError as e:
+            raise CatalogQueryError(f"Could not parse query: {e.msg}") from e
+        self._backticks = names
+        return node
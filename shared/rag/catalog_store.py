@@ -0,0 +1,121 @@
+"""
+Columnar, read-only view of the package catalogue (knowledge_base).
+
+Hot paths used to go through knowledge_base.iloc[...] or full-column scans such
+as knowledge_base['URL'] == url. CatalogStore keeps one typed numpy array per
+column, a URL -> rows hash index and a row -> branches (index_list) index, and
+hands out lightweight PackageRow views.
+
+knowledge_base is loaded with read_csv's default RangeIndex, so row positions
+and DataFrame index labels are the same thing.
+
+This removes the O(N) scans but not the DataFrame's memory: text columns are
+the DataFrame's own object arrays (to_numpy() returns views), and the
+DataFrame stays alive in global_storage for catalogue SQLite loading, the
+explore helpers and rerank document rendering. The store only keeps a weak
+reference to it, so a replaced knowledge base is not pinned by a stale store.
+"""
+from typing import Dict, List, Optional
+import threading
+import weakref
+
+import numpy as np
+
+
+class PackageRow:
+    """Single catalogue row; supports row['Col'] and row.get('Col') like a pandas Series"""
+    __slots__ = ('_columns', 'row')
+
+    def __init__(self, columns: Dict[str, np.ndarray], row: int):
+        self._columns = columns
+        self.row = row
+
+    def __getitem__(self, column):
+        return self._columns[column][self.row]
+
+    def get(self, column, default=None):
+        values = self._columns.get(column)
+        return default if values is None else values[self.row]
+
+    def __contains__(self, column):
+        return column in self._columns
+
+    def __repr__(self):
+        return f"PackageRow({self.row})"
+
+
+class CatalogStore:
+    def __init__(self, knowledge_base, index_list=None):
+        self._knowledge_base = weakref.ref(knowledge_base)
+        self.index_list = index_list
+        self.size = len(knowledge_base)
+        # numeric columns keep their numpy dtype, text columns become object arrays
+        self.columns: Dict[str, np.ndarray] = {
+            col: knowledge_base[col].to_numpy() for col in knowledge_base.columns
+        }
+
+        self.url_to_rows: Dict[str, List[int]] = {}
+        if 'URL' in self.columns:
+            for row, url in enumerate(self.columns['URL']):
+                self.url_to_rows.setdefault(url, []).append(row)
+
+        # CSR layout: branches of row r are branch_ids[branch_indptr[r]:branch_indptr[r + 1]]
+        if index_list is not None and len(index_list):
+            owners = np.asarray(index_list.package_index, dtype=np.int64)
+            order = np.argsort(owners, kind='stable')
+            self.branch_ids = order
+            counts = np.bincount(owners, minlength=self.size)[:self.size]
+            self.branch_indptr = np.concatenate(([0], np.cumsum(counts)))
+        else:
+            self.branch_ids = np.zeros(0, dtype=np.int64)
+            self.branch_indptr = np.zeros(self.size + 1, dtype=np.int64)
+
+    @property
+    def knowledge_base(self):
+        """The DataFrame the store was built from (None once it has been released)"""
+        return self._knowledge_base()
+
+    def __len__(self):
+        return self.size
+
+    def row(self, row: int) -> PackageRow:
+        return PackageRow(self.columns, int(row))
+
+    def value(self, row: int, column: str):
+        return self.columns[column][row]
+
+    def rows_for_url(self, url: str) -> List[int]:
+        return list(self.url_to_rows.get(url, ()))
+
+    def row_for_url(self, url: str) -> Optional[int]:
+        rows = self.url_to_rows.get(url)
+        return rows[0] if rows else None
+
+    def branches(self, row: int) -> np.ndarray:
+        """index_list positions of the branches belonging to a catalogue row, in index_list order"""
+        if not 0 <= row < self.size:
+            return self.branch_ids[:0]
+        return self.branch_ids[self.branch_indptr[row]:self.branch_indptr[row + 1]]
+
+
+_current: Optional[CatalogStore] = None
+_lock = threading.Lock()
+
+
+def _is_current(store, knowledge_base, index_list) -> bool:
+    return (store is not None and store.knowledge_base is knowledge_base
+            and (index_list is None or store.index_list is index_list))
+
+
+def get_catalog(knowledge_base, index_list=None) -> CatalogStore:
+    """Shared store for the current knowledge base; rebuilt when the data objects change"""
+    global _current
+    store = _current
+    if _is_current(store, knowledge_base, index_list):
+        return store
+    with _lock:
+        store = _current
+        if not _is_current(store, knowledge_base, index_list):
+            store = CatalogStore(knowledge_base, index_list)
+            _current = store
+    return store
@@ -0,0 +1,130 @@
+"""
+Precomputed highlight-category index over hl_prompts/hl_mapping.json.
+
+Built once at startup so per-request category filtering is a dict lookup
+returning a ready row mask instead of scanning hl_map and testing list
+membership for every index_list row.
+"""
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+
+import numpy as np
+
+from .branch_table import as_branch_table
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+HL_MAPPING_PATH = os.path.join(project_root, "hl_prompts", "hl_mapping.json")
+
+
+def load_hl_mapping(path: str = HL_MAPPING_PATH) -> List[dict]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def normalize_category(name) -> str:
+    """Single normalizer used for every category comparison"""
+    if not isinstance(name, str):
+        return ''
+    return ' '.join(name.split()).lower()
+
+
+def _readonly(mask: np.ndarray) -> np.ndarray:
+    mask.flags.writeable = False
+    return mask
+
+
+class CategoryIndex:
+    """
+    cat_name -> boolean index_list row mask
+    cat_name -> boolean knowledge_base row mask
+    cat_name -> hl_url
+    package URL -> [cat_name, ...]
+    """
+
+    def __init__(self, hl_map: List[dict], index_list=None, knowledge_base=None):
+        self.hl_map = hl_map
+        self.cat_names: List[str] = []
+        self.hl_urls: Dict[str, str] = {}
+        self.url_categories: Dict[str, List[str]] = {}
+        self._by_normalized: Dict[str, str] = {}
+        self._packages: Dict[str, set] = {}
+
+        for d in hl_map:
+            cat_name = d['cat_name']
+            if cat_name in self.hl_urls:
+                continue  # first entry wins, as with the old linear scans
+            self.cat_names.append(cat_name)
+            self.hl_urls[cat_name] = d.get('hl_url')
+            self._by_normalized.setdefault(normalize_category(cat_name), cat_name)
+            packages = set(d.get('packages') or [])
+            self._packages[cat_name] = packages
+            for url in packages:
+                self.url_categories.setdefault(url, []).append(cat_name)
+
+        self._normalized_names = [(normalize_category(name), name) for name in self.cat_names]
+
+        # Branch URLs are interned in the BranchTable: one vectorized membership test per category
+        branches = as_branch_table(index_list)
+        self.num_rows = len(branches) if branches is not None else 0
+        self.row_masks = {
+            name: _readonly(branches.url_mask(self._packages[name]) if branches is not None else np.zeros(0, dtype=bool))
+            for name in self.cat_names
+        }
+        self.all_rows = _readonly(np.ones(self.num_rows, dtype=bool))
+
+        kb_urls = knowledge_base['URL'].tolist() if knowledge_base is not None and 'URL' in knowledge_base else []
+        self.kb_masks = self._build_masks(kb_urls)
+
+    def _build_masks(self, urls) -> Dict[str, np.ndarray]:
+        rows_by_category: Dict[str, List[int]] = {name: [] for name in self.cat_names}
+        for row, url in enumerate(urls):
+            for cat_name in self.url_categories.get(url, ()):
+                rows_by_category[cat_name].append(row)
+        masks = {}
+        for cat_name, rows in rows_by_category.items():
+            mask = np.zeros(len(urls), dtype=bool)
+            mask[rows] = True
+            masks[cat_name] = _readonly(mask)
+        return masks
+
+    def resolve(self, category_tag) -> Optional[str]:
+        """Exact (normalized) category match"""
+        return self._by_normalized.get(normalize_category(category_tag))
+
+    def resolve_fuzzy(self, category_tag) -> Optional[str]:
+        """Exact match first, then first category where either name contains the other"""
+        tag = normalize_category(category_tag)
+        if not tag:
+            return None
+        if tag in self._by_normalized:
+            return self._by_normalized[tag]
+        for normalized, cat_name in self._normalized_names:
+            if normalized in tag or tag in normalized:
+                return cat_name
+        return None
+
+    def packages(self, category_tag) -> set:
+        cat_name = self.resolve(category_tag)
+        return self._packages.get(cat_name, set()) if cat_name else set()
+
+    def hl_url(self, category_tag, fuzzy: bool = False) -> Optional[str]:
+        cat_name = self.resolve_fuzzy(category_tag) if fuzzy else self.resolve(category_tag)
+        return self.hl_urls.get(cat_name) if cat_name else None
+
+    def row_mask(self, category_tag) -> np.ndarray:
+        """Read-only bool mask over index_list; all True when the category is unknown or empty"""
+        cat_name = self.resolve(category_tag)
+        if cat_name and self._packages[cat_name]:
+            return self.row_masks[cat_name]
+        return self.all_rows
+
+    def kb_mask(self, category_tag) -> Optional[np.ndarray]:
+        """Read-only bool mask over knowledge_base rows, None when the category is unknown or empty"""
+        cat_name = self.resolve(category_tag)
+        mask = self.kb_masks.get(cat_name) if cat_name else None
+        return mask if mask is not None and mask.any() else None
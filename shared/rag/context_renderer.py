@@ -0,0 +1,151 @@
+"""
+Pre-rendered per-package context snippets for retrieval prompts.
+
+Every retrieval used to render the <RETRIEVED_PACKAGE_...> blocks with
+knowledge_base.iloc[...] plus ~15 column lookups per package. Snippets are now
+rendered from the columnar CatalogStore on first use and memoized. The renderer
+is tied to the knowledge_base / index_list objects it was built from;
+get_context_renderer() builds a fresh one when they are reloaded.
+"""
+from typing import Dict, Optional
+import threading
+
+from .catalog_store import get_catalog, _is_current
+
+
+class PackageContextRenderer:
+    def __init__(self, knowledge_base, index_list=None):
+        self.index_list = index_list
+        self.catalog = get_catalog(knowledge_base, index_list)
+
+        self._full: Dict[int, str] = {}
+        self._metadata: Dict[tuple, str] = {}
+        self._package_info: Dict[int, str] = {}
+        self._row_full: Dict[int, str] = {}
+
+    @property
+    def knowledge_base(self):
+        return self.catalog.knowledge_base
+
+    def _row(self, row: int):
+        return self.catalog.row(row)
+
+    @staticmethod
+    def _price_fields(s) -> str:
+        return f"""<package_original_price>{s['Original Price']}</package_original_price>
+            <package_hdmall_price>{s['HDmall Price']}</package_hdmall_price>
+            <package_cash_discount>{s['Cash Discount']}</package_cash_discount>
+            <package_cash_price>{s['Cash Price']}</package_cash_price>
+            <package_reserve/deposit_price>{s['Deposit Price']}</package_reserve/deposit_price>"""
+
+    @staticmethod
+    def _detail_fields(s) -> str:
+        return f"""<package_price_details>{s['Price Details']}</package_price_details>
+            <package_booking_detail>{s['Payment Booking Info']}</package_booking_detail>
+            <full_or_starting_price?>{s['Full or Starting Price']}</full_or_starting_price?>
+            <installment_price_per_month>{s['Installment Price']}</installment_price_per_month>
+            <installment_months>{s['Installment Month']}</installment_months>
+            <hospital_or_shop_name>{s['Shop Name']} {s['Brand']}</hospital_or_shop_name>
+            <selling_points>{s['Preview 1-10']}{s['Selling Point']}</selling_points>
+            <min_or_max_age>{s['Min/Max Age']}</min_or_max_age>"""
+
+    @staticmethod
+    def _information(s) -> str:
+        return f"{s['Package Details']}{s['Important Info']}{s['General Info']}{s['FAQ']}"
+
+    def full(self, branch: int) -> str:
+        """Full block for an index_list entry (package fields plus branch address/map)"""
+        block = self._full.get(branch)
+        if block is None:
+            branches = self.index_list
+            true_index = int(branches.package_index[branch])
+            s = self._row(true_index)
+            block = f"""
+            <RETRIEVED_PACKAGE_{true_index}>
+            <package_name>{branches.text(branch)}</package_name>
+            <package_url>{s['URL']}</package_url>
+            {self._price_fields(s)}
+            {self._detail_fields(s)}
+            <location_information> Address : {branches.address(branch)} \n Google Map : {branches.map_url(branch)}</location_information>
+            <package_information>{self._information(s)}</package_information>
+            </RETRIEVED_PACKAGE_{true_index}>
+            """
+            self._full[branch] = block
+        return block
+
+    def metadata(self, branch: int, label: str) -> str:
+        """Price-only block for an index_list entry, tagged type=<label>"""
+        key = (branch, label)
+        block = self._metadata.get(key)
+        if block is None:
+            branches = self.index_list
+            true_index = int(branches.package_index[branch])
+            s = self._row(true_index)
+            block = f"""
+            <RETRIEVED_PACKAGE_{true_index} type={label}>
+            <package_name>{branches.text(branch)}</package_name>
+            <package_url>{s['URL']}</package_url>
+            {self._price_fields(s)}
+            <full_or_starting_price?>{s['Full or Starting Price']}</full_or_starting_price?>
+            </RETRIEVED_PACKAGE_{true_index}>
+            """
+            self._metadata[key] = block
+        return block
+
+    def full_by_row(self, row: int) -> str:
+        """Full block for a knowledge_base row, using the package-level location"""
+        block = self._row_full.get(row)
+        if block is None:
+            s = self._row(row)
+            block = f"""
+            <RETRIEVED_PACKAGE_{row}>
+            <package_name>{s['Name']}</package_name>
+            <package_url>{s['URL']}</package_url>
+            {self._price_fields(s)}
+            {self._detail_fields(s)}
+            <location>{s['location']}</location>
+            <package_information>{self._information(s)}</package_information>
+            </RETRIEVED_PACKAGE_{row}>
+            """
+            self._row_full[row] = block
+        return block
+
+    def package_info(self, row: int) -> str:
+        block = self._package_info.get(row)
+        if block is None:
+            s = self._row(row)
+            block = f"""
+        <PACKAGE_INFO>
+        <package_name>{s['Name']}</package_name>
+        <package_url>{s['URL']}</package_url>
+        <package_information>{self._information(s)}</package_information>
+        {self._price_fields(s)}
+        {self._detail_fields(s)}
+        <location_information> Address : {s['location']}</location_information>
+        </PACKAGE_INFO>
+        """
+            self._package_info[row] = block
+        return block
+
+    def package_info_by_url(self, package_url: str) -> Optional[str]:
+        # first row wins, like knowledge_base[knowledge_base['URL'] == url].iloc[0]
+        row = self.catalog.row_for_url(package_url)
+        return self.package_info(row) if row is not None else None
+
+
+_current: Optional[PackageContextRenderer] = None
+_lock = threading.Lock()
+
+
+def get_context_renderer(knowledge_base, index_list=None) -> PackageContextRenderer:
+    """Shared renderer for the current knowledge base; rebuilt when the data objects change"""
+    global _current
+    renderer = _current
+    if _is_current(renderer, knowledge_base, index_list):
+        return renderer
+    with _lock:
+        renderer = _current
+        if not _is_current(renderer, knowledge_base, index_list):
+            renderer = PackageContextRenderer(knowledge_base, index_list)
+            _current = renderer
+    return renderer
@@ -0,0 +1,59 @@
+"""
+Query-embedding cache keyed by (model, normalized text).
+
+Agent loops and repeat users send the same search_keyword many times a day,
+so embeddings are kept in a bounded TTL/LRU memory tier and, when
+EMBEDDING_CACHE_PATH is set, in a SQLite tier that survives restarts
+and is shared between workers.
+"""
+from typing import Callable, List, Optional
+import logging
+import os
+
+import numpy as np
+
+from shared.utils.cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '4096'))
+EMBEDDING_CACHE_TTL = float(os.getenv('EMBEDDING_CACHE_TTL', str(7 * 24 * 3600)))
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH')  # e.g. /tmp/hdmall_cache/embeddings.sqlite
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different queries share an entry"""
+    return ' '.join(text.split())
+
+
+class EmbeddingCache:
+    def __init__(self,
+                 maxsize: int = EMBEDDING_CACHE_SIZE,
+                 ttl: Optional[float] = EMBEDDING_CACHE_TTL,
+                 sqlite_path: Optional[str] = EMBEDDING_CACHE_PATH):
+        try:
+            self._cache = TieredCache(maxsize=maxsize, ttl=ttl, sqlite_path=sqlite_path, table='embeddings')
+        except Exception as e:
+            # Never let a broken disk tier take retrieval down
+            logger.warning(f"Embedding cache disk tier unavailable ({sqlite_path}): {e}")
+            self._cache = TieredCache(maxsize=maxsize, ttl=ttl)
+
+    def get_or_embed(self, model: str, text: str, embed: Callable[[str], List[float]]) -> np.ndarray:
+        """
+        Return the cached embedding for (model, text) or call embed(normalized_text)
+        and store the result as a float32 vector.
+        """
+        normalized = normalize_text(text)
+        key = f"{model}\x1f{normalized}"
+        vector = self._cache.get(key)
+        if vector is None:
+            vector = np.asarray(embed(normalized), dtype=np.float32)
+            self._cache.set(key, vector)
+        return vector
+
+    def stats(self):
+        return self._cache.stats()
+
+
+# Process-wide instance shared by every SemanticRetriever
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,164 @@
+"""
+Character-trigram fuzzy lookup over catalogue text columns.
+
+smart_search_suggestions used to run difflib.get_close_matches against every
+unique Brand / Category / Name / location value and then count matches with
+full-DataFrame .str.contains scans. Each column's unique values are now
+indexed once by character trigram, with their row counts. A lookup ranks
+candidates by shared trigrams (numpy bincount over posting lists) and only
+re-scores the best few with difflib's ratio.
+
+Thai has no spaces between words, so trigrams run over the whole string.
+Tone marks and other above/below-line signs are dropped from the trigram
+keys (they are the most common typo and would otherwise break every
+overlapping gram); the final re-score uses the full text.
+"""
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from .catalog_store import get_catalog
+
+SUGGESTION_COLUMNS = ['Brand', 'Category', 'Name', 'location']
+CANDIDATES_PER_RESULT = 10
+MIN_CANDIDATES = 50
+
+# Thai maitaikhu, tone marks, thanthakhat, nikhahit, yamakkan; zero-width characters
+_THAI_MARKS = re.compile('[\u0e47-\u0e4e\u200b-\u200d\ufeff]')
+
+
+def normalize_text(value) -> str:
+    if not isinstance(value, str):
+        return ''
+    return ' '.join(unicodedata.normalize('NFC', value).casefold().split())
+
+
+def trigrams(text: str) -> set:
+    """Trigrams of normalized text (space padded so short strings still produce grams)"""
+    key = _THAI_MARKS.sub('', text)
+    if not key:
+        return set()
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self, values):
+        counts = Counter(v for v in values if isinstance(v, str) and v.strip())
+        self.values: List[str] = list(counts)
+        self.counts = np.fromiter((counts[v] for v in self.values), dtype=np.int64, count=len(self.values))
+        self.normalized: List[str] = [normalize_text(v) for v in self.values]
+        self.total_rows = int(self.counts.sum())
+
+        postings: Dict[str, List[int]] = {}
+        self.gram_counts = np.zeros(len(self.values), dtype=np.int64)
+        for value_id, text in enumerate(self.normalized):
+            grams = trigrams(text)
+            self.gram_counts[value_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(value_id)
+        self.postings: Dict[str, np.ndarray] = {g: np.asarray(ids, dtype=np.int64) for g, ids in postings.items()}
+        self._by_value = {v: i for i, v in enumerate(self.values)}
+        self._most_common = np.argsort(-self.counts, kind='stable')
+
+    def __len__(self):
+        return len(self.values)
+
+    def count(self, value: str) -> int:
+        """Rows whose value equals value exactly"""
+        value_id = self._by_value.get(value)
+        return int(self.counts[value_id]) if value_id is not None else 0
+
+    def most_common(self, n: int) -> List[Tuple[str, int]]:
+        return [(self.values[i], int(self.counts[i])) for i in self._most_common[:n]]
+
+    def _shared_grams(self, grams) -> np.ndarray:
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        if not lists:
+            return np.zeros(len(self.values), dtype=np.int64)
+        return np.bincount(np.concatenate(lists), minlength=len(self.values))
+
+    def close_matches(self, term: str, n: int = 5, cutoff: float = 0.3) -> List[str]:
+        """difflib.get_close_matches equivalent: best n values with ratio >= cutoff"""
+        query = normalize_text(term)
+        grams = trigrams(query)
+        if not query or not grams or not self.values:
+            return []
+        shared = self._shared_grams(grams)
+        candidates = np.flatnonzero(shared)
+        if not len(candidates):
+            return []
+        # Jaccard over trigram sets picks the handful worth an exact re-score
+        jaccard = shared[candidates] / (len(grams) + self.gram_counts[candidates] - shared[candidates])
+        keep = max(MIN_CANDIDATES, n * CANDIDATES_PER_RESULT)
+        if len(candidates) > keep:
+            candidates = candidates[np.argpartition(-jaccard, keep - 1)[:keep]]
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for value_id in candidates:
+            matcher.set_seq1(self.normalized[value_id])
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff:
+                    scored.append((score, -int(value_id)))
+        scored.sort(reverse=True)
+        return [self.values[-neg_id] for _, neg_id in scored[:n]]
+
+    def contains_count(self, term: str) -> int:
+        """Rows whose value contains term (case-insensitive), like .str.contains(term, case=False).sum()"""
+        query = normalize_text(term)
+        if not query:
+            return 0
+        # every value containing the term contains all of its inner (unpadded) trigrams
+        inner = {g for g in trigrams(query) if not g.startswith(' ') and not g.endswith(' ')}
+        if inner:
+            candidates = np.flatnonzero(self._shared_grams(inner) == len(inner))
+        else:
+            candidates = range(len(self.values))
+        return int(sum(self.counts[i] for i in candidates if query in self.normalized[i]))
+
+
+class FuzzyCatalogIndex:
+    """TrigramIndex per suggestion column, plus the first catalogue row of every Name"""
+
+    def __init__(self, knowledge_base):
+        self.knowledge_base = knowledge_base
+        catalog = get_catalog(knowledge_base)
+        self.columns: Dict[str, TrigramIndex] = {
+            col: TrigramIndex(catalog.columns[col]) for col in SUGGESTION_COLUMNS if col in catalog.columns
+        }
+        self.first_row: Dict[str, int] = {}
+        for row, name in enumerate(catalog.columns.get('Name', ())):
+            if isinstance(name, str):
+                self.first_row.setdefault(name, row)
+
+    def __getitem__(self, column: str) -> TrigramIndex:
+        return self.columns[column]
+
+    def stats(self):
+        return {col: len(index) for col, index in self.columns.items()}
+
+
+_current: Optional[FuzzyCatalogIndex] = None
+_lock = threading.Lock()
+
+
+def get_fuzzy_index(knowledge_base) -> FuzzyCatalogIndex:
+    """Shared index for the current knowledge base; rebuilt when the DataFrame object changes"""
+    global _current
+    index = _current
+    if index is not None and index.knowledge_base is knowledge_base:
+        return index
+    with _lock:
+        index = _current
+        if index is None or index.knowledge_base is not knowledge_base:
+            index = FuzzyCatalogIndex(knowledge_base)
+            _current = index
+    return index
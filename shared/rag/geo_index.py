@@ -0,0 +1,94 @@
+"""
+Vectorized radius search over branch coordinates.
+
+Branch coordinates come from the BranchTable's contiguous lat/lng arrays and
+are bucketed on a regular lat/lng grid at load time. A radius query only
+computes haversine distances for rows in the grid cells that overlap the
+query's bounding box.
+"""
+from typing import Dict, Tuple
+import math
+
+import numpy as np
+
+from .branch_table import as_branch_table
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * math.pi / 180  # same sphere as haversine_km
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance in km from (lat, lng) to arrays of points"""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeoIndex:
+    def __init__(self, index_list, cell_deg: float = 0.05):
+        """
+        Args:
+            index_list: BranchTable, or a sequence of branch records with a 'coor' (lat, lng) entry
+            cell_deg: grid cell size in degrees (~5.5 km at the equator)
+        """
+        coords = np.asarray(as_branch_table(index_list).coords, dtype=np.float64).reshape(-1, 2)
+        self.lat = np.ascontiguousarray(coords[:, 0])
+        self.lng = np.ascontiguousarray(coords[:, 1])
+        self.size = len(self.lat)
+        self.cell_deg = cell_deg
+
+        # Rows without usable coordinates are never filtered out (legacy behaviour)
+        self.invalid = ~(np.isfinite(self.lat) & np.isfinite(self.lng))
+        self.invalid_rows = np.flatnonzero(self.invalid)
+
+        valid_rows = np.flatnonzero(~self.invalid)
+        self.valid_rows = valid_rows
+        cell_i = np.floor(self.lat[valid_rows] / cell_deg).astype(np.int64)
+        cell_j = np.floor(self.lng[valid_rows] / cell_deg).astype(np.int64)
+        order = np.lexsort((cell_j, cell_i))
+        cell_i, cell_j, sorted_rows = cell_i[order], cell_j[order], valid_rows[order]
+
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        if len(sorted_rows):
+            boundaries = np.flatnonzero((np.diff(cell_i) != 0) | (np.diff(cell_j) != 0)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(sorted_rows)]))
+            for start, end in zip(starts, ends):
+                self.cells[(int(cell_i[start]), int(cell_j[start]))] = sorted_rows[start:end]
+
+    def _candidate_rows(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        # Longitude span widens towards the pole, so size it at the box's poleward edge
+        far_lat = min(abs(lat) + dlat, 90.0)
+        cos_far = math.cos(math.radians(far_lat))
+        dlng = 180.0 if cos_far < 1e-6 else min(radius_km / (KM_PER_DEGREE_LAT * cos_far), 180.0)
+        # One cell of padding absorbs floating-point error at cell boundaries
+        i0, i1 = math.floor((lat - dlat) / self.cell_deg) - 1, math.floor((lat + dlat) / self.cell_deg) + 1
+        j0, j1 = math.floor((lng - dlng) / self.cell_deg) - 1, math.floor((lng + dlng) / self.cell_deg) + 1
+
+        # Very large radii: scanning every valid row is cheaper than walking cells
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            return self.valid_rows
+        chunks = [self.cells[(i, j)] for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) if (i, j) in self.cells]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+    def radius_query(self, lat: float, lng: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            mask: int array, 1 for rows within radius_km (and rows with unknown coordinates)
+            distances: km from (lat, lng) for every row; inf outside the searched cells, nan when unknown
+        """
+        distances = np.full(self.size, np.inf)
+        distances[self.invalid_rows] = np.nan
+        rows = self._candidate_rows(lat, lng, radius_km)
+        if len(rows):
+            distances[rows] = haversine_km(lat, lng, self.lat[rows], self.lng[rows])
+        mask = (distances <= radius_km) | self.invalid
+        return mask.astype(np.int64), distances
+
+    def distances_from(self, lat: float, lng: float) -> np.ndarray:
+        """Distance in km from (lat, lng) to every row (nan when unknown)"""
+        return haversine_km(lat, lng, self.lat, self.lng)
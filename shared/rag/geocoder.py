@@ -0,0 +1,160 @@
+"""
+Process-wide Google geocoding service.
+
+Area names repeat constantly in chats ("สยาม", "อโศก", ...), so results are kept
+in a bounded TTL/LRU memory tier and, when GEOCODE_CACHE_PATH is set, in a
+SQLite tier shared by workers and restarts. "No location found" is cached too,
+with a shorter TTL. Concurrent lookups of the same area share one HTTP request.
+Async clients are per event loop and closed with their loop (LoopClients).
+"""
+from typing import Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+
+from shared.utils.cache import TieredCache
+from shared.utils.loop_clients import LoopClients
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GEOCODE_API = os.getenv('GEOCODE_API')
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+GEOCODE_TIMEOUT = float(os.getenv('GEOCODE_TIMEOUT', '10'))
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', '2048'))
+GEOCODE_CACHE_TTL = float(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = float(os.getenv('GEOCODE_NEGATIVE_TTL', str(24 * 3600)))
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH')  # e.g. /tmp/hdmall_cache/geocode.sqlite
+
+NOT_FOUND: Tuple[None, None] = (None, None)
+
+
+def normalize_area(area: str) -> str:
+    return ' '.join(area.split()).lower()
+
+
+class GeocodingService:
+    def __init__(self,
+                 api_key: Optional[str] = GEOCODE_API,
+                 timeout: float = GEOCODE_TIMEOUT,
+                 maxsize: int = GEOCODE_CACHE_SIZE,
+                 ttl: float = GEOCODE_CACHE_TTL,
+                 negative_ttl: float = GEOCODE_NEGATIVE_TTL,
+                 sqlite_path: Optional[str] = GEOCODE_CACHE_PATH):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        try:
+            self.cache = TieredCache(maxsize=maxsize, ttl=ttl, sqlite_path=sqlite_path, table='geocode')
+        except Exception as e:
+            logger.warning(f"Geocode cache disk tier unavailable ({sqlite_path}): {e}")
+            self.cache = TieredCache(maxsize=maxsize, ttl=ttl)
+        self._client: Optional[httpx.Client] = None
+        self._async_clients = LoopClients(lambda: httpx.AsyncClient(timeout=self.timeout))
+        # loop -> {area key: in-flight task}
+        self._inflight = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(timeout=self.timeout)
+        return self._client
+
+    def close(self):
+        """Close the sync client (async clients close with their event loop)"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def _params(self, area: str, api_key: Optional[str]):
+        return {"address": area, "key": api_key or self.api_key}
+
+    @staticmethod
+    def _parse(data):
+        """(lat, lng), NOT_FOUND, or None for errors that should not be cached (quota, denied key)"""
+        status = data.get("status")
+        if status == "OK":
+            results = data.get("results", [])
+            if results:
+                location = results[0]["geometry"]["location"]
+                return location["lat"], location["lng"]
+        if status in ("OK", "ZERO_RESULTS"):
+            print("No location found for that address")
+            return NOT_FOUND
+        logger.warning(f"⚠️ [GEOCODE] status {status}: {data.get('error_message', '')}")
+        return None
+
+    def _store(self, key: str, result):
+        if result is None:
+            return NOT_FOUND
+        if result == NOT_FOUND:
+            self.cache.set(key, result, ttl=self.negative_ttl)
+        else:
+            self.cache.set(key, result)
+        return result
+
+    async def _fetch(self, key: str, area: str, api_key: Optional[str]):
+        try:
+            self.requests += 1
+            client = await self._async_clients.get()
+            response = await client.get(GEOCODE_URL, params=self._params(area, api_key))
+            result = self._parse(response.json())
+        except Exception as e:
+            # Transport errors are not cached; the next request retries
+            logger.error(f"❌ [GEOCODE-ERROR] {type(e).__name__}: {str(e)}")
+            return NOT_FOUND
+        return self._store(key, result)
+
+    async def geocode(self, area: str, api_key: Optional[str] = None) -> Tuple[Optional[float], Optional[float]]:
+        """(lat, lng) for an area name, or (None, None) when it cannot be located"""
+        if not area:
+            return NOT_FOUND
+        key = normalize_area(area)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        task = inflight.get(key)
+        if task is None:
+            task = loop.create_task(self._fetch(key, area, api_key))
+            inflight[key] = task
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def geocode_sync(self, area: str, api_key: Optional[str] = None) -> Tuple[Optional[float], Optional[float]]:
+        """Blocking variant for synchronous callers; shares the same cache"""
+        if not area:
+            return NOT_FOUND
+        key = normalize_area(area)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+        try:
+            self.requests += 1
+            response = self.client.get(GEOCODE_URL, params=self._params(area, api_key))
+            result = self._parse(response.json())
+        except Exception as e:
+            logger.error(f"❌ [GEOCODE-ERROR] {type(e).__name__}: {str(e)}")
+            return NOT_FOUND
+        return self._store(key, result)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['requests'] = self.requests
+        return stats
+
+
+# Process-wide instance shared by every RAG
+geocoding_service = GeocodingService()
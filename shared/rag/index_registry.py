@@ -0,0 +1,122 @@
+"""
+Process-wide registry of retrieval indexes.
+
+BM25 and semantic indexes are expensive to build, so they are constructed
+once in the app lifespan hook and borrowed by every RAG instance
+(JibAI, DrJib, GPTBot, AdsAgent, web agent) instead of being rebuilt per request.
+"""
+import logging
+import threading
+import time
+
+from .bm25_searcher import BM25Retriever
+from .semantic_searcher import SemanticRetriever, create_embedding_clients
+from .reranker import RerankerService
+from .geo_index import GeoIndex
+from .category_index import CategoryIndex, load_hl_mapping
+from .context_renderer import get_context_renderer
+from .catalog_db import get_catalog_db
+from .catalog_store import get_catalog
+from .catalog_filter import CatalogFilter
+from .fuzzy_index import get_fuzzy_index
+from .thai_tokenizer import thai_tokenizer, domain_words
+from .branch_table import as_branch_table
+
+logger = logging.getLogger(__name__)
+
+# (attribute name on registry, attribute name on global_storage)
+LEXICAL_SOURCES = [
+    ('lexical', 'doc_json'),
+    ('lexical_plus', 'doc_json_plus'),
+    ('lexical_hl', 'hl_docs'),
+    ('lexical_brand', 'brand_docs'),
+    ('lexical_cat', 'cat_docs'),
+    ('lexical_tag', 'tag_docs'),
+]
+
+SEMANTIC_SOURCES = [
+    ('semantic', 'embed_matrix'),
+    ('semantic_plus', 'embed_matrix_plus'),
+    ('semantic_hl', 'hl_embed'),
+    ('semantic_brand', 'brand_embed'),
+    ('semantic_cat', 'cat_embed'),
+    ('semantic_tag', 'tag_embed'),
+]
+
+
+class RetrievalIndexes:
+    """
+    Immutable bundle of ready-to-query retrievers.
+    Retrievers whose source data is missing (e.g. partial local data) are None.
+    """
+    __slots__ = [name for name, _ in LEXICAL_SOURCES + SEMANTIC_SOURCES] + ['reranker', 'geo', 'categories', 'filters', '_frozen']
+
+    def __init__(self, global_storage):
+        start = time.time()
+        clients = create_embedding_clients()
+
+        for name, source in LEXICAL_SOURCES:
+            data = getattr(global_storage, source, None)
+            object.__setattr__(self, name, BM25Retriever(tokens_file=data) if data is not None else None)
+        # Query segmentation dictionary = Thai words + every indexed catalogue term
+        thai_tokenizer.set_vocabulary(domain_words(
+            getattr(self, name).bm25.vocab for name, _ in LEXICAL_SOURCES if getattr(self, name) is not None
+        ))
+
+        for name, source in SEMANTIC_SOURCES:
+            matrix = getattr(global_storage, source, None)
+            object.__setattr__(self, name, SemanticRetriever(matrix, clients=clients) if matrix is not None else None)
+
+        knowledge_base = getattr(global_storage, 'knowledge_base', None)
+        index_list = getattr(global_storage, 'index_list', None)
+        reranker = RerankerService(knowledge_base, index_list) if knowledge_base is not None and index_list is not None else None
+        object.__setattr__(self, 'reranker', reranker)
+        object.__setattr__(self, 'geo', GeoIndex(index_list) if index_list is not None else None)
+        object.__setattr__(self, 'categories', CategoryIndex(load_hl_mapping(), index_list, knowledge_base))
+        filters = CatalogFilter(get_catalog(knowledge_base, index_list), self.categories, self.geo) if knowledge_base is not None else None
+        object.__setattr__(self, 'filters', filters)
+
+        object.__setattr__(self, '_frozen', True)
+        logger.info(f"📚 [INDEX-REGISTRY] Built retrieval indexes in {time.time() - start:.2f}s")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RetrievalIndexes is immutable; rebuild it with build_retrieval_indexes()")
+
+    def __delattr__(self, name):
+        raise AttributeError("RetrievalIndexes is immutable")
+
+
+_build_lock = threading.Lock()
+
+
+def build_retrieval_indexes(global_storage) -> RetrievalIndexes:
+    """Build the registry and publish it on global_storage (called from lifespan)"""
+    # Branch lists hand-loaded as legacy dict arrays become typed tables before anything indexes them
+    for name in ('index_list', 'index_list_plus'):
+        if hasattr(global_storage, name):
+            setattr(global_storage, name, as_branch_table(getattr(global_storage, name)))
+    indexes = RetrievalIndexes(global_storage)
+    global_storage.retrieval_indexes = indexes
+    if getattr(global_storage, 'knowledge_base', None) is not None:
+        # Pull context columns out of the DataFrame before the first request
+        get_context_renderer(global_storage.knowledge_base, getattr(global_storage, 'index_list', None))
+        # Load the SQLite catalogue used by sql_search
+        get_catalog_db(global_storage.knowledge_base)
+        # Trigram index behind smart_search_suggestions
+        get_fuzzy_index(global_storage.knowledge_base)
+    return indexes
+
+
+def get_retrieval_indexes(global_storage) -> RetrievalIndexes:
+    """
+    Return the shared registry, building it once if lifespan did not
+    (e.g. scripts or load tests that populate global_storage by hand).
+    """
+    indexes = getattr(global_storage, 'retrieval_indexes', None)
+    if indexes is not None:
+        return indexes
+    with _build_lock:
+        indexes = getattr(global_storage, 'retrieval_indexes', None)
+        if indexes is None:
+            indexes = build_retrieval_indexes(global_storage)
+    return indexes
@@ -1,5 +1,7 @@
 #reciprocal rank fusion
+import numpy as np
 
+from .bm25_engine import top_k_indices
 
 
 def compute_rrf(rank_BM25, rank_semantics,mask,k=60, alpha=0.5):
@@ -9,6 +11,7 @@ def compute_rrf(rank_BM25, rank_semantics,mask,k=60, alpha=0.5):
     Args:
         rank_BM25 (dict): Dictionary of {original_index: rank} for BM25 rankings
         rank_semantics (dict): Dictionary of {original_index: rank} for semantic rankings
+        mask (array-like): mask[original_index] == 1 keeps the document
         k (int): Constant to prevent division by zero and smooth the impact of high rankings
 
     Returns:
@@ -18,15 +21,16 @@ def compute_rrf(rank_BM25, rank_semantics,mask,k=60, alpha=0.5):
     rrf_scores = {}
 
     # Get all unique document indices
-    all_docs = set(rank_BM25.keys()).union(set(rank_semantics.keys()))
+    all_docs = sorted(set(rank_BM25.keys()).union(set(rank_semantics.keys())))
 
-    #geo masking #TODO could add more masking
-    all_docs = [doc_id for i, doc_id in enumerate(all_docs) if mask[i] == 1]
+    #geo masking, aligned by document id
+    all_docs = [doc_id for doc_id in all_docs if mask[doc_id] == 1]
+
+    # Ranks default to max possible rank + 1 if document not in ranking
+    max_rank = max(len(rank_BM25), len(rank_semantics)) + 1
 
     # Compute RRF scores for each document
     for doc_id in all_docs:
-        # Get ranks (default to max possible rank + 1 if document not in ranking)
-        max_rank = max(len(rank_BM25), len(rank_semantics)) + 1
         rank1 = rank_BM25.get(doc_id, max_rank)
         rank2 = rank_semantics.get(doc_id, max_rank)
 
@@ -55,4 +59,56 @@ def get_top_k(rrf_scores, k=10):
         dict: Dictionary of top-k {original_index: score}
     """
     print("Rank fusion : Complete!")
-    return dict(list(rrf_scores.items())[:k])
\ No newline at end of file
+    return dict(list(rrf_scores.items())[:k])
+
+
+# Array-native fusion
+# Rank vectors are 1-based and indexed by document id, so masks line up by id.
+
+def ranks_from_dict(rank_dict, num_docs):
+    """Convert a {doc_id: rank} dict into a rank vector (missing docs rank last)"""
+    ranks = np.full(num_docs, num_docs + 1, dtype=np.int64)
+    if rank_dict:
+        ranks[np.fromiter(rank_dict.keys(), dtype=np.int64)] = np.fromiter(rank_dict.values(), dtype=np.int64)
+    return ranks
+
+
+def rrf_scores(rank_arrays, weights=None, k=60):
+    """
+    N-way weighted Reciprocal Rank Fusion.
+
+    Args:
+        rank_arrays (list[np.ndarray]): 1-based rank vectors of equal length
+        weights (list[float]): per-ranking weight, defaults to equal weights summing to 1
+        k (int): smoothing constant
+
+    Returns:
+        np.ndarray: fused score per document id
+    """
+    if weights is None:
+        weights = [1.0 / len(rank_arrays)] * len(rank_arrays)
+    fused = np.zeros(len(rank_arrays[0]), dtype=np.float64)
+    for ranks, weight in zip(rank_arrays, weights):
+        fused += weight / (k + np.asarray(ranks, dtype=np.float64))
+    return fused
+
+
+def masked_top_k(scores, mask=None, k=10):
+    """
+    Top-k document ids by score among documents where mask is truthy.
+
+    Returns:
+        (np.ndarray, np.ndarray): (doc ids, scores), best first
+    """
+    if mask is None:
+        top = top_k_indices(scores, k)
+        return top, scores[top]
+    candidates = np.flatnonzero(np.asarray(mask).astype(bool))
+    top = candidates[top_k_indices(scores[candidates], k)]
+    return top, scores[top]
+
+
+def rrf_top_k(rank_arrays, mask=None, top_k=10, weights=None, k=60):
+    """Fuse rankings and select the masked top-k in one call"""
+    print("Rank fusion : Complete!")
+    return masked_top_k(rrf_scores(rank_arrays, weights=weights, k=k), mask, top_k)
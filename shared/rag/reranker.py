@@ -1,63 +1,160 @@
 import cohere
+import httpx
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
 import pandas as pd
 import logging
+
+from shared.utils.cache import TTLLRUCache
+from shared.utils.loop_clients import LoopClients
+
 load_dotenv(override=True)  # Force reload .env file to pick up new API keys
 #CONSTANT
 
 COHERE_ENDPOINT = os.getenv('COHERE_ENDPOINT')
 COHERE_RERANK_API_KEY = os.getenv('COHERE_RERANK_API_KEY')
+RERANK_TIMEOUT = float(os.getenv('RERANK_TIMEOUT', '8'))
+RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE', '2048'))
+RERANK_CACHE_TTL = float(os.getenv('RERANK_CACHE_TTL', '3600'))
 
 logger = logging.getLogger(__name__)
 
-class Reranker:
-    def __init__(self,
-                 top_k_indexes,
-                 knowledge_base,
-                 index_list):
-        # Debug logging for Cohere configuration
+
+def build_rerank_documents(knowledge_base: pd.DataFrame):
+    """Cohere rerank document per knowledge_base row, in row order"""
+    columns = ['Name', 'Brand', 'Package Details', 'General Info']
+    name, brand, details, info = (knowledge_base[col].astype(str).tolist() for col in columns)
+    return [
+        {'Title': f"{n}{b} ", 'Content': f"{n}\n{b}\n{d}\n{i}"}
+        for n, b, d, i in zip(name, brand, details, info)
+    ]
+
+
+class RerankerService:
+    """
+    Long-lived Cohere reranker shared by every RAG instance.
+
+    - rerank text is rendered once per package instead of per call
+    - one sync client, and one async client per event loop (httpx pools are loop-bound), closed when its loop shuts down
+    - LRU/TTL cache keyed on (query, candidate ids, top_n)
+    - hard timeout; on failure the original candidate order is returned
+    """
+
+    def __init__(self, knowledge_base, index_list, timeout: float = RERANK_TIMEOUT):
         logger.info(f"🔧 [COHERE-CONFIG] Endpoint: {COHERE_ENDPOINT}")
-        logger.info(f"🔧 [COHERE-CONFIG] API Key: {COHERE_RERANK_API_KEY[:8]}...{COHERE_RERANK_API_KEY[-4:] if COHERE_RERANK_API_KEY else 'None'}")
-        logger.info(f"🔧 [COHERE-CONFIG] API Key Length: {len(COHERE_RERANK_API_KEY) if COHERE_RERANK_API_KEY else 0}")
-        
-        self.reranker = cohere.Client(
-            base_url = COHERE_ENDPOINT,
-            api_key = COHERE_RERANK_API_KEY
-        )
         self.index_list = index_list
-        self.knowledge_base = knowledge_base
-        self.top_k_indexes = top_k_indexes
-        true_indexes = [self.index_list[index]['index'] for index in self.top_k_indexes]
-        self.cohere_document = [{'Title' : f"""{self.knowledge_base.iloc[true_index]['Name']}{self.knowledge_base.iloc[true_index]['Brand']} """,
-        'Content' : f"""
-        {self.knowledge_base.iloc[true_index]['Name']}
-        {self.knowledge_base.iloc[true_index]['Brand']}
-        {self.knowledge_base.iloc[true_index]['Package Details']}
-        {self.knowledge_base.iloc[true_index]['General Info']}
+        self.timeout = timeout
+        self.documents = build_rerank_documents(knowledge_base)
+        self.cache = TTLLRUCache(maxsize=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL)
+        self._client = None
+        # (cohere client, its httpx pool) per loop; the pool is closed with the loop
+        self._async_clients = LoopClients(self._new_async_client, close=lambda pair: pair[1].aclose())
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> cohere.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = cohere.Client(base_url=COHERE_ENDPOINT, api_key=COHERE_RERANK_API_KEY, timeout=self.timeout)
+        return self._client
+
+    def _new_async_client(self):
+        http_client = httpx.AsyncClient(timeout=self.timeout)
+        client = cohere.AsyncClient(base_url=COHERE_ENDPOINT, api_key=COHERE_RERANK_API_KEY,
+                                    timeout=self.timeout, httpx_client=http_client)
+        return client, http_client
+
+    async def _async_client(self) -> cohere.AsyncClient:
+        client, _ = await self._async_clients.get()
+        return client
+
+    def _documents_for(self, candidate_ids):
+        return [self.documents[row] for row in self.index_list.package_indices(candidate_ids).tolist()]
+
+    @staticmethod
+    def _map_results(candidate_ids, response):
+        # results are ordered by relevance; .index points back into the request documents
+        return [candidate_ids[result.index] for result in response.results]
+
+    def _cache_key(self, query, candidate_ids, top_n):
+        return (query, tuple(candidate_ids), top_n)
+
+    def _log_failure(self, e):
+        logger.error(f"❌ [COHERE-ERROR] {type(e).__name__}: {str(e)}")
+        logger.info("Falling back to original search order without reranking")
+        print("Reranking : Failed! Using original order")
+
+    async def rerank(self, query: str, candidate_ids, top_n: int):
+        """Rerank local index_list ids, returning at most top_n ids best first"""
+        candidate_ids = [int(i) for i in candidate_ids]
+        if not candidate_ids or top_n <= 0:
+            return []
+        key = self._cache_key(query, candidate_ids, top_n)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)
+        try:
+            logger.info(f"🔄 [COHERE-REQUEST] Sending rerank request with {len(candidate_ids)} documents")
+            client = await self._async_client()
+            response = await asyncio.wait_for(
+                client.rerank(
+                    documents=self._documents_for(candidate_ids),
+                    query=query,
+                    rank_fields=["Content"],
+                    top_n=top_n,
+                ),
+                timeout=self.timeout,
+            )
+            ranked = self._map_results(candidate_ids, response)
+            self.cache.set(key, tuple(ranked))
+            print("Reranking : Complete!")
+            return ranked
+        except Exception as e:
+            self._log_failure(e)
+            return candidate_ids[:top_n]
+
+    async def rerank_views(self, query: str, views):
         """
-        } for true_index in true_indexes]
-        
-        
-    def forward(self, query: str, top_n: int):
+        Rerank several candidate views (e.g. geo/category-filtered and unfiltered)
+        with a single Cohere call over their union, then split locally.
+
+        Args:
+            views: list of (candidate_ids, top_n)
+
+        Returns:
+            list of reranked id lists, one per view
+        """
+        union = list(dict.fromkeys(int(i) for ids, _ in views for i in ids))
+        ranked = await self.rerank(query, union, len(union))
+        results = []
+        for ids, top_n in views:
+            members = set(int(i) for i in ids)
+            results.append([i for i in ranked if i in members][:max(top_n, 0)])
+        return results
+
+    def rerank_sync(self, query: str, candidate_ids, top_n: int):
+        """Blocking variant for synchronous callers"""
+        candidate_ids = [int(i) for i in candidate_ids]
+        if not candidate_ids or top_n <= 0:
+            return []
+        key = self._cache_key(query, candidate_ids, top_n)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)
         try:
-            logger.info(f"🔄 [COHERE-REQUEST] Sending rerank request with {len(self.cohere_document)} documents")
-            logger.info(f"🔄 [COHERE-REQUEST] Query: {query[:50]}..." if len(query) > 50 else f"🔄 [COHERE-REQUEST] Query: {query}")
-            
-            response = self.reranker.rerank(
-                documents=self.cohere_document,
+            response = self.client.rerank(
+                documents=self._documents_for(candidate_ids),
                 query=query,
                 rank_fields=["Content"],
                 top_n=top_n,
-                )
-            rerank_top_k_indexes = [self.top_k_indexes[i] for i in range(len(response.results))]
+            )
+            ranked = self._map_results(candidate_ids, response)
+            self.cache.set(key, tuple(ranked))
             print("Reranking : Complete!")
-            return rerank_top_k_indexes
+            return ranked
         except Exception as e:
-            logger.error(f"❌ [COHERE-ERROR] Full error details: {str(e)}")
-            logger.error(f"❌ [COHERE-ERROR] Error type: {type(e).__name__}")
-            logger.warning(f"Cohere reranking failed: {e}")
-            logger.info("Falling back to original search order without reranking")
-            print("Reranking : Failed! Using original order")
-            # Return original order, limited to top_n
-            return self.top_k_indexes[:top_n]
+            self._log_failure(e)
+            return candidate_ids[:top_n]
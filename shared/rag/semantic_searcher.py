@@ -5,6 +5,9 @@ from dotenv import load_dotenv
 import numpy as np
 import os
 
+from .bm25_engine import top_k_indices
+from .embedding_cache import embedding_cache
+
 #CONSTANT
 load_dotenv()
 AZURE_OPENAI_API_KEY = os.getenv('AZURE_OPENAI_API_KEY')
@@ -16,52 +19,136 @@ COHERE_API_KEY = os.getenv('COHERE_API_KEY_NEW')
 
 
 
+def create_embedding_clients():
+    """Build the (Azure OpenAI, Cohere) embedding clients used by SemanticRetriever"""
+    text_embedding = AzureOpenAI(
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version=AZURE_OPENAI_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT
+    )
+    embeddings_client = EmbeddingsClient(
+        endpoint=COHERE_ENDPOINT,
+        credential=AzureKeyCredential(COHERE_API_KEY)
+    )
+    return text_embedding, embeddings_client
+
+
+def normalize_rows(matrix):
+    """
+    Contiguous float32 matrix with L2-normalized rows (zero rows stay zero).
+    Already-normalized float32 input (e.g. a memory-mapped snapshot) is returned
+    as-is so its pages stay shared instead of being copied per worker.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    nonzero = norms[norms > 0]
+    if np.allclose(nonzero, 1.0, atol=1e-4):
+        return matrix
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+class SemanticResult:
+    """
+    Scores of one query against every document. Top-k is selected with
+    argpartition; the full ranking is only materialized when fusion asks for it.
+    """
+    __slots__ = ('scores', 'k', '_top_ids', '_ranks')
+
+    def __init__(self, scores, k=10):
+        self.scores = scores
+        self.k = k
+        self._top_ids = None
+        self._ranks = None
+
+    @property
+    def top_ids(self):
+        if self._top_ids is None:
+            self._top_ids = top_k_indices(self.scores, self.k)
+        return self._top_ids
+
+    @property
+    def top_scores(self):
+        return self.scores[self.top_ids]
+
+    @property
+    def ranks(self):
+        """1-based rank of every document, indexed by document id"""
+        if self._ranks is None:
+            order = np.argsort(-self.scores, kind='stable')
+            ranks = np.empty(len(order), dtype=np.int64)
+            ranks[order] = np.arange(1, len(order) + 1)
+            self._ranks = ranks
+        return self._ranks
+
+    def rank_dict(self):
+        return dict(enumerate(self.ranks.tolist()))
+
+
 class SemanticRetriever:
-    def __init__(self, embedding_matrix):
-        self.emb_matrix = embedding_matrix
-        self.text_embedding = AzureOpenAI(
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_OPENAI_VERSION,
-            azure_endpoint=AZURE_OPENAI_ENDPOINT
-        )
-        self.embeddings_client = EmbeddingsClient(
-            endpoint=COHERE_ENDPOINT,
-            credential=AzureKeyCredential(COHERE_API_KEY)
-        )
+    def __init__(self, embedding_matrix, clients=None, cache=None):
+        """
+        Args:
+            embedding_matrix: (num_docs, dim) document embeddings
+            clients: optional (text_embedding, embeddings_client) pair to share
+                     one set of HTTP clients between retrievers
+            cache: query-embedding cache, defaults to the process-wide one
+        """
+        # Unit-norm float32 rows: one sgemv per query gives cosine scores
+        self.emb_matrix = normalize_rows(embedding_matrix)
+        if clients is None:
+            clients = create_embedding_clients()
+        self.text_embedding, self.embeddings_client = clients
+        self.cache = cache if cache is not None else embedding_cache
         
     def get_embedding(self, text, model='text-embedding-3-large'):
-        text = text.replace("\n"," ")
-        embedding_vector = self.text_embedding.embeddings.create(
-            input=[text],
-            model=model
-            ).data[0].embedding
-        
-        return embedding_vector
+        def embed(normalized_text):
+            return self.text_embedding.embeddings.create(
+                input=[normalized_text],
+                model=model
+                ).data[0].embedding
+
+        return self.cache.get_or_embed(model, text, embed)
+
+    def get_embedding_cohere(self, text, model="embed-v-4-0"):
+        def embed(normalized_text):
+            response = self.embeddings_client.embed(
+                model=model,
+                input=[normalized_text]
+            )
+            return response['data'][0]['embedding']
+
+        return self.cache.get_or_embed(model, text, embed)
+
+    def score(self, query_embedding):
+        """Cosine score of every document against a query embedding"""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+        return self.emb_matrix @ q
+
+    def search(self, query, k=10):
+        """Azure text-embedding-3-large search returning a SemanticResult"""
+        return SemanticResult(self.score(self.get_embedding(query)), k)
+
+    def search_cohere(self, query, k=10):
+        """Cohere embed-v-4-0 search returning a SemanticResult"""
+        return SemanticResult(self.score(self.get_embedding_cohere(query)), k)
+
+    def rank_array(self, query):
+        return self.search(query).ranks
+
+    def rank_array_cohere(self, query):
+        return self.search_cohere(query).ranks
     
     def forward(self, query):
-        #embedding and dot product 
-        query_embedding = self.get_embedding(query)
-        semantic_score = np.dot(self.emb_matrix, query_embedding)
-        
         #get {indices : rank} dict
-        score_dict = {doc_index: score for doc_index, score in enumerate(semantic_score)}
-        rank_dict_semantic = {index: rank+1 for rank, (index, score) in enumerate(sorted(score_dict.items(), key=lambda x: x[1], reverse=True))}
-        rank_dict_semantic = dict(sorted(rank_dict_semantic.items()))
+        rank_dict_semantic = self.search(query).rank_dict()
         print('Semantic search : Complete!')
         return rank_dict_semantic
     
     def forward_cohere(self, query):
-        response = self.embeddings_client.embed(
-            model="embed-v-4-0",
-            input=[query]
-        )
-        q_embedding = response['data'][0]['embedding']
-        semantic_score = np.dot(self.emb_matrix, q_embedding)
-        score_dict = {doc_index: score for doc_index, score in enumerate(semantic_score)}
-        rank_dict_semantic = {index: rank+1 for rank, (index, score) in enumerate(sorted(score_dict.items(), key=lambda x: x[1], reverse=True))}
-        rank_dict_semantic = dict(sorted(rank_dict_semantic.items()))
+        rank_dict_semantic = self.search_cohere(query).rank_dict()
         print('Semantic search : Complete!')
         return rank_dict_semantic
-        
-        
-    
\ No newline at end of file
@@ -0,0 +1,347 @@
+"""
+Versioned, memory-mappable snapshot of the retrieval corpus.
+
+The startup artifacts (package.csv, doc_tokens_*.json, pickled index_list*.npy,
+embedding .npy files) are parsed into private heap memory by every worker.
+A snapshot is the same corpus converted offline into one directory of raw
+.npy arrays plus a manifest:
+
+    <root>/CURRENT                     -> name of the live version
+    <root>/<version>/manifest.json     format, version, per-artifact layout, file sizes / sha256
+    <root>/<version>/<artifact>/...    arrays
+
+    matrix    embeddings, stored as unit-norm float32 rows (SemanticRetriever uses them as-is)
+    array     any other numeric array
+    tokens    token corpora as ids: vocab string table + CSR (indptr, ids) + document indices,
+              plus prebuilt BM25 statistics (IDF, document lengths, term-major postings, weights)
+    branches  index_list as a BranchTable (int32 package index, float64 lat/lng, interned URLs, string tables)
+    table     knowledge_base as typed columns (numeric arrays, string tables for text)
+    json      small documents copied verbatim
+
+Arrays are opened with np.load(mmap_mode='r'): nothing is parsed, pages are
+shared by every worker through the OS page cache and only touched pages are
+read. That sharing covers matrices, arrays, token corpora and the branch
+table. A `table` is rebuilt as a pandas DataFrame on load, because
+sql_search, the explore helpers and rerank rendering still read
+knowledge_base as one. Its numeric columns stay memory-mapped, but text
+columns are decoded into Python strings in every worker. The snapshot only
+saves the CSV parsing there, not the memory.
+
+Build one with
+
+    python -m shared.rag.snapshot build --source shared/rag/data --out /data/snapshots
+"""
+from typing import Dict, Iterable, List, Optional
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .bm25_engine import SparseBM25, token_id_postings
+from .branch_table import BranchTable
+from .string_table import StringTable
+from .semantic_searcher import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 2
+# BM25Retriever defaults the prebuilt weights are computed for
+BM25_K1 = 1.5
+BM25_B = 0.75
+MANIFEST = 'manifest.json'
+CURRENT = 'CURRENT'
+
+
+class TokenCorpus:
+    """
+    Tokenized documents as ids: tokens of document d are
+    vocab[ids[indptr[d]:indptr[d + 1]]]; indices are the documents' original ids.
+    bm25 holds the prebuilt SparseBM25 statistics when the snapshot has them.
+    """
+
+    def __init__(self, vocab: StringTable, indptr: np.ndarray, ids: np.ndarray, indices: np.ndarray,
+                 bm25: Optional[Dict] = None):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.ids = ids
+        self.indices = indices
+        self.bm25 = bm25
+
+    @classmethod
+    def from_docs(cls, docs: Dict) -> "TokenCorpus":
+        """From the doc_tokens JSON layout {"indices": [...], "tokens": [[...], ...]}"""
+        vocab: Dict[str, int] = {}
+        ids: List[int] = []
+        indptr = np.zeros(len(docs['tokens']) + 1, dtype=np.int64)
+        for doc_id, tokens in enumerate(docs['tokens']):
+            ids.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+            indptr[doc_id + 1] = len(ids)
+        return cls(StringTable.from_values(vocab), indptr,
+                   np.asarray(ids, dtype=np.int32), np.asarray(docs['indices'], dtype=np.int64))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+
+# ---- files ----
+
+def _file_record(path: str) -> Dict:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(4 * 1024 * 1024), b''):
+            digest.update(chunk)
+    return {'bytes': os.path.getsize(path), 'sha256': digest.hexdigest()}
+
+
+class _Writer:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files: Dict[str, Dict] = {}
+
+    def _path(self, name: str) -> str:
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _record(self, name: str, path: str):
+        self.files[name] = _file_record(path)
+
+    def array(self, name: str, array: np.ndarray) -> str:
+        path = self._path(name)
+        np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+        self._record(name, path)
+        return name
+
+    def json(self, name: str, value) -> str:
+        path = self._path(name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        self._record(name, path)
+        return name
+
+
+class _Reader:
+    def __init__(self, directory: str, files: Dict[str, Dict]):
+        self.directory = directory
+        self.files = files
+
+    def _path(self, name: str) -> str:
+        path = os.path.join(self.directory, name)
+        expected = self.files[name]['bytes']
+        if os.path.getsize(path) != expected:
+            raise ValueError(f"Snapshot file {name} is truncated ({os.path.getsize(path)} of {expected} bytes)")
+        return path
+
+    def array(self, name: str) -> np.ndarray:
+        return np.load(self._path(name), mmap_mode='r', allow_pickle=False)
+
+    def json(self, name: str):
+        with open(self._path(name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+# ---- artifact kinds ----
+
+def _write_matrix(writer: _Writer, name: str, matrix) -> Dict:
+    return {'kind': 'matrix', 'normalized': True, 'file': writer.array(f"{name}/matrix.npy", normalize_rows(matrix))}
+
+
+def _write_tokens(writer: _Writer, name: str, docs) -> Dict:
+    corpus = TokenCorpus.from_docs(docs)
+    # Prebuilt BM25 statistics over the same vocab ids, weights for the retriever's default k1 / b
+    stats = token_id_postings(corpus.indptr, corpus.ids, len(corpus.vocab))
+    weights = SparseBM25.posting_weights(stats['idf'], stats['doc_len'], stats['indptr'], stats['indices'],
+                                         stats['term_freqs'], k1=BM25_K1, b=BM25_B)
+    bm25 = {key: writer.array(f"{name}/bm25_{key}.npy", array) for key, array in stats.items()}
+    bm25.update(weights=writer.array(f"{name}/bm25_weights.npy", weights), k1=BM25_K1, b=BM25_B)
+    return {
+        'kind': 'tokens',
+        'vocab': corpus.vocab.save(writer, f"{name}/vocab"),
+        'indptr': writer.array(f"{name}/indptr.npy", corpus.indptr),
+        'ids': writer.array(f"{name}/ids.npy", corpus.ids),
+        'indices': writer.array(f"{name}/indices.npy", corpus.indices),
+        'bm25': bm25,
+    }
+
+
+def _write_branches(writer: _Writer, name: str, branches) -> Dict:
+    table = branches if isinstance(branches, BranchTable) else BranchTable.from_records(branches)
+    return {'kind': 'branches', **table.save(writer, name)}
+
+
+def _write_table(writer: _Writer, name: str, frame: pd.DataFrame) -> Dict:
+    columns = []
+    for position, column in enumerate(frame.columns):
+        series = frame[column]
+        spec = {'name': str(column)}
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            spec['array'] = writer.array(f"{name}/col_{position:03d}.npy", series.to_numpy())
+        else:
+            spec['strings'] = StringTable.from_values(series.tolist()).save(writer, f"{name}/col_{position:03d}")
+        columns.append(spec)
+    return {'kind': 'table', 'rows': len(frame), 'columns': columns}
+
+
+def _artifact_kind(value) -> str:
+    if isinstance(value, pd.DataFrame):
+        return 'table'
+    if isinstance(value, dict) and 'tokens' in value and 'indices' in value:
+        return 'tokens'
+    if isinstance(value, BranchTable) or (isinstance(value, np.ndarray) and value.dtype == object):
+        return 'branches'
+    if isinstance(value, np.ndarray) and value.ndim == 2 and np.issubdtype(value.dtype, np.floating):
+        return 'matrix'
+    if isinstance(value, np.ndarray):
+        return 'array'
+    return 'json'
+
+
+_WRITERS = {
+    'matrix': _write_matrix,
+    'array': lambda writer, name, value: {'kind': 'array', 'file': writer.array(f"{name}/array.npy", value)},
+    'tokens': _write_tokens,
+    'branches': _write_branches,
+    'table': _write_table,
+    'json': lambda writer, name, value: {'kind': 'json', 'file': writer.json(f"{name}.json", value)},
+}
+
+
+def _read_artifact(reader: _Reader, spec: Dict):
+    kind = spec['kind']
+    if kind in ('matrix', 'array'):
+        return reader.array(spec['file'])
+    if kind == 'tokens':
+        bm25 = None
+        if 'bm25' in spec:
+            bm25 = {key: reader.array(value) if isinstance(value, str) else value for key, value in spec['bm25'].items()}
+        return TokenCorpus(StringTable.load(reader, spec['vocab']), reader.array(spec['indptr']),
+                           reader.array(spec['ids']), reader.array(spec['indices']), bm25=bm25)
+    if kind == 'branches':
+        return BranchTable.load(reader, spec)
+    if kind == 'table':
+        data = {}
+        for column in spec['columns']:
+            if 'array' in column:
+                data[column['name']] = reader.array(column['array'])
+            else:
+                # Decoded into private heap memory (see module docstring);
+                # missing text cells are NaN, as read_csv leaves them
+                values = StringTable.load(reader, column['strings']).to_list()
+                data[column['name']] = pd.Series([np.nan if v is None else v for v in values], dtype=object)
+        return pd.DataFrame(data, columns=[c['name'] for c in spec['columns']])
+    if kind == 'json':
+        return reader.json(spec['file'])
+    raise ValueError(f"Unknown snapshot artifact kind: {kind}")
+
+
+# ---- public ----
+
+def write_snapshot(artifacts: Dict[str, object], root: str, version: Optional[str] = None) -> str:
+    """
+    Write artifacts ({global_storage attribute: value}) as a new snapshot version
+    under root and point CURRENT at it. Returns the version directory.
+    """
+    version = version or datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    final_dir = os.path.join(root, version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Snapshot version already exists: {final_dir}")
+    build_dir = final_dir + '.building'
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+    writer = _Writer(build_dir)
+    layout = {}
+    for name, value in artifacts.items():
+        if value is None:
+            continue
+        layout[name] = _WRITERS[_artifact_kind(value)](writer, name, value)
+        logger.info(f"💾 [SNAPSHOT] Wrote {name} ({layout[name]['kind']})")
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'artifacts': layout,
+        'files': writer.files,
+    }
+    with open(os.path.join(build_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(build_dir, final_dir)
+
+    current_tmp = os.path.join(root, CURRENT + '.tmp')
+    with open(current_tmp, 'w') as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(root, CURRENT))
+    return final_dir
+
+
+def snapshot_directory(root: str, version: Optional[str] = None) -> str:
+    """Directory of version (CURRENT when None)"""
+    if version is None:
+        with open(os.path.join(root, CURRENT), 'r') as f:
+            version = f.read().strip()
+    return os.path.join(root, version)
+
+
+def read_manifest(directory: str) -> Dict:
+    with open(os.path.join(directory, MANIFEST), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')} (expected {SNAPSHOT_FORMAT})")
+    return manifest
+
+
+def load_artifact(directory: str, manifest: Dict, name: str):
+    """One artifact of a snapshot; arrays are read-only memory maps"""
+    return _read_artifact(_Reader(directory, manifest['files']), manifest['artifacts'][name])
+
+
+def artifact_bytes(manifest: Dict, name: str) -> int:
+    prefix = name + '/'
+    return sum(f['bytes'] for path, f in manifest['files'].items() if path.startswith(prefix) or path == name + '.json')
+
+
+def verify_snapshot(directory: str) -> List[str]:
+    """Files whose size or sha256 differ from the manifest (empty when the snapshot is intact)"""
+    manifest = read_manifest(directory)
+    bad = []
+    for name, expected in manifest['files'].items():
+        try:
+            if _file_record(os.path.join(directory, name)) != expected:
+                bad.append(name)
+        except OSError:
+            bad.append(name)
+    return bad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or verify a retrieval corpus snapshot")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="convert the artifacts in a data directory into a snapshot")
+    build.add_argument('--source', default='shared/rag/data')
+    build.add_argument('--out', required=True)
+    build.add_argument('--version')
+    verify = commands.add_parser('verify', help="check a snapshot's files against its manifest")
+    verify.add_argument('root')
+    verify.add_argument('--version')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'build':
+        import asyncio
+        from shared.utils.artifact_loader import ArtifactLoader
+        artifacts = asyncio.run(ArtifactLoader().load_from_directory(args.source))
+        print(write_snapshot(artifacts, args.out, args.version))
+    else:
+        bad = verify_snapshot(snapshot_directory(args.root, args.version))
+        print("OK" if not bad else "Corrupt files:\n" + "\n".join(bad))
+        raise SystemExit(1 if bad else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Packed UTF-8 string column: one byte buffer plus int64 offsets.
+
+Used by the retrieval snapshot (vocabularies, text columns) and the branch
+table, so text can be stored as raw arrays and memory-mapped instead of
+pickled lists of Python strings.
+"""
+from typing import Dict, Iterable, List, Optional
+import math
+
+import numpy as np
+
+
+def is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class StringTable:
+    """Strings packed into one UTF-8 buffer with int64 byte offsets; missing values are None"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, valid: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self.valid = valid
+
+    @classmethod
+    def from_values(cls, values: Iterable) -> "StringTable":
+        chunks: List[bytes] = []
+        valid: List[bool] = []
+        for value in values:
+            missing = is_missing(value)
+            valid.append(not missing)
+            chunks.append(b'' if missing else str(value).encode('utf-8'))
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in chunks], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(chunks), dtype=np.uint8), offsets, np.asarray(valid, dtype=bool))
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if not self.valid[i]:
+            return None
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def to_list(self) -> List[Optional[str]]:
+        buffer = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [buffer[offsets[i]:offsets[i + 1]].decode('utf-8') if ok else None
+                for i, ok in enumerate(self.valid.tolist())]
+
+    def save(self, writer, prefix: str) -> Dict:
+        """Write the three arrays through a snapshot writer; returns their file names"""
+        return {
+            'data': writer.array(f"{prefix}.data.npy", self.data),
+            'offsets': writer.array(f"{prefix}.offsets.npy", self.offsets),
+            'valid': writer.array(f"{prefix}.valid.npy", self.valid),
+        }
+
+    @classmethod
+    def load(cls, reader, spec: Dict) -> "StringTable":
+        """Memory-map the arrays named by spec through a snapshot reader"""
+        return cls(reader.array(spec['data']), reader.array(spec['offsets']), reader.array(spec['valid']))
@@ -0,0 +1,88 @@
+"""
+Memoized Thai query tokenization for the lexical indexes.
+
+Every BM25Retriever used to run pythainlp newmm on the raw query, so one
+request segmented the same text up to seven times (one per lexical index).
+Queries are now segmented once per normalized text and kept in a bounded LRU.
+
+newmm runs against a dictionary trie built from pythainlp's Thai words plus
+the vocabulary of the BM25 corpora themselves (brand, category and
+procedure names as they were indexed), so domain terms segment into tokens
+the indexes actually contain instead of being split into unknown pieces.
+"""
+from typing import Iterable, Optional, Tuple
+import logging
+import os
+import re
+import threading
+import time
+
+from pythainlp.corpus import thai_words
+from pythainlp.tokenize import word_tokenize
+from pythainlp.util import dict_trie
+
+from shared.utils.cache import TTLLRUCache
+
+logger = logging.getLogger(__name__)
+
+THAI_TOKEN_CACHE_SIZE = int(os.getenv('THAI_TOKEN_CACHE_SIZE', '8192'))
+THAI_TOKENIZER_ENGINE = os.getenv('THAI_TOKENIZER_ENGINE', 'newmm')
+
+_THAI_CHARS = re.compile('[\u0e00-\u0e7f]')
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so trivially different queries share an entry"""
+    return ' '.join(query.split())
+
+
+def domain_words(corpora: Iterable) -> set:
+    """Thai tokens (2+ characters, no whitespace) from BM25 corpus vocabularies"""
+    words = set()
+    for vocab in corpora:
+        for token in vocab:
+            if isinstance(token, str) and len(token) > 1 and _THAI_CHARS.search(token) and not any(c.isspace() for c in token):
+                words.add(token)
+    return words
+
+
+class ThaiTokenizer:
+    def __init__(self, maxsize: int = THAI_TOKEN_CACHE_SIZE, engine: str = THAI_TOKENIZER_ENGINE):
+        self.engine = engine
+        self._cache = TTLLRUCache(maxsize=maxsize)
+        self._trie = None
+        self._lock = threading.Lock()
+        self.domain_words = 0
+
+    def set_vocabulary(self, words: Iterable[str]):
+        """Rebuild the custom dictionary trie from pythainlp's words plus words"""
+        start = time.time()
+        extra = set(words)
+        trie = dict_trie(dict_source=set(thai_words()) | extra)
+        with self._lock:
+            self._trie = trie
+            self.domain_words = len(extra)
+            # Segmentations made with the previous dictionary are stale
+            self._cache.clear()
+        logger.info(f"🔡 [TOKENIZER] Dictionary trie with {len(extra)} catalogue words built in {time.time() - start:.2f}s")
+
+    def tokenize(self, query: str) -> Tuple[str, ...]:
+        """Non-blank tokens of query, segmented once per normalized text"""
+        query = normalize_query(query)
+        if not query:
+            return ()
+        tokens = self._cache.get(query)
+        if tokens is None:
+            tokens = tuple(
+                token for token in word_tokenize(query, custom_dict=self._trie, engine=self.engine)
+                if token.strip()
+            )
+            self._cache.set(query, tokens)
+        return tokens
+
+    def stats(self):
+        return {**self._cache.stats(), 'domain_words': self.domain_words}
+
+
+# Process-wide tokenizer shared by every BM25Retriever
+thai_tokenizer = ThaiTokenizer()
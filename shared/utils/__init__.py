@@ -1,3 +1,8 @@
 # Shared utilities
 from .utils import *
-from .prompt_generator import * 
\ No newline at end of file
+from .prompt_generator import * 
+from .cache import TTLLRUCache, SQLiteCache, TieredCache
+from .loop_clients import LoopClients
+from .image_cache import ImageCache, CachedImage, image_cache
+from .image_description import ImageDescriptionService, image_description_service
+from .artifact_loader import ArtifactLoader, artifact_loader
@@ -0,0 +1,271 @@
+"""
+Startup loader for the retrieval artifacts (catalogue CSV, token JSONs, embedding matrices).
+
+lifespan used to download the blobs one at a time with the sync
+BlobServiceClient and parse each one from an in-memory readall() before the
+app could serve. Blobs are now fetched concurrently with the async client
+into a local cache directory; a cached file is reused on restart when its
+ETag, size and MD5 (the blob's Content-MD5, or the digest recorded when it
+was downloaded) still match, so only changed artifacts are downloaded. The
+MD5 is only recomputed when the file's mtime or inode differ from the ones
+recorded after it was last verified. Parsing runs in worker threads
+straight from the cached file.
+
+When RETRIEVAL_SNAPSHOT_DIR is set, artifacts are memory-mapped from a
+prebuilt snapshot instead (shared/rag/snapshot.py).
+
+Per-artifact source, bytes and download / parse times are kept for /health.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from azure.core import MatchConditions
+from azure.storage.blob.aio import BlobServiceClient
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_CACHE_DIR = os.getenv('ARTIFACT_CACHE_DIR', '/tmp/hdmall_cache/artifacts')
+ARTIFACT_LOAD_CONCURRENCY = int(os.getenv('ARTIFACT_LOAD_CONCURRENCY', '8'))
+ARTIFACT_DOWNLOAD_CONCURRENCY = int(os.getenv('ARTIFACT_DOWNLOAD_CONCURRENCY', '4'))  # parallel ranges per blob
+LOCAL_DATA_DIR = os.getenv('LOCAL_DATA_DIR', 'shared/rag/data')
+RETRIEVAL_SNAPSHOT_DIR = os.getenv('RETRIEVAL_SNAPSHOT_DIR')  # e.g. /data/snapshots (holds CURRENT)
+
+# (global_storage attribute, blob / file name)
+ARTIFACTS: List[Tuple[str, str]] = [
+    ('knowledge_base', 'package.csv'),
+    ('embed_matrix', 'embed_matrix_19112024.npy'),
+    ('doc_json', 'doc_tokens_19112024.json'),
+    ('index_list', 'index_list.npy'),
+    ('embed_matrix_plus', 'emb_matrix_plus.npy'),
+    ('doc_json_plus', 'doc_tokens_19112024_plus.json'),
+    ('index_list_plus', 'index_list_plus.npy'),
+    ('web_recommendation_json', 'web_recommendation.json'),
+    ('hl_embed', 'hl_emb.npy'),
+    ('hl_docs', 'hl_docs.json'),
+    ('brand_embed', 'brand_emb.npy'),
+    ('brand_docs', 'brand_docs.json'),
+    ('cat_embed', 'cat_emb.npy'),
+    ('cat_docs', 'cat_docs.json'),
+    ('tag_embed', 'tag_emb.npy'),
+    ('tag_docs', 'tag_docs.json'),
+]
+
+_CHUNK = 4 * 1024 * 1024
+
+
+def parse_artifact(path: str, name: str):
+    """Parse a .json / .npy / .csv artifact from disk"""
+    if name.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if name.endswith('.npy'):
+        if name.startswith('index'):
+            # Legacy pickled branch dicts -> typed BranchTable (snapshots skip the pickle entirely)
+            from shared.rag.branch_table import BranchTable
+            return BranchTable.from_records(np.load(path, allow_pickle=True))
+        # the image database holds Python objects
+        return np.load(path, allow_pickle=name == 'image_database.npy')
+    if name.endswith('.csv'):
+        return pd.read_csv(path)
+    raise ValueError(f"Unsupported file type: {name}")
+
+
+def file_md5(path: str) -> bytes:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class ArtifactLoader:
+    def __init__(self,
+                 cache_dir: str = ARTIFACT_CACHE_DIR,
+                 concurrency: int = ARTIFACT_LOAD_CONCURRENCY,
+                 artifacts: Sequence[Tuple[str, str]] = ARTIFACTS):
+        self.cache_dir = cache_dir
+        self.concurrency = concurrency
+        self.artifacts = list(artifacts)
+        self._stats: Dict[str, Dict] = {}
+        self.total_seconds = 0.0
+
+    # ---- cache ----
+
+    def _paths(self, name: str) -> Tuple[str, str]:
+        path = os.path.join(self.cache_dir, name)
+        return path, path + '.meta.json'
+
+    @staticmethod
+    def _file_identity(path: str) -> Dict[str, int]:
+        stat = os.stat(path)
+        return {'mtime_ns': stat.st_mtime_ns, 'inode': stat.st_ino}
+
+    def _cached(self, name: str, properties) -> Optional[str]:
+        """Cached file for name when it still matches the blob's ETag, size and MD5"""
+        path, meta_path = self._paths(name)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('etag') != properties.etag or os.path.getsize(path) != properties.size:
+                return None
+            # Untouched since it was verified: skip rehashing (seconds on the embedding matrices)
+            identity = self._file_identity(path)
+        except (OSError, ValueError):
+            return None
+        if all(meta.get(key) == value for key, value in identity.items()):
+            return path
+        expected = properties.content_settings.content_md5 if properties.content_settings else None
+        md5 = file_md5(path)
+        # Without a Content-MD5 on the blob, check against the digest recorded at download time
+        matches = md5 == bytes(expected) if expected else base64.b64encode(md5).decode('ascii') == meta.get('md5')
+        if not matches:
+            logger.warning(f"⚠️ [ARTIFACTS] Cached {name} fails its MD5 check, downloading again")
+            return None
+        self._write_meta(name, properties, md5)
+        return path
+
+    def _write_meta(self, name: str, properties, md5: bytes):
+        path, meta_path = self._paths(name)
+        # Workers cold-starting together each write their own tmp file
+        tmp_path = f"{meta_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'etag': properties.etag,
+                    'size': properties.size,
+                    'md5': base64.b64encode(md5).decode('ascii'),
+                    'last_modified': properties.last_modified.isoformat() if properties.last_modified else None,
+                    **self._file_identity(path),
+                }, f)
+            os.replace(tmp_path, meta_path)
+        except OSError as e:
+            # Another worker replaced the file first; its metadata describes the same blob
+            logger.warning(f"⚠️ [ARTIFACTS] Could not record metadata for {name}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # ---- fetch ----
+
+    async def _download(self, container_client, name: str, properties) -> str:
+        path, _ = self._paths(name)
+        tmp_path = f"{path}.{os.getpid()}.part"
+        try:
+            downloader = await container_client.get_blob_client(name).download_blob(
+                max_concurrency=ARTIFACT_DOWNLOAD_CONCURRENCY, etag=properties.etag, match_condition=MatchConditions.IfNotModified
+            )
+            with open(tmp_path, 'wb') as f:
+                await downloader.readinto(f)
+            md5 = await asyncio.to_thread(file_md5, tmp_path)
+            expected = properties.content_settings.content_md5 if properties.content_settings else None
+            if expected and md5 != bytes(expected):
+                raise IOError(f"MD5 mismatch for {name}")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._write_meta(name, properties, md5)
+        return path
+
+    async def _load_blob(self, container_client, semaphore, attribute: str, name: str):
+        async with semaphore:
+            start = time.perf_counter()
+            properties = await container_client.get_blob_client(name).get_blob_properties()
+            path = await asyncio.to_thread(self._cached, name, properties)
+            source = 'cache'
+            if path is None:
+                path = await self._download(container_client, name, properties)
+                source = 'download'
+            fetched = time.perf_counter()
+        value = await asyncio.to_thread(parse_artifact, path, name)
+        self._record(attribute, name, source, properties.size, fetched - start, time.perf_counter() - fetched)
+        return value
+
+    async def _load_file(self, directory: str, attribute: str, name: str):
+        start = time.perf_counter()
+        path = os.path.join(directory, name)
+        value = await asyncio.to_thread(parse_artifact, path, name)
+        self._record(attribute, name, 'local', os.path.getsize(path), 0.0, time.perf_counter() - start)
+        return value
+
+    def _record(self, attribute, name, source, size, fetch_s, parse_s):
+        self._stats[attribute] = {
+            'file': name,
+            'source': source,
+            'bytes': int(size),
+            'fetch_s': round(fetch_s, 3),
+            'parse_s': round(parse_s, 3),
+        }
+        logger.info(f"📦 [ARTIFACTS] {name}: {source}, {size / 1e6:.1f} MB, fetch {fetch_s:.2f}s, parse {parse_s:.2f}s")
+
+    # ---- public ----
+
+    async def load_from_azure(self, connection_string: str, container_name: str) -> Dict[str, object]:
+        """{attribute: parsed artifact} for every artifact, fetched concurrently through the disk cache"""
+        start = time.perf_counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with BlobServiceClient.from_connection_string(connection_string) as service_client:
+            container_client = service_client.get_container_client(container_name)
+            values = await asyncio.gather(*(
+                self._load_blob(container_client, semaphore, attribute, name) for attribute, name in self.artifacts
+            ))
+        return self._finish(values, start)
+
+    async def load_from_directory(self, directory: str = LOCAL_DATA_DIR) -> Dict[str, object]:
+        """{attribute: parsed artifact} for every artifact in a local data directory"""
+        start = time.perf_counter()
+        values = await asyncio.gather(*(
+            self._load_file(directory, attribute, name) for attribute, name in self.artifacts
+        ))
+        return self._finish(values, start)
+
+    async def load_from_snapshot(self, root: str, version: Optional[str] = None) -> Dict[str, object]:
+        """
+        {attribute: artifact} from a memory-mapped snapshot (see shared.rag.snapshot);
+        arrays are read-only views of the snapshot files, nothing is parsed.
+        """
+        from shared.rag.snapshot import snapshot_directory, read_manifest, load_artifact, artifact_bytes
+
+        start = time.perf_counter()
+        directory = snapshot_directory(root, version)
+        manifest = read_manifest(directory)
+        names = [attribute for attribute, _ in self.artifacts if attribute in manifest['artifacts']]
+
+        async def load(attribute):
+            began = time.perf_counter()
+            value = await asyncio.to_thread(load_artifact, directory, manifest, attribute)
+            self._record(attribute, f"{manifest['version']}/{attribute}", 'snapshot',
+                         artifact_bytes(manifest, attribute), 0.0, time.perf_counter() - began)
+            return value
+
+        values = await asyncio.gather(*(load(attribute) for attribute in names))
+        self.total_seconds = time.perf_counter() - start
+        logger.info(f"📦 [ARTIFACTS] Mapped snapshot {manifest['version']} ({len(values)} artifacts) in {self.total_seconds:.2f}s")
+        return dict(zip(names, values))
+
+    def _finish(self, values, start) -> Dict[str, object]:
+        self.total_seconds = time.perf_counter() - start
+        downloaded = sum(1 for s in self._stats.values() if s['source'] == 'download')
+        logger.info(f"📦 [ARTIFACTS] Loaded {len(values)} artifacts in {self.total_seconds:.2f}s ({downloaded} downloaded)")
+        return {attribute: value for (attribute, _), value in zip(self.artifacts, values)}
+
+    def stats(self):
+        return {
+            'total_s': round(self.total_seconds, 3),
+            'bytes': sum(s['bytes'] for s in self._stats.values()),
+            'artifacts': dict(self._stats),
+        }
+
+
+# Process-wide loader used by lifespan
+artifact_loader = ArtifactLoader()
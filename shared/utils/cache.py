@@ -0,0 +1,187 @@
+"""
+Small in-process and on-disk caches shared by the RAG services.
+
+TTLLRUCache   - bounded, thread-safe LRU with per-entry TTL and hit/miss counters
+SQLiteCache   - persistent key/blob tier that survives restarts and is shared by workers
+TieredCache   - memory tier in front of an optional SQLite tier
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLLRUCache:
+    """LRU cache bounded by entry count, entries expire after ttl seconds (None = never)"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = _MISSING):
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+class SQLiteCache:
+    """
+    Persistent key -> pickled value store with expiry. WAL mode lets several
+    gunicorn workers read and write the same file.
+    """
+
+    def __init__(self, path: str, table: str = 'cache', ttl: Optional[float] = None):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, default=None):
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache read failed ({self.path}): {e}")
+            return default
+        if row is None:
+            return default
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return default
+        return pickle.loads(value)
+
+    def set(self, key: str, value, ttl: Optional[float] = _MISSING):
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        try:
+            with self._lock:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite cache write failed ({self.path}): {e}")
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """Memory tier backed by an optional SQLite tier; disk hits are promoted to memory"""
+
+    def __init__(self,
+                 maxsize: int = 1024,
+                 ttl: Optional[float] = None,
+                 sqlite_path: Optional[str] = None,
+                 table: str = 'cache'):
+        self.memory = TTLLRUCache(maxsize=maxsize, ttl=ttl)
+        self.disk = SQLiteCache(sqlite_path, table=table, ttl=ttl) if sqlite_path else None
+        self.disk_hits = 0
+
+    @staticmethod
+    def _disk_key(key) -> str:
+        return key if isinstance(key, str) else repr(key)
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(self._disk_key(key), _MISSING)
+            if value is not _MISSING:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value, ttl: Optional[float] = _MISSING):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(self._disk_key(key), value, ttl)
+
+    def get_or_compute(self, key, compute: Callable[[], Any]):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats['disk_hits'] = self.disk_hits
+        stats['persistent'] = self.disk is not None
+        return stats
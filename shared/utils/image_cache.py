@@ -0,0 +1,296 @@
+"""
+Shared image fetch + base64 cache.
+
+Campaign artwork and infographics are requested over and over by every bot.
+Images are cached by URL and deduplicated by content hash (SHA-256), kept as
+ready-to-send base64 payloads under a byte budget with LRU eviction. Entries
+older than IMAGE_CACHE_FRESH_TTL are revalidated with ETag / Last-Modified
+conditional requests instead of being downloaded again.
+
+Bodies are streamed and a download is abandoned as soon as it passes the
+caller's max_bytes (capped by IMAGE_CACHE_MAX_IMAGE_BYTES), so oversized
+images are never buffered whole.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+
+import httpx
+
+from .loop_clients import LoopClients
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_BYTES = int(os.getenv('IMAGE_CACHE_BYTES', str(256 * 1024 * 1024)))
+IMAGE_CACHE_FRESH_TTL = float(os.getenv('IMAGE_CACHE_FRESH_TTL', '600'))
+IMAGE_CACHE_MAX_IMAGE_BYTES = int(os.getenv('IMAGE_CACHE_MAX_IMAGE_BYTES', str(20 * 1024 * 1024)))
+IMAGE_PREFETCH_CONCURRENCY = int(os.getenv('IMAGE_PREFETCH_CONCURRENCY', '8'))
+IMAGE_FETCH_TIMEOUT = float(os.getenv('IMAGE_FETCH_TIMEOUT', '30'))
+
+
+class ImageFetchError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status  # HTTP status when the server answered, None for transport errors
+
+
+class ImageTooLarge(ImageFetchError):
+    pass
+
+
+class CachedImage:
+    __slots__ = ('digest', 'data', 'media_type', 'size', 'etag', 'last_modified', 'checked_at')
+
+    def __init__(self, digest, data, media_type, size, etag=None, last_modified=None):
+        self.digest = digest
+        self.data = data              # base64 payload
+        self.media_type = media_type  # e.g. image/png, without parameters
+        self.size = size              # raw byte count
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked_at = time.monotonic()
+
+    @property
+    def is_image(self) -> bool:
+        return self.media_type.startswith('image/')
+
+    def content_block(self, media_type: Optional[str] = None) -> Dict:
+        """Anthropic-style base64 image block"""
+        return {"type": "image", "source": {"type": "base64", "media_type": media_type or self.media_type, "data": self.data}}
+
+
+class ImageCache:
+    def __init__(self,
+                 max_bytes: int = IMAGE_CACHE_BYTES,
+                 fresh_ttl: float = IMAGE_CACHE_FRESH_TTL,
+                 max_image_bytes: int = IMAGE_CACHE_MAX_IMAGE_BYTES,
+                 timeout: float = IMAGE_FETCH_TIMEOUT):
+        self.max_bytes = max_bytes
+        self.fresh_ttl = fresh_ttl
+        self.max_image_bytes = max_image_bytes
+        self.timeout = timeout
+        self._by_url: Dict[str, str] = {}                          # url -> digest
+        self._urls: Dict[str, Set[str]] = {}                       # digest -> urls, dropped on eviction
+        self._by_digest: "OrderedDict[str, CachedImage]" = OrderedDict()  # LRU over payloads
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_clients = LoopClients(lambda: httpx.AsyncClient(timeout=self.timeout, follow_redirects=True))
+        self._inflight = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.revalidated = 0
+        self.downloads = 0
+        self.failures = 0
+
+    # ---- clients ----
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(timeout=self.timeout, follow_redirects=True)
+        return self._client
+
+    def close(self):
+        """Close the sync client (async clients close with their event loop)"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    # ---- storage ----
+
+    def _lookup(self, url: str) -> Optional[CachedImage]:
+        with self._lock:
+            digest = self._by_url.get(url)
+            entry = self._by_digest.get(digest) if digest else None
+            if entry is None:
+                self._by_url.pop(url, None)
+                return None
+            self._by_digest.move_to_end(digest)
+            return entry
+
+    def _store(self, url: str, content: bytes, headers) -> CachedImage:
+        digest = hashlib.sha256(content).hexdigest()
+        media_type = headers.get('content-type', 'application/octet-stream').split(';')[0].strip().lower()
+        with self._lock:
+            entry = self._by_digest.get(digest)
+            if entry is None:
+                entry = CachedImage(digest, base64.b64encode(content).decode('utf-8'), media_type, len(content))
+                self._by_digest[digest] = entry
+                self._bytes += len(entry.data)
+            entry.etag = headers.get('etag') or entry.etag
+            entry.last_modified = headers.get('last-modified') or entry.last_modified
+            entry.checked_at = time.monotonic()
+            previous = self._by_url.get(url)
+            if previous is not None and previous != digest:
+                self._urls.get(previous, set()).discard(url)
+            self._by_url[url] = digest
+            self._urls.setdefault(digest, set()).add(url)
+            self._by_digest.move_to_end(digest)
+            while self._bytes > self.max_bytes and len(self._by_digest) > 1:
+                evicted_digest, evicted = self._by_digest.popitem(last=False)
+                self._bytes -= len(evicted.data)
+                for evicted_url in self._urls.pop(evicted_digest, ()):
+                    self._by_url.pop(evicted_url, None)
+        return entry
+
+    def _is_fresh(self, entry: CachedImage) -> bool:
+        return time.monotonic() - entry.checked_at < self.fresh_ttl
+
+    @staticmethod
+    def _conditional_headers(entry: Optional[CachedImage]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def _limit(self, max_bytes: Optional[int]) -> int:
+        return self.max_image_bytes if max_bytes is None else min(max_bytes, self.max_image_bytes)
+
+    @staticmethod
+    def _check_size(headers, limit: int):
+        length = headers.get('content-length')
+        if length and int(length) > limit:
+            raise ImageTooLarge(f"{int(length) / (1024 * 1024):.2f}MB (limit: {limit / (1024 * 1024):.0f}MB)")
+
+    @staticmethod
+    def _append(content: bytearray, chunk: bytes, limit: int):
+        content += chunk
+        if len(content) > limit:
+            raise ImageTooLarge(f"over {limit / (1024 * 1024):.0f}MB")
+
+    def _finish(self, url: str, entry: Optional[CachedImage], status: int, content: bytes, headers) -> CachedImage:
+        if status == 304 and entry is not None:
+            entry.checked_at = time.monotonic()
+            self.revalidated += 1
+            return entry
+        if status != 200:
+            raise ImageFetchError(f"HTTP {status}", status=status)
+        self.downloads += 1
+        return self._store(url, content, headers)
+
+    # ---- fetch ----
+
+    def _accept(self, entry: Optional[CachedImage], max_bytes: Optional[int]) -> Optional[CachedImage]:
+        if entry is not None and max_bytes is not None and entry.size > max_bytes:
+            logger.warning(f"❌ [IMAGE-SIZE] Image too large: {entry.size / (1024 * 1024):.2f}MB (limit: {max_bytes / (1024 * 1024):.0f}MB)")
+            return None
+        return entry
+
+    def _failed(self, url: str, e: Exception):
+        self.failures += 1
+        if isinstance(e, ImageTooLarge):
+            logger.warning(f"❌ [IMAGE-SIZE] Image too large: {e} ({url[:100]})")
+        else:
+            logger.error(f"❌ [IMAGE-CACHE] Failed to fetch {url[:100]}: {type(e).__name__}: {e}")
+
+    async def _fetch(self, url: str, entry: Optional[CachedImage], limit: int) -> CachedImage:
+        try:
+            client = await self._async_clients.get()
+            async with client.stream('GET', url, headers=self._conditional_headers(entry)) as response:
+                content = bytearray()
+                if response.status_code == 200:
+                    self._check_size(response.headers, limit)
+                    async for chunk in response.aiter_bytes():
+                        self._append(content, chunk, limit)
+                return self._finish(url, entry, response.status_code, bytes(content), response.headers)
+        except ImageFetchError as e:
+            self._failed(url, e)
+            raise
+        except Exception as e:
+            self._failed(url, e)
+            raise ImageFetchError(f"{type(e).__name__}: {e}") from e
+
+    @staticmethod
+    def _settled(task: asyncio.Task):
+        # failures are logged in _fetch; waiters that were cancelled never read them
+        if not task.cancelled():
+            task.exception()
+
+    async def get(self, url: str, max_bytes: Optional[int] = None, raise_errors: bool = False) -> Optional[CachedImage]:
+        """
+        Cached image for url (downloading or revalidating as needed).
+        On failure returns None, or raises ImageFetchError (with the HTTP status
+        when the server answered) when raise_errors is set.
+        """
+        entry = self._lookup(url)
+        if entry is not None and self._is_fresh(entry):
+            self.hits += 1
+            return self._accept(entry, max_bytes)
+
+        # Concurrent requests for the same URL and size limit share one download
+        limit = self._limit(max_bytes)
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        key = (url, limit)
+        task = inflight.get(key)
+        if task is None:
+            task = loop.create_task(self._fetch(url, entry, limit))
+            inflight[key] = task
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+            task.add_done_callback(self._settled)
+        try:
+            return self._accept(await asyncio.shield(task), max_bytes)
+        except ImageFetchError:
+            if raise_errors:
+                raise
+            return None
+
+    def get_sync(self, url: str, max_bytes: Optional[int] = None) -> Optional[CachedImage]:
+        """Blocking variant for synchronous callers"""
+        entry = self._lookup(url)
+        if entry is not None and self._is_fresh(entry):
+            self.hits += 1
+            return self._accept(entry, max_bytes)
+        limit = self._limit(max_bytes)
+        try:
+            with self.client.stream('GET', url, headers=self._conditional_headers(entry)) as response:
+                content = bytearray()
+                if response.status_code == 200:
+                    self._check_size(response.headers, limit)
+                    for chunk in response.iter_bytes():
+                        self._append(content, chunk, limit)
+                return self._accept(self._finish(url, entry, response.status_code, bytes(content), response.headers), max_bytes)
+        except Exception as e:
+            self._failed(url, e)
+            return None
+
+    async def prefetch(self, urls: Iterable[str], concurrency: int = IMAGE_PREFETCH_CONCURRENCY,
+                       max_bytes: Optional[int] = None) -> List[Optional[CachedImage]]:
+        """Fetch many images concurrently (bounded), results in input order"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _one(url):
+            async with semaphore:
+                return await self.get(url, max_bytes=max_bytes)
+
+        return await asyncio.gather(*(_one(url) for url in urls))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'images': len(self._by_digest),
+                'urls': len(self._by_url),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'downloads': self.downloads,
+                'failures': self.failures,
+            }
+
+
+# Process-wide instance shared by RAG and every bot
+image_cache = ImageCache()
@@ -0,0 +1,100 @@
+"""
+Shared image-understanding service.
+
+Conversation history is resent every turn, so the same images used to be
+downloaded and described again on each request. Descriptions are cached by
+image content hash (plus a namespace such as the model used), all images of
+a turn are described concurrently under IMAGE_DESCRIBE_CONCURRENCY, and URLs
+the server reports gone (403/404/410, i.e. expired signed links) are
+negatively cached. Timeouts, 5xx and other transient failures are not.
+"""
+from typing import Awaitable, Callable, Optional
+import asyncio
+import logging
+import os
+import weakref
+
+from .cache import TTLLRUCache
+from .image_cache import CachedImage, ImageCache, ImageFetchError, image_cache
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DESCRIBE_CONCURRENCY = int(os.getenv('IMAGE_DESCRIBE_CONCURRENCY', '4'))
+IMAGE_DESCRIPTION_CACHE_SIZE = int(os.getenv('IMAGE_DESCRIPTION_CACHE_SIZE', '4096'))
+IMAGE_DESCRIPTION_CACHE_TTL = float(os.getenv('IMAGE_DESCRIPTION_CACHE_TTL', str(7 * 24 * 3600)))
+IMAGE_FETCH_NEGATIVE_TTL = float(os.getenv('IMAGE_FETCH_NEGATIVE_TTL', '3600'))
+GONE_STATUSES = {403, 404, 410}
+
+Describer = Callable[[CachedImage], Awaitable[Optional[str]]]
+
+
+class ImageDescriptionService:
+    def __init__(self,
+                 images: ImageCache = image_cache,
+                 concurrency: int = IMAGE_DESCRIBE_CONCURRENCY,
+                 maxsize: int = IMAGE_DESCRIPTION_CACHE_SIZE,
+                 ttl: float = IMAGE_DESCRIPTION_CACHE_TTL,
+                 negative_ttl: float = IMAGE_FETCH_NEGATIVE_TTL):
+        self.images = images
+        self.concurrency = concurrency
+        self.descriptions = TTLLRUCache(maxsize=maxsize, ttl=ttl)
+        self.unreachable = TTLLRUCache(maxsize=maxsize, ttl=negative_ttl)
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._inflight = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def _describe_uncached(self, key, image: CachedImage, describe: Describer) -> Optional[str]:
+        async with self._semaphore():
+            text = await describe(image)
+        if text is not None:
+            self.descriptions.set(key, text)
+        return text
+
+    async def describe(self, url: str, describe: Describer, namespace: str = '') -> Optional[str]:
+        """
+        Description of the image at url produced by describe(image), or None when
+        the image cannot be fetched. Model errors propagate and are not cached.
+        """
+        if self.unreachable.get(url):
+            return None
+        try:
+            image = await self.images.get(url, raise_errors=True)
+        except ImageFetchError as e:
+            if e.status in GONE_STATUSES:
+                self.unreachable.set(url, True)
+            return None
+        if image is None:
+            return None
+
+        key = (namespace, image.digest)
+        text = self.descriptions.get(key)
+        if text is not None:
+            return text
+
+        # The same image appearing twice in a turn is described once
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        task = inflight.get(key)
+        if task is None:
+            task = loop.create_task(self._describe_uncached(key, image, describe))
+            inflight[key] = task
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            'descriptions': self.descriptions.stats(),
+            'unreachable_urls': len(self.unreachable),
+            'concurrency': self.concurrency,
+        }
+
+
+# Process-wide instance shared by every bot
+image_description_service = ImageDescriptionService()
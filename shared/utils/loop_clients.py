@@ -0,0 +1,67 @@
+"""
+Per-event-loop async clients that are closed with their loop.
+
+httpx connection pools are bound to the loop that created them, so services
+keep one async client per loop. LoopClients pairs each client with a
+suspended async generator; the loop's shutdown_asyncgens() (asyncio.run and
+uvicorn call it before closing the loop) finalizes the generator, which
+closes the client instead of leaking its pool.
+
+The generator's finalizer references its loop, so entries are kept in a
+plain dict: they are removed when the client is closed, and entries of
+loops that were closed without shutdown_asyncgens() are dropped on the next
+lookup.
+"""
+from typing import Any, Awaitable, Callable, Dict, Generic, Tuple, TypeVar
+import asyncio
+import threading
+
+T = TypeVar('T')
+
+
+async def _close_with_loop(client, close: Callable[[Any], Awaitable], forget: Callable[[], None]):
+    try:
+        yield
+    finally:
+        forget()
+        await close(client)
+
+
+def _aclose(client) -> Awaitable:
+    return client.aclose()
+
+
+class LoopClients(Generic[T]):
+    def __init__(self, factory: Callable[[], T], close: Callable[[T], Awaitable] = _aclose):
+        """
+        Args:
+            factory: builds a client for the running loop
+            close: coroutine function closing a client (default: client.aclose())
+        """
+        self.factory = factory
+        self.close = close
+        self._clients: Dict[asyncio.AbstractEventLoop, Tuple[T, Any]] = {}  # loop -> (client, closer)
+        self._lock = threading.Lock()
+
+    def _forget(self, loop):
+        with self._lock:
+            self._clients.pop(loop, None)
+
+    async def get(self) -> T:
+        """Client for the running loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            with self._lock:
+                for stale in [other for other in self._clients if other.is_closed()]:
+                    del self._clients[stale]
+            client = self.factory()
+            closer = _close_with_loop(client, self.close, lambda: self._forget(loop))
+            with self._lock:
+                entry = self._clients[loop] = (client, closer)
+            # registers the generator with the loop for shutdown_asyncgens()
+            await closer.__anext__()
+        return entry[0]
+
+    def __len__(self):
+        return len(self._clients)
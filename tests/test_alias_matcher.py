@@ -0,0 +1,119 @@
+"""
+Tests for the Aho-Corasick brand / category matcher (shared/rag/alias_matcher.py)
+against naive substring search and the old dict loops it replaced.
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from shared.rag.alias_matcher import BRAND, CATEGORY, AhoCorasick, AliasMatcher, QueryDictionary
+
+DATA = {
+    'brands': [
+        {'canonical': 'โรงพยาบาลพญาไท 2', 'aliases': ['พญาไท 2', 'phyathai 2', 'pt2']},
+        {'canonical': 'โรงพยาบาลพญาไท 1', 'aliases': ['พญาไท 1', 'phyathai 1']},
+        {'canonical': 'Bangkok Hospital', 'aliases': ['bangkok hospital', 'bh', 'bdms']},
+        {'canonical': 'BNH Hospital', 'aliases': ['bnh', 'BH']},  # 'bh' already taken: first wins
+    ],
+    'categories': [
+        {'category': 'ฉีดวัคซีน HPV (HPV Vaccine)', 'keywords': ['hpv', 'วัคซีน hpv', 'มะเร็งปากมดลูก']},
+        {'category': 'ตรวจสุขภาพ (Health Checkup)', 'keywords': ['ตรวจสุขภาพ', 'checkup', 'check up']},
+        {'category': 'ทำฟัน (Dental)', 'keywords': ['ฟัน', 'ฟอกสีฟัน', 'dental']},
+    ],
+}
+
+
+def _naive(patterns, text):
+    return sorted((start, start + len(pattern), payload)
+                  for pattern, payload in patterns if pattern
+                  for start in range(len(text) - len(pattern) + 1)
+                  if text.startswith(pattern, start))
+
+
+@pytest.mark.parametrize('patterns,text', [
+    (['he', 'she', 'his', 'hers'], 'ushers'),
+    (['a', 'aa', 'aaa'], 'aaaaa'),
+    (['abcd', 'bc', 'c', 'bcde'], 'xabcdex'),
+    (['ฟัน', 'ฟอกสีฟัน', 'สีฟัน'], 'อยากฟอกสีฟันที่ไหนดี ฟันขาว'),
+    (['x', ''], ''),
+])
+def test_matches_naive_search(patterns, text):
+    pairs = [(pattern, i) for i, pattern in enumerate(patterns)]
+    assert sorted(AhoCorasick(pairs).iter(text)) == _naive(pairs, text)
+
+
+def test_random_patterns_match_naive_search():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        patterns = [''.join(rng.choice(list('abc'), size=rng.integers(1, 5))) for _ in range(rng.integers(1, 12))]
+        text = ''.join(rng.choice(list('abcd'), size=rng.integers(0, 60)))
+        pairs = [(pattern, i) for i, pattern in enumerate(patterns)]
+        assert sorted(AhoCorasick(pairs).iter(text)) == _naive(pairs, text)
+
+
+def _legacy_brand(query):
+    """The old loop: first alias in dict order contained in the lower-cased query"""
+    aliases = {}
+    for group in DATA['brands']:
+        for alias in group['aliases']:
+            aliases.setdefault(alias.lower(), group['canonical'])
+    for alias, canonical in aliases.items():
+        if alias in query.lower():
+            return canonical
+    return None
+
+
+def _legacy_category(query):
+    for group in DATA['categories']:
+        if any(keyword.lower() in query.lower() for keyword in group['keywords']):
+            return group['category']
+    return None
+
+
+QUERIES = [
+    'ฉีด HPV ที่พญาไท 2 ราคาเท่าไหร่',
+    'BNH check up package',
+    'อยากฟอกสีฟัน ที่ bangkok hospital',
+    'bdms ตรวจสุขภาพ และ hpv',
+    'PHYATHAI 1 dental',
+    'ไม่มีอะไรตรงเลย',
+    '',
+]
+
+
+@pytest.fixture(scope='module')
+def matcher(tmp_path_factory):
+    path = tmp_path_factory.mktemp('aliases') / 'query_aliases.json'
+    path.write_text(json.dumps(DATA, ensure_ascii=False), encoding='utf-8')
+    return AliasMatcher(str(path), reload_interval=3600)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_matches_legacy_loops(matcher, query):
+    brand = matcher.first_brand(query)
+    assert (brand.target if brand else None) == _legacy_brand(query)
+    assert matcher.classify_category(query) == _legacy_category(query)
+
+
+def test_normalize_brand(matcher):
+    assert matcher.normalize_brand('PT2') == 'โรงพยาบาลพญาไท 2'
+    assert matcher.normalize_brand('BH') == 'Bangkok Hospital'
+    assert matcher.normalize_brand('รพ. bnh สาทร') == 'BNH Hospital'
+    assert matcher.normalize_brand('Unknown Clinic') == 'Unknown Clinic'
+
+
+def test_scan_reports_kinds_and_positions():
+    hits = QueryDictionary(DATA).scan('BNH ตรวจสุขภาพ')
+    assert [(hit.kind, hit.term, hit.start, hit.end) for hit in hits] == [(BRAND, 'bnh', 0, 3), (CATEGORY, 'ตรวจสุขภาพ', 4, 14)]
+
+
+def test_broken_file_keeps_previous_aliases(tmp_path):
+    path = tmp_path / 'query_aliases.json'
+    path.write_text(json.dumps(DATA, ensure_ascii=False), encoding='utf-8')
+    matcher = AliasMatcher(str(path), reload_interval=0)
+    path.write_text('{not json', encoding='utf-8')
+    os.utime(path, (0, 0))
+    assert matcher.normalize_brand('pt2') == 'โรงพยาบาลพญาไท 2'
+    assert matcher.last_error is not None
@@ -0,0 +1,92 @@
+"""
+Parity tests for the sparse BM25 engine (shared/rag/bm25_engine.py) against
+rank_bm25's BM25Okapi, which it replaced.
+"""
+import numpy as np
+import pytest
+
+from shared.rag.bm25_engine import SparseBM25, competition_ranks, token_id_postings, top_k_indices
+
+rank_bm25 = pytest.importorskip('rank_bm25')
+
+CORPUS = [
+    ['ตรวจ', 'สุขภาพ', 'ประจำปี', 'basic'],
+    ['hpv', 'vaccine', '9', 'สายพันธุ์', 'hpv'],
+    ['ตรวจ', 'ไต', 'ตับ'],
+    ['ฟอก', 'สี', 'ฟัน', 'zoom', 'ฟัน', 'ฟัน'],
+    ['ตรวจ', 'สุขภาพ', 'premium', 'ตรวจ', 'หัวใจ'],
+    ['vaccine', 'ไข้หวัดใหญ่'],
+    ['ตรวจ'],
+    [],
+    ['laser', 'หน้า', 'ใส', 'laser'],
+]
+
+QUERIES = [
+    ['ตรวจ', 'สุขภาพ'],
+    ['hpv', 'vaccine'],
+    ['ฟัน'],
+    ['ตรวจ', 'ตรวจ', 'ไต'],   # repeated query terms count twice, like BM25Okapi
+    ['unknown'],
+    ['unknown', 'laser'],
+    [],
+]
+
+
+def _random_corpus(seed=0, docs=300, vocab=60):
+    rng = np.random.default_rng(seed)
+    return [[f"t{i}" for i in rng.zipf(1.5, size=rng.integers(0, 30)) % vocab] for _ in range(docs)]
+
+
+@pytest.mark.parametrize('k1,b', [(1.5, 0.75), (1.2, 0.5), (2.0, 0.9)])
+@pytest.mark.parametrize('query', QUERIES)
+def test_scores_match_rank_bm25(query, k1, b):
+    expected = rank_bm25.BM25Okapi(CORPUS, k1=k1, b=b).get_scores(query)
+    actual = SparseBM25.from_tokens(CORPUS, k1=k1, b=b).get_scores(query)
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_scores_match_rank_bm25_random_corpus():
+    corpus = _random_corpus()
+    reference = rank_bm25.BM25Okapi(corpus)
+    engine = SparseBM25.from_tokens(corpus)
+    rng = np.random.default_rng(1)
+    for _ in range(25):
+        query = [f"t{i}" for i in rng.integers(0, 70, size=rng.integers(1, 6))]
+        np.testing.assert_allclose(engine.get_scores(query), reference.get_scores(query), rtol=1e-12, atol=1e-12)
+
+
+def test_builders_agree():
+    corpus = _random_corpus(seed=2)
+    vocab = list(dict.fromkeys(token for doc in corpus for token in doc))
+    ids = np.asarray([vocab.index(token) for doc in corpus for token in doc], dtype=np.int32)
+    indptr = np.concatenate(([0], np.cumsum([len(doc) for doc in corpus])))
+    query = ['t1', 't3', 't7']
+
+    expected = SparseBM25.from_tokens(corpus).get_scores(query)
+    np.testing.assert_allclose(SparseBM25.from_token_ids(indptr, ids, vocab).get_scores(query), expected)
+
+    stats = token_id_postings(indptr, ids, len(vocab))
+    np.testing.assert_allclose(SparseBM25.from_prebuilt(vocab, stats).get_scores(query), expected)
+    stats.update(k1=1.5, b=0.75, weights=SparseBM25.posting_weights(
+        stats['idf'], stats['doc_len'], stats['indptr'], stats['indices'], stats['term_freqs']))
+    np.testing.assert_allclose(SparseBM25.from_prebuilt(vocab, stats).get_scores(query), expected)
+
+
+def test_top_k_matches_full_sort():
+    scores = SparseBM25.from_tokens(CORPUS).get_scores(['ตรวจ', 'vaccine'])
+    for k in range(len(scores) + 2):
+        top = top_k_indices(scores, k)
+        np.testing.assert_array_equal(scores[top], np.sort(scores)[::-1][:k])
+
+
+def test_competition_ranks():
+    scores = np.array([0.5, 2.0, 0.5, 3.0, 0.0])
+    np.testing.assert_array_equal(competition_ranks(scores), [3, 2, 3, 1, 5])
+    # the old dict sort: ranks by descending score, ties share the first position's rank
+    ordered = sorted(range(len(scores)), key=lambda i: -scores[i])
+    legacy = {}
+    for position, doc in enumerate(ordered, 1):
+        previous = ordered[position - 2] if position > 1 else None
+        tied = previous is not None and scores[previous] == scores[doc]
+        legacy[doc] = legacy[previous] if tied else position
+    np.testing.assert_array_equal(competition_ranks(scores), [legacy[i] for i in range(len(scores))])
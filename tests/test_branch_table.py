@@ -0,0 +1,107 @@
+"""
+Tests for the typed branch table (shared/rag/branch_table.py) against the
+legacy index_list records it replaces.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from shared.rag.branch_table import BranchTable, as_branch_table
+from shared.rag.string_table import StringTable
+
+RECORDS = [
+    {'index': 0, 'coor': [13.7466, 100.5393], 'package_url': 'https://hdmall.co.th/p/0', 'text': 'สาขา สยาม',
+     'address': 'ถนนพระราม 1 ปทุมวัน', 'map_url': 'https://maps.example/0'},
+    {'index': 0, 'coor': [], 'package_url': 'https://hdmall.co.th/p/0', 'text': 'สาขา ออนไลน์',
+     'address': None, 'map_url': None},
+    {'index': 5, 'coor': None, 'package_url': None, 'text': float('nan'), 'address': '', 'map_url': None},
+    {'index': 9, 'coor': ['18.79', '98.98'], 'package_url': 'https://hdmall.co.th/p/9', 'text': 'Chiang Mai',
+     'address': 'นิมมานเหมินท์', 'map_url': 'https://maps.example/9', 'phone': '053-000-000',
+     'hours': {'mon': ['09:00', '17:00']}},
+]
+
+
+@pytest.fixture(scope='module')
+def table():
+    return BranchTable.from_records(RECORDS)
+
+
+def test_records_round_trip(table):
+    assert len(table) == len(RECORDS)
+    assert table[0] == RECORDS[0]
+    assert table[1]['coor'] is None and table[1]['address'] is None
+    assert table[2]['text'] is None and table[2]['address'] == '' and table[2]['package_url'] is None
+    assert table[3]['coor'] == [18.79, 98.98]
+    assert table[3]['phone'] == '053-000-000' and table[3]['hours'] == {'mon': ['09:00', '17:00']}
+    assert 'phone' not in table[0]
+    assert list(table) == [table[i] for i in range(len(table))]
+
+
+def test_columns_match_records(table):
+    np.testing.assert_array_equal(table.package_indices([3, 0, 2]), [9, 0, 5])
+    for i, entry in enumerate(RECORDS):
+        assert table.package_url(i) == entry['package_url']
+        assert table.text(i) == (None if isinstance(entry['text'], float) else entry['text'])
+        assert table.address(i) == entry['address']
+        assert table.map_url(i) == entry['map_url']
+        expected = [float(c) for c in entry['coor']] if entry['coor'] else []
+        assert table.coor(i) == expected
+    assert math.isnan(table.lat[1]) and table.lng[0] == pytest.approx(100.5393)
+
+
+def test_urls_are_interned(table):
+    assert table.url_ids[0] == table.url_ids[1]
+    assert len(table.urls) == 3
+
+
+@pytest.mark.parametrize('urls', [
+    ['https://hdmall.co.th/p/0'],
+    ['https://hdmall.co.th/p/9', 'https://hdmall.co.th/p/unknown'],
+    [],
+    ['https://hdmall.co.th/p/unknown'],
+])
+def test_url_mask_matches_records(table, urls):
+    expected = [entry['package_url'] in urls for entry in RECORDS]
+    np.testing.assert_array_equal(table.url_mask(urls), expected)
+
+
+def test_as_branch_table(table):
+    assert as_branch_table(None) is None
+    assert as_branch_table(table) is table
+    converted = as_branch_table(np.array(RECORDS, dtype=object))
+    assert list(converted) == list(table)
+
+
+class _Writer:
+    """In-memory stand-in for the snapshot writer / reader pair"""
+
+    def __init__(self):
+        self.arrays = {}
+
+    def array(self, name, array):
+        self.arrays[name] = np.ascontiguousarray(array)
+        return name
+
+
+class _Reader:
+    def __init__(self, writer):
+        self.arrays = writer.arrays
+
+    def array(self, name):
+        return self.arrays[name]
+
+
+def test_save_load_round_trip(table):
+    writer = _Writer()
+    spec = table.save(writer, 'index_list')
+    loaded = BranchTable.load(_Reader(writer), spec)
+    assert list(loaded) == list(table)
+    np.testing.assert_array_equal(loaded.url_mask(['https://hdmall.co.th/p/9']), table.url_mask(['https://hdmall.co.th/p/9']))
+
+
+def test_string_table():
+    values = ['ไทย', None, '', 'abc', float('nan')]
+    strings = StringTable.from_values(values)
+    assert strings.to_list() == ['ไทย', None, '', 'abc', None]
+    assert [strings[i] for i in range(len(strings))] == strings.to_list()
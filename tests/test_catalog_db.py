@@ -0,0 +1,168 @@
+"""
+Tests for the SQLite catalogue behind sql_search (shared/rag/catalog_db.py
+and shared/rag/catalog_query.py).
+
+Run from the repository root:
+    python -m pytest -q tests
+"""
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shared.rag.catalog_db import CatalogDatabase, CatalogQueryError
+from shared.rag.catalog_query import PandasQueryCompiler
+
+PROMPT_PATH = os.path.join(os.path.dirname(__file__), '..', 'services', 'web_agent', 'prompts', 'gpt.txt')
+
+
+def _fixture_frame():
+    # Prices are unique so pandas' (unstable) sort_values order is unambiguous
+    rows = [
+        ('ฉีดวัคซีน HPV 9 สายพันธุ์ 3 เข็ม', 'โรงพยาบาลพญาไทย 2', 'ฉีดวัคซีน HPV (HPV Vaccine)', 14500.0, 'กรุงเทพมหานคร พญาไท'),
+        ('hpv vaccine 2 doses', 'BNH Hospital', 'Vaccine', 9800.0, 'Bangkok, Sathorn'),
+        ('ตรวจสุขภาพประจำปี Basic', 'โรงพยาบาลเกษมราษฎร์ ประชาชื่น', 'โปรแกรมตรวจสุขภาพ (Health Checkup)', 1590.0, 'กรุงเทพมหานคร บางซื่อ'),
+        ('Executive Checkup', 'Bangkok Hospital', 'Health Checkup', 1990.0, 'Bangkok, Huai Khwang'),
+        ('ตรวจสุขภาพ Premium', 'Bangkok Hospital Pattaya', 'Health Checkup', 12900.0, 'ชลบุรี พัทยา'),
+        ('ตรวจการทำงานของไต', 'โรงพยาบาลเกษมราษฎร์ บางแค', 'ตรวจไต (Kidney Function Test)', 890.0, 'กรุงเทพมหานคร บางแค'),
+        ('ตรวจการทำงานของตับ', 'Bangkok Hospital', 'Liver Function Test', 2450.0, 'Bangkok, Huai Khwang'),
+        ('Liver Panel', 'Bangkok Hospital Phuket', 'ตรวจตับ (Liver Function Test)', 3200.0, 'ภูเก็ต'),
+        ('ฟอกสีฟัน Zoom', 'คลินิกทันตกรรม สมายล์', 'ฟอกสีฟัน (Teeth Whitening)', 7500.0, 'กรุงเทพมหานคร สยาม'),
+        ('Teeth Whitening Home Kit', 'Dental Studio', 'Teeth Whitening', 3900.0, 'เชียงใหม่'),
+        ('โปรแกรมพญาไทย Check-up', 'โรงพยาบาลพญาไทย 3', 'Health Checkup', 5200.0, np.nan),
+        (np.nan, 'Clinic X', np.nan, np.nan, 'Bangkok'),
+        ('เลเซอร์หน้าใส', 'Skin Clinic', 'Laser', 2990.0, 'กรุงเทพมหานคร อโศก'),
+        ('ตรวจไตและตับ Combo', 'โรงพยาบาลพญาไทย 1', 'ตรวจไต (Kidney Function Test)', 1750.0, 'กรุงเทพมหานคร'),
+        ('ตรวจสุขภาพ Standard', 'โรงพยาบาลรามคำแหง', 'โปรแกรมตรวจสุขภาพ (Health Checkup)', 3500.0, 'กรุงเทพมหานคร รามคำแหง'),
+        ('ตรวจโควิด RT-PCR', 'BNH Hospital', 'COVID-19 Test', 1290.0, 'กรุงเทพมหานคร สีลม'),
+    ]
+    kb = pd.DataFrame(rows, columns=['Name', 'Brand', 'Category', 'Cash Price', 'location'])
+    kb['Package Details'] = kb['Name'].fillna('') + ' รายละเอียด'
+    kb['URL'] = [f"https://hdmall.co.th/p/{i}" for i in range(len(kb))]
+    return kb
+
+
+def _prompt_examples():
+    """Every pandas expression the web agent prompt shows for sql_search"""
+    with open(PROMPT_PATH, 'r', encoding='utf-8') as f:
+        text = f.read()
+    examples = re.findall(r'sql_search\(query="(.*?)", category_tag=', text)
+    examples += re.findall(r'sql_query: `(.*?)`', text)
+    return list(dict.fromkeys(examples))
+
+
+PROMPT_EXAMPLES = _prompt_examples()
+
+
+@pytest.fixture(scope='module')
+def kb():
+    return _fixture_frame()
+
+
+@pytest.fixture(scope='module')
+def db(kb):
+    return CatalogDatabase(kb, row_limit=100)
+
+
+def _row_ids(rows):
+    return [row['row_id'] for row in rows]
+
+
+def _pandas_result(kb, expression):
+    # The prompt spells the column 'Location'; the compiler resolves it to 'location'
+    return eval(expression, {}, {'kb': kb.assign(Location=kb['location'])})
+
+
+def test_prompt_examples_found():
+    # guards against the extraction silently matching nothing after a prompt edit
+    assert len(PROMPT_EXAMPLES) >= 10
+
+
+@pytest.mark.parametrize('expression', PROMPT_EXAMPLES)
+def test_prompt_example_matches_pandas(kb, db, expression):
+    sql, params = PandasQueryCompiler(db).compile(expression)
+    expected = _pandas_result(kb, expression)
+    assert _row_ids(db.query(sql, params)) == expected.index.tolist()
+
+
+def test_prompt_examples_are_not_trivial(kb):
+    # the fixture should give the examples non-empty results to compare (the
+    # prompt's 'เกษมราษฎร์บางแค' example deliberately finds nothing)
+    matched = sum(1 for expression in PROMPT_EXAMPLES if len(_pandas_result(kb, expression)))
+    assert matched >= len(PROMPT_EXAMPLES) - 1
+
+
+def test_category_scope(kb, db):
+    sql, params = PandasQueryCompiler(db).compile("kb.sort_values('Cash Price')")
+    rows = db.query(sql, params, rows=[0, 1, 2])
+    assert _row_ids(rows) == [2, 1, 0]
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM catalog",
+    "SELECT * FROM main.catalog WHERE row_id = 5",
+    "SELECT * FROM kb UNION ALL SELECT * FROM catalog",
+    "SELECT rowid FROM catalog_fts WHERE catalog_fts MATCH 'Bangkok'",
+    "SELECT * FROM catalog_fts_data",
+    "SELECT COUNT(*) AS n FROM catalog",
+])
+def test_rejects_reads_outside_scope_views(db, sql):
+    with pytest.raises(CatalogQueryError):
+        db.query(sql, rows=[0, 1, 2])
+
+
+def test_raw_sql_scope(kb, db):
+    scope = [0, 1, 2]
+    assert sorted(_row_ids(db.query("SELECT * FROM packages", rows=scope))) == scope
+    assert db.query("SELECT COUNT(*) AS n FROM kb", rows=scope)[0]['n'] == len(scope)
+    assert sorted(_row_ids(db.query("WITH x AS (SELECT * FROM knowledge_base) SELECT * FROM x", rows=scope))) == scope
+    if db.fts_enabled:
+        rows = db.query("SELECT row_id FROM kb_fts WHERE fts MATCH 'Bangkok'", rows=scope)
+        assert sorted(_row_ids(rows)) == [1]
+    # the same statement sees every row again without a scope
+    assert len(db.query("SELECT * FROM kb", limit=100)) == len(kb)
+
+
+def test_row_limit(kb):
+    limited = CatalogDatabase(kb, row_limit=3)
+    assert len(limited.query("SELECT * FROM kb")) == 3
+
+
+@pytest.mark.parametrize('sql', [
+    "INSERT INTO catalog (row_id, Name) VALUES (1000, 'x')",
+    "UPDATE catalog SET Name = 'x'",
+    "DELETE FROM catalog",
+    "DROP TABLE catalog",
+    "CREATE TABLE other (x)",
+    "WITH doomed AS (SELECT 1) DELETE FROM catalog",
+    "SELECT * FROM kb; DELETE FROM catalog",
+    "ATTACH DATABASE ':memory:' AS other",
+    "SELECT * FROM (SELECT 1) WHERE 1 IN (SELECT 1); ATTACH DATABASE ':memory:' AS other",
+    "SELECT load_extension('/tmp/evil')",
+    "PRAGMA query_only = OFF",
+])
+def test_rejects_non_read_statements(kb, db, sql):
+    with pytest.raises(CatalogQueryError):
+        db.query(sql)
+    # nothing changed underneath
+    assert db.query("SELECT COUNT(*) AS n FROM kb")[0]['n'] == len(kb)
+
+
+def test_rejects_non_literal_pandas(db):
+    compiler = PandasQueryCompiler(db)
+    for expression in ("__import__('os').system('true')", "kb[kb['Name'].apply(len) > 3]", "kb.to_csv('/tmp/x')"):
+        with pytest.raises(CatalogQueryError):
+            compiler.compile(expression)
+
+
+def test_time_budget_interrupts_runaway_query(kb):
+    budgeted = CatalogDatabase(kb, timeout=0.2)
+    start = time.monotonic()
+    with pytest.raises(CatalogQueryError, match='exceeded'):
+        budgeted.query("WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT COUNT(*) FROM r")
+    assert time.monotonic() - start < 5
+    # the connection is still usable afterwards
+    assert len(budgeted.query("SELECT * FROM kb", limit=2)) == 2
@@ -0,0 +1,89 @@
+"""
+Parity tests for the grid-bucketed radius index (shared/rag/geo_index.py)
+against a brute-force haversine scan of every branch.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from shared.rag.branch_table import BranchTable
+from shared.rag.geo_index import GeoIndex, haversine_km
+
+
+def _branches(seed=0, count=3000):
+    rng = np.random.default_rng(seed)
+    records = []
+    for i in range(count):
+        if i % 50 == 0:
+            coor = None                                          # unknown coordinates
+        elif i % 7 == 0:
+            coor = [float(rng.uniform(-89.9, 89.9)), float(rng.uniform(-180, 180))]
+        else:
+            # clustered around Bangkok, like the real branch list
+            coor = [float(13.75 + rng.normal(0, 0.3)), float(100.5 + rng.normal(0, 0.3))]
+        records.append({'index': i // 3, 'coor': coor, 'package_url': f"https://hdmall.co.th/p/{i // 3}"})
+    return records
+
+
+def _brute_force(records, lat, lng, radius_km):
+    mask = []
+    for entry in records:
+        coor = entry['coor']
+        if not coor:
+            mask.append(1)
+            continue
+        # scalar haversine, independent of the vectorized implementation
+        p1, p2 = math.radians(lat), math.radians(coor[0])
+        a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(coor[1] - lng) / 2) ** 2
+        distance = 2 * 6371.0088 * math.asin(math.sqrt(min(1.0, a)))
+        mask.append(1 if distance <= radius_km else 0)
+    return np.array(mask)
+
+
+RECORDS = _branches()
+QUERIES = [
+    (13.75, 100.5, 1.0),
+    (13.75, 100.5, 10.0),
+    (13.9, 100.3, 25.0),
+    (7.88, 98.39, 50.0),         # no nearby branches
+    (13.75, 179.99, 300.0),      # antimeridian
+    (89.0, 10.0, 500.0),         # near the pole
+    (-45.0, -60.0, 2000.0),
+    (0.0, 0.0, 30000.0),         # whole planet
+]
+
+
+@pytest.fixture(scope='module', params=['records', 'table'])
+def index(request):
+    source = RECORDS if request.param == 'records' else BranchTable.from_records(RECORDS)
+    return GeoIndex(source)
+
+
+@pytest.mark.parametrize('lat,lng,radius_km', QUERIES)
+def test_radius_query_matches_brute_force(index, lat, lng, radius_km):
+    mask, distances = index.radius_query(lat, lng, radius_km)
+    expected = _brute_force(RECORDS, lat, lng, radius_km)
+    # a branch sitting within float error of the radius may fall either way
+    exact = _brute_force(RECORDS, lat, lng, radius_km * (1 - 1e-9)) == _brute_force(RECORDS, lat, lng, radius_km * (1 + 1e-9))
+    np.testing.assert_array_equal(mask[exact], expected[exact])
+    inside = mask.astype(bool) & ~index.invalid
+    np.testing.assert_allclose(distances[inside], index.distances_from(lat, lng)[inside])
+
+
+def test_small_cells_match_brute_force():
+    index = GeoIndex(RECORDS, cell_deg=0.01)
+    for lat, lng, radius_km in QUERIES[:4]:
+        np.testing.assert_array_equal(index.radius_query(lat, lng, radius_km)[0], _brute_force(RECORDS, lat, lng, radius_km))
+
+
+def test_unknown_coordinates_are_kept(index):
+    mask, distances = index.radius_query(13.75, 100.5, 0.001)
+    unknown = [i for i, entry in enumerate(RECORDS) if not entry['coor']]
+    assert all(mask[unknown] == 1)
+    assert np.isnan(distances[unknown]).all()
+
+
+def test_haversine_known_distance():
+    # Bangkok -> Chiang Mai is about 583 km on the great circle
+    assert haversine_km(13.7563, 100.5018, np.array([18.7883]), np.array([98.9853]))[0] == pytest.approx(583, abs=3)
@@ -0,0 +1,75 @@
+"""
+Parity tests for the array-based reciprocal rank fusion in
+shared/rag/rank_fusion.py against the dict-based compute_rrf / get_top_k.
+"""
+import numpy as np
+import pytest
+
+from shared.rag.bm25_engine import competition_ranks
+from shared.rag.rank_fusion import compute_rrf, get_top_k, masked_top_k, ranks_from_dict, rrf_scores, rrf_top_k
+
+NUM_DOCS = 500
+
+
+def _rankings(seed):
+    rng = np.random.default_rng(seed)
+    # rounded scores give tied (shared) ranks, like BM25 zeros
+    lexical = competition_ranks(np.round(rng.random(NUM_DOCS), 2))
+    semantic = competition_ranks(rng.random(NUM_DOCS))
+    mask = (rng.random(NUM_DOCS) < 0.3).astype(np.int64)
+    return lexical, semantic, mask
+
+
+def _as_dict(ranks):
+    return {doc: int(rank) for doc, rank in enumerate(ranks)}
+
+
+def _assert_same_top_k(ids, scores, expected):
+    expected_ids = list(expected)
+    expected_scores = np.array(list(expected.values()))
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-12)
+    # documents tied with the last kept score may be chosen differently
+    above = expected_scores > expected_scores[-1] if len(expected_scores) else []
+    assert [doc for doc, keep in zip(expected_ids, above) if keep] == [doc for doc, keep in zip(ids, above) if keep]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('alpha', [0.5, 0.3])
+def test_fused_scores_match_compute_rrf(seed, alpha):
+    lexical, semantic, mask = _rankings(seed)
+    expected = compute_rrf(_as_dict(lexical), _as_dict(semantic), np.ones(NUM_DOCS), alpha=alpha)
+    fused = rrf_scores([lexical, semantic], weights=[1 - alpha, alpha])
+    np.testing.assert_allclose(fused[list(expected)], list(expected.values()), rtol=1e-12)
+    assert len(expected) == NUM_DOCS
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('k', [1, 10, 150])
+def test_masked_top_k_matches_compute_rrf(seed, k):
+    lexical, semantic, mask = _rankings(seed)
+    expected = get_top_k(compute_rrf(_as_dict(lexical), _as_dict(semantic), mask), k)
+    ids, scores = masked_top_k(rrf_scores([lexical, semantic]), mask, k)
+    assert all(mask[ids] == 1)
+    _assert_same_top_k(ids.tolist(), scores, expected)
+
+    ids, scores = rrf_top_k([lexical, semantic], mask=mask, top_k=k)
+    _assert_same_top_k(ids.tolist(), scores, expected)
+
+
+def test_unmasked_top_k():
+    lexical, semantic, _ = _rankings(7)
+    expected = get_top_k(compute_rrf(_as_dict(lexical), _as_dict(semantic), np.ones(NUM_DOCS)), 20)
+    ids, scores = masked_top_k(rrf_scores([lexical, semantic]), None, 20)
+    _assert_same_top_k(ids.tolist(), scores, expected)
+
+
+def test_ranks_from_dict():
+    ranks = ranks_from_dict({3: 1, 0: 2}, 5)
+    np.testing.assert_array_equal(ranks, [2, 6, 6, 1, 6])
+    np.testing.assert_array_equal(ranks_from_dict({}, 3), [4, 4, 4])
+
+
+def test_empty_mask():
+    lexical, semantic, _ = _rankings(0)
+    ids, scores = masked_top_k(rrf_scores([lexical, semantic]), np.zeros(NUM_DOCS), 10)
+    assert len(ids) == 0 and len(scores) == 0
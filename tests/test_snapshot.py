@@ -0,0 +1,146 @@
+"""
+Round-trip tests for the memory-mappable corpus snapshot (shared/rag/snapshot.py).
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shared.rag.bm25_engine import SparseBM25
+from shared.rag.branch_table import BranchTable
+from shared.rag.snapshot import (TokenCorpus, artifact_bytes, load_artifact, read_manifest, snapshot_directory,
+                                 verify_snapshot, write_snapshot)
+
+DOCS = {
+    'indices': [4, 0, 7, 2],
+    'tokens': [['ตรวจ', 'สุขภาพ', 'ตรวจ'], ['hpv', 'vaccine'], [], ['ฟอก', 'สี', 'ฟัน', 'ตรวจ']],
+}
+BRANCHES = np.array([
+    {'index': 0, 'coor': [13.75, 100.5], 'package_url': 'https://hdmall.co.th/p/0', 'text': 'สาขา สยาม',
+     'address': 'ถนนพระราม 1', 'map_url': 'https://maps.example/0', 'hours': {'mon': '9-17'}},
+    {'index': 0, 'coor': None, 'package_url': 'https://hdmall.co.th/p/0', 'text': None,
+     'address': 'ไม่ระบุ', 'map_url': None},
+    {'index': 3, 'coor': [18.79, 98.98], 'package_url': 'https://hdmall.co.th/p/3', 'text': 'Chiang Mai',
+     'address': None, 'map_url': 'https://maps.example/3'},
+], dtype=object)
+
+
+def _frame():
+    return pd.DataFrame({
+        'Name': ['ตรวจสุขภาพ Basic', 'HPV Vaccine', np.nan],
+        'Cash Price': [1590.0, 9800.0, np.nan],
+        'Rank': np.array([3, 1, 2], dtype=np.int64),
+        'Active': [True, False, True],
+        'Cash Discount': ['1,000', '-', np.nan],
+    })
+
+
+@pytest.fixture(scope='module')
+def snapshot(tmp_path_factory):
+    root = tmp_path_factory.mktemp('snapshots')
+    artifacts = {
+        'embeddings': np.array([[3.0, 4.0], [0.0, 0.0], [1.0, 0.0]]),
+        'ids': np.arange(5, dtype=np.int32),
+        'doc_tokens': DOCS,
+        'index_list': BRANCHES,
+        'knowledge_base': _frame(),
+        'categories': {'hpv': ['ฉีดวัคซีน HPV'], 'count': 2},
+        'skipped': None,
+    }
+    write_snapshot(artifacts, str(root), version='v1')
+    directory = snapshot_directory(str(root))
+    return directory, read_manifest(directory)
+
+
+def test_current_points_at_version(snapshot):
+    directory, manifest = snapshot
+    assert os.path.basename(directory) == 'v1' and manifest['version'] == 'v1'
+    assert 'skipped' not in manifest['artifacts']
+    assert verify_snapshot(directory) == []
+
+
+def test_matrix_is_memory_mapped_and_normalized(snapshot):
+    matrix = load_artifact(*snapshot, 'embeddings')
+    assert isinstance(matrix, np.memmap) and matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix, [[0.6, 0.8], [0.0, 0.0], [1.0, 0.0]], rtol=1e-6)
+
+
+def test_array_round_trip(snapshot):
+    ids = load_artifact(*snapshot, 'ids')
+    np.testing.assert_array_equal(ids, np.arange(5))
+    assert ids.dtype == np.int32
+
+
+def test_tokens_round_trip(snapshot):
+    corpus = load_artifact(*snapshot, 'doc_tokens')
+    assert isinstance(corpus, TokenCorpus) and len(corpus) == len(DOCS['tokens'])
+    vocab = corpus.vocab.to_list()
+    decoded = [[vocab[i] for i in corpus.ids[corpus.indptr[d]:corpus.indptr[d + 1]]] for d in range(len(corpus))]
+    assert decoded == DOCS['tokens']
+    np.testing.assert_array_equal(corpus.indices, DOCS['indices'])
+
+    # prebuilt BM25 statistics score exactly like building from the tokens
+    prebuilt = SparseBM25.from_prebuilt(vocab, corpus.bm25)
+    expected = SparseBM25.from_tokens(DOCS['tokens'])
+    for query in (['ตรวจ'], ['hpv', 'ฟัน'], ['missing']):
+        np.testing.assert_allclose(prebuilt.get_scores(query), expected.get_scores(query))
+
+
+def test_branches_round_trip(snapshot):
+    table = load_artifact(*snapshot, 'index_list')
+    assert isinstance(table, BranchTable)
+    assert list(table) == list(BranchTable.from_records(BRANCHES))
+    assert table[0]['hours'] == {'mon': '9-17'} and table[1]['coor'] is None
+
+
+def test_table_round_trip(snapshot):
+    frame = load_artifact(*snapshot, 'knowledge_base')
+    pd.testing.assert_frame_equal(frame, _frame(), check_dtype=False)
+    assert frame['Rank'].dtype == np.int64 and frame['Active'].dtype == bool
+    assert frame['Name'].isna().tolist() == [False, False, True]
+
+
+def test_json_round_trip(snapshot):
+    assert load_artifact(*snapshot, 'categories') == {'hpv': ['ฉีดวัคซีน HPV'], 'count': 2}
+
+
+def test_artifact_bytes(snapshot):
+    directory, manifest = snapshot
+    assert artifact_bytes(manifest, 'ids') == os.path.getsize(os.path.join(directory, 'ids', 'array.npy'))
+    assert artifact_bytes(manifest, 'categories') > 0
+
+
+def test_existing_version_is_not_overwritten(snapshot):
+    directory, _ = snapshot
+    with pytest.raises(FileExistsError):
+        write_snapshot({'ids': np.arange(3)}, os.path.dirname(directory), version='v1')
+
+
+def test_corruption_is_detected(tmp_path):
+    directory = write_snapshot({'ids': np.arange(100, dtype=np.int64)}, str(tmp_path), version='v1')
+    manifest = read_manifest(directory)
+    path = os.path.join(directory, 'ids', 'array.npy')
+
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'\x01')
+    assert verify_snapshot(directory) == ['ids/array.npy']
+
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 8)
+    with pytest.raises(ValueError, match='truncated'):
+        load_artifact(directory, manifest, 'ids')
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    directory = write_snapshot({'ids': np.arange(3)}, str(tmp_path), version='v1')
+    manifest_path = os.path.join(directory, 'manifest.json')
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['format'] = -1
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError, match='format'):
+        read_manifest(directory)